@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+PyClick 自動模式掃描流程
+每輪：有上次匹配位置就只截 ROI，否則全螢幕（分塊變動偵測 + 增量匹配）；
+下一輪的間隔由 ScanScheduler 依畫面變動頻率、命中率與每輪耗時決定。
+run_round() 是自動模式的一輪（掃描 → 點擊 → 錄製 → 決定間隔），點擊方式由呼叫端傳入，
+TrayClicker._auto_loop 與效能量測（bench_latency.py）執行的是同一份流程
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from capture import roi_region
+from matcher import dedup_points
+from scanner import FullScreenScanner, roi_candidates
+from timing import StageTimer
+
+logger = logging.getLogger('PyClick')
+
+CAPTURE_MAX_AGE_MS = 30     # 掃描可共用多舊的截圖（毫秒）
+ROI_MARGIN = 200            # ROI 邊距像素
+ROI_MAX_MISS = 3            # ROI 連續失敗幾次後回到全螢幕掃描
+IDLE_BACKOFF_STEP = 0.15    # 畫面有變動但沒找到：每次間隔增加 auto_interval 的比例
+IDLE_BACKOFF_MAX = 2.5      # 畫面有變動時的退避上限（auto_interval 的倍數）
+STATIC_BACKOFF_STEP = 0.5   # 畫面靜止：每輪間隔乘上 2 ** 此值（約每兩輪加倍）
+STATIC_BACKOFF_MAX = 8.0    # 畫面靜止時的退避上限（auto_interval 的倍數）
+FOUND_INTERVAL_RATIO = 0.5  # 找到目標後下一輪的間隔（auto_interval 的倍數）
+NEAR_CHANGE_RATIO = 0.25    # 已知目標附近有變動時的間隔（auto_interval 的倍數）
+MAX_REACTION_TIME = 2.0     # 最差反應時間上限（秒，0 = 不限制）
+BACKOFF_GRACE = 5.0         # 距離上次找到目標（或開始）超過幾秒才開始退避
+MIN_SCAN_DELAY = 0.01       # 兩輪之間最少等待（秒）
+RATE_SMOOTHING = 0.1        # 變動率 / 命中率 / 耗時的指數平滑係數
+KNOWN_TARGETS = 8           # 記住最近幾個匹配位置（判斷變動是否在目標附近）
+MULTI_CLICK_PAUSE = 0.15    # 同一輪點擊多個位置時，兩次點擊之間的停頓（秒）
+
+
+class ScanScheduler:
+    """決定下一輪掃描前要等多久
+
+    - 找到目標：縮短間隔（接著處理 / 確認）
+    - 已知目標附近有變動：提高掃描頻率
+    - 剛找到過目標（BACKOFF_GRACE 秒內）：照 auto_interval，目標很可能很快再出現
+    - 有變動但沒找到：線性退避（命中率高時上限較低）
+    - 畫面靜止：指數退避（畫面平常就常變動時退得較慢）
+    最後限制「最差反應時間」：目標在截圖後立刻出現，要等到下一輪截圖並處理完才看得到，
+    約為 等待 + 2 × 每輪耗時，等待時間不超過 max_reaction - 2 × 耗時。
+    這個上限只縮短退避，不會低於使用者設定的 auto_interval；
+    每輪太慢、上限做不到時就照 auto_interval 等待（不會變成連續掃描）
+    """
+
+    def __init__(self, max_reaction=MAX_REACTION_TIME, adaptive=True):
+        self.max_reaction = max_reaction    # 最差反應時間上限（秒，0 = 不限制）
+        self.adaptive = adaptive            # False = 固定 auto_interval（對照用）
+        self.reset()
+
+    def reset(self):
+        self.change_rate = 0.0      # 畫面有變動的輪數比例（平滑）
+        self.hit_rate = 0.0         # 找到目標的輪數比例（平滑）
+        self.cost = 0.0             # 每輪耗時（秒，平滑）
+        self.idle_streak = 0        # 連續未找到次數
+        self.static_streak = 0      # 連續畫面靜止次數
+        self._found = False
+        self._near = False
+        self._found_at = time.monotonic()   # 上次找到目標的時間（開始時視為剛找到）
+        self._bound_warned = False
+
+    def record(self, cost, changed, found, near_target=False):
+        """記錄一輪結果（changed=None 表示這輪沒做變動偵測，例如 ROI 掃描）"""
+        a = RATE_SMOOTHING
+        self.cost = cost if not self.cost else self.cost + a * (cost - self.cost)
+        self.hit_rate += a * (float(found) - self.hit_rate)
+        if changed is not None:
+            self.change_rate += a * (float(changed) - self.change_rate)
+        self.static_streak = self.static_streak + 1 if changed is False else 0
+        self.idle_streak = 0 if found else self.idle_streak + 1
+        self._found = found
+        self._near = near_target
+        if found:
+            self._found_at = time.monotonic()
+
+    def next_delay(self, auto_interval):
+        """下一輪前的等待時間（秒）"""
+        if not self.adaptive:
+            return auto_interval
+        if self._found:
+            delay = auto_interval * FOUND_INTERVAL_RATIO
+        elif self._near:
+            delay = auto_interval * NEAR_CHANGE_RATIO
+        elif time.monotonic() - self._found_at < BACKOFF_GRACE:
+            delay = auto_interval
+        elif self.static_streak:
+            exponent = self.static_streak * STATIC_BACKOFF_STEP * (1 - self.change_rate)
+            delay = auto_interval * min(2 ** exponent, STATIC_BACKOFF_MAX)
+        else:
+            # 最近常找到目標時退避上限較低（目標很可能很快又出現）
+            cap = 1 + (IDLE_BACKOFF_MAX - 1) * (1 - self.hit_rate)
+            delay = auto_interval * min(1 + self.idle_streak * IDLE_BACKOFF_STEP, cap)
+        return self._bound(delay, auto_interval)
+
+    def _bound(self, delay, auto_interval):
+        if self.max_reaction > 0 and delay > auto_interval:
+            room = self.max_reaction - 2 * self.cost
+            if room < auto_interval and not self._bound_warned:
+                self._bound_warned = True
+                logger.warning(f"最長反應 {self.max_reaction:g} 秒做不到（掃描間隔 {auto_interval:g} 秒、"
+                               f"每輪耗時 {self.cost * 1000:.0f} ms），退避只縮短到掃描間隔")
+            delay = min(delay, max(room, auto_interval))
+        return max(delay, MIN_SCAN_DELAY)
+
+
+class AutoScanner:
+    """自動模式的掃描狀態：上次匹配位置、ROI 失敗次數、掃描排程"""
+
+    def __init__(self, capture, scanner=None, roi_margin=ROI_MARGIN, roi_max_miss=ROI_MAX_MISS,
+                 timer=None, scheduler=None, lock=None):
+        self.capture = capture
+        self.scanner = scanner or FullScreenScanner()
+        self.timer = timer or StageTimer()      # 各階段耗時
+        self.scheduler = scheduler or ScanScheduler()
+        self.roi_margin = roi_margin
+        self.roi_max_miss = roi_max_miss        # 0 = 不使用 ROI
+        # ROI 狀態會被 UI 執行緒清除（forget_roi），存取都要持有 _lock；
+        # 擁有者可傳入自己的鎖（需可重入），持有該鎖時也能呼叫這裡的方法
+        self._lock = lock or threading.RLock()
+        self.last_match_pos = None              # (x, y) 上次找到的螢幕位置
+        self.roi_miss_count = 0                 # ROI 連續未找到次數
+        self.targets = collections.deque(maxlen=KNOWN_TARGETS)   # 最近的匹配位置（已排除暫不點的位置）
+        self._last = (0.0, None, False)         # 最近一輪的 (耗時, 是否變動, 是否在目標附近)
+        self.recorded_frame = None              # 最近一輪畫面的錄製序號（None = 未錄製 / 被丟棄）
+
+    def start(self):
+        """自動模式啟動時呼叫（重置掃描排程）"""
+        self.scheduler.reset()
+
+    def forget_roi(self):
+        """清除上次匹配位置與已知目標（模板變更時），下一輪回到全螢幕掃描"""
+        with self._lock:
+            self.last_match_pos = None
+            self.roi_miss_count = 0
+            self.targets.clear()
+
+    def mark_match(self, pos):
+        """記錄匹配（點擊）位置，下一輪先掃描它附近"""
+        with self._lock:
+            self.last_match_pos = pos
+
+    def roi_target(self):
+        """這一輪要掃描的 ROI 中心（螢幕座標），不用 ROI 時回傳 None"""
+        with self._lock:
+            if self.last_match_pos is not None and self.roi_miss_count < self.roi_max_miss:
+                return self.last_match_pos
+            return None
+
+    @property
+    def use_roi(self):
+        return self.roi_target() is not None
+
+    def scan(self, templates, use_color, threshold, max_level, top_k=None, recorder=None):
+        """截圖並匹配一輪，回傳去重後的中心點（螢幕座標）；全螢幕畫面沒變則回傳 None"""
+        timer = self.timer
+        target = self.roi_target()
+        use_roi = target is not None
+        start = time.perf_counter()
+        with timer.stage("capture"):
+            if use_roi:
+                # ROI 很小（約全螢幕 8%），直接做 matchTemplate（跳過變動偵測）
+                cx, cy = target
+                region = roi_region(self.capture.monitor, cx, cy, self.roi_margin)
+                frame = self.capture.get_frame(CAPTURE_MAX_AGE_MS, region)
+            else:
+                frame = self.capture.get_frame(CAPTURE_MAX_AGE_MS)
+        self.recorded_frame = recorder.add_frame(frame) if recorder else None
+        with timer.stage("convert"):
+            # 轉換結果存在 Frame 內，後面直接沿用；全螢幕只先轉灰階（變動偵測用），
+            # 彩色要等畫面有變動、真的要匹配時才轉
+            if use_roi:
+                frame.match_image(use_color)
+            else:
+                frame.gray
+
+        if use_roi:
+            with timer.stage("match"):
+                matches, best_score = roi_candidates(frame, templates, use_color, threshold, top_k)
+        else:
+            # 全螢幕：分塊變動偵測，只重新匹配變動區域
+            with timer.stage("detect"):
+                changed = self.scanner.changed(frame)
+            # 畫面完全沒變 → 沿用上次結果（上次沒找到就不用再匹配）
+            if not changed:
+                timer.count("scans")
+                timer.count("scans_skipped")
+                timer.tick(matched=False)
+                self._trace(start, use_roi, None)
+                self.scheduler.record(time.perf_counter() - start, False, False)
+                return None
+            with self._lock:
+                targets = list(self.targets)
+            near = self.scanner.changed_near(targets, self.roi_margin)
+            with timer.stage("match"):
+                matches = self.scanner.scan(frame, templates, use_color, threshold, max_level, top_k)
+            best_score = self.scanner.best_score
+
+        # 去除重複位置（不同模板可能匹配到同一處）
+        with timer.stage("dedup"):
+            matches = dedup_points(matches)
+        timer.count("scans")
+        timer.count("matches", len(matches))
+        if use_roi:
+            timer.count("roi_hits" if matches else "roi_misses")
+        timer.tick(best_score)
+        self._trace(start, use_roi, matches, best_score)
+        self._last = (time.perf_counter() - start, None if use_roi else True, False if use_roi else near)
+        return matches
+
+    def _trace(self, start, use_roi, matches, best_score=None):
+        """整輪掃描記錄到追蹤時間軸（有開啟追蹤時）"""
+        tracer = self.timer.tracer
+        if tracer is None:
+            return
+        args = {"roi": use_roi, "changed": matches is not None}
+        if matches is not None:
+            args["matches"] = len(matches)
+        if best_score is not None:
+            args["best_score"] = round(best_score, 4)
+        tracer.complete("scan", "scan", start, time.perf_counter(), args)
+
+    def update(self, found):
+        """記錄這輪有沒有找到（ROI 失敗次數、掃描排程）；畫面沒變的輪次不用呼叫"""
+        with self._lock:
+            if found:
+                self.roi_miss_count = 0
+            else:
+                self.roi_miss_count += 1
+        cost, changed, near = self._last
+        self.scheduler.record(cost, changed, found, near)
+
+    def next_delay(self, auto_interval):
+        """下一輪前的等待時間（秒）"""
+        return self.scheduler.next_delay(auto_interval)
+
+    def run_round(self, templates, use_color, threshold, max_level, auto_interval, click,
+                  top_k=None, recorder=None, can_click=None, filter_matches=None):
+        """自動模式的一輪，回傳下一輪前要等待的秒數
+
+        click(x, y): 點擊一個位置；can_click(): 第一個位置點擊前的冷卻檢查（None = 不檢查）；
+        filter_matches(matches): 排除暫時不點的位置（None = 不過濾）
+        """
+        matches = self.scan(templates, use_color, threshold, max_level, top_k, recorder)
+        # 畫面完全沒變 → 沿用上次結果（上次沒找到就不用再匹配）
+        if matches is None:
+            return self.next_delay(auto_interval)
+        if filter_matches is not None:
+            matches = filter_matches(matches)
+        # 只記住實際會點的位置：暫不點的位置不算已知目標
+        with self._lock:
+            self.targets.extend(matches[:KNOWN_TARGETS])
+        found = len(matches) > 0
+        self.update(found)
+
+        clicked = []
+        if found:
+            logger.info(f"找到 {len(matches)} 處匹配")
+            for idx, (cx, cy) in enumerate(matches):
+                self.mark_match((cx, cy))
+                if idx == 0 and can_click is not None and not can_click():
+                    break
+                click(cx, cy)
+                clicked.append((cx, cy))
+                # 點擊後畫面會變，下一輪整張重新匹配
+                self.scanner.reset()
+                if idx < len(matches) - 1:
+                    time.sleep(MULTI_CLICK_PAUSE)
+
+        if recorder:
+            recorder.add_matches(self.recorded_frame, matches, clicked)
+        return self.next_delay(auto_interval)
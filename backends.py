@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+PyClick 截圖來源模組
+所有來源都和 mss 一樣的介面（with 開關、monitors[0] = 整個畫面、grab(monitor) 回傳 BGRA），
+CaptureService / grab_frame 不需要知道畫面從哪來：
+- mss：即時螢幕（預設）
+- ReplayBackend：重播資料夾內的圖片、影片檔或 .pyrec 錄製檔（可重現的測試 / 效能量測）
+- SyntheticBackend：程式產生的畫面，可在指定位置放目標圖（不需要螢幕）
+"""
+
+import os
+import threading
+import time
+
+import cv2
+import mss
+import numpy as np
+
+from recorder import RECORDING_EXT, SessionReader
+
+CAPTURE_BACKEND_ENV = "PYCLICK_CAPTURE"   # 環境變數：截圖來源設定字串
+REPLAY_IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+def _to_bgra(image):
+    """任意通道數的影像 → BGRA"""
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+    if image.shape[2] == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+    return image
+
+
+def _crop(bgra, screen, monitor):
+    """從整個畫面裁出 monitor 區域（共用記憶體）"""
+    x = monitor["left"] - screen["left"]
+    y = monitor["top"] - screen["top"]
+    if x < 0 or y < 0 or x + monitor["width"] > screen["width"] or y + monitor["height"] > screen["height"]:
+        raise ValueError(f"截圖區域超出畫面: {monitor}")
+    return bgra[y:y + monitor["height"], x:x + monitor["width"]]
+
+
+class ReplayBackend:
+    """重播錄好的畫面
+
+    source 為資料夾（圖片依檔名排序）、影片檔或 .pyrec 錄製檔（見 recorder.py）。
+    fps=None 時每次截圖前進一張（完全可重現）；指定 fps 則依經過時間決定播到哪一張。
+    播完後 loop=True 從頭開始，否則停在最後一張。
+    """
+
+    def __init__(self, source, fps=None, loop=True, left=0, top=0):
+        self.source = source
+        self.fps = fps
+        self.loop = loop
+        self.left = left
+        self.top = top
+        self.monitors = []
+        self.grab_count = 0
+        self._files = None
+        self._session = None
+        self._video = None
+        self._current = None
+        self._position = 0       # 目前這張的序號（從開始播放累計）
+        self._start = None
+
+    def __enter__(self):
+        if os.path.isdir(self.source):
+            self._files = sorted(
+                os.path.join(self.source, f) for f in os.listdir(self.source)
+                if f.lower().endswith(REPLAY_IMAGE_EXTS))
+            if not self._files:
+                raise ValueError(f"資料夾內沒有圖片: {self.source}")
+        elif self.source.lower().endswith(RECORDING_EXT):
+            self._session = SessionReader(self.source)
+            if not len(self._session):
+                raise ValueError(f"錄製檔內沒有畫面: {self.source}")
+            # 錄製檔記錄了原本的螢幕位置
+            self.left, self.top = self._session.screen["left"], self._session.screen["top"]
+            self._files = range(len(self._session))
+        else:
+            self._video = cv2.VideoCapture(self.source)
+            if not self._video.isOpened():
+                raise ValueError(f"無法開啟影片: {self.source}")
+
+        self._current = self._read_first()
+        h, w = self._current.shape[:2]
+        self.monitors = [{"left": self.left, "top": self.top, "width": w, "height": h}]
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+        if self._video is not None:
+            self._video.release()
+            self._video = None
+
+    def _read_first(self):
+        self._position = 0
+        if self._files is not None:
+            return self._load(self._files[0])
+        ok, image = self._video.read()
+        if not ok:
+            raise ValueError(f"影片沒有畫面: {self.source}")
+        return _to_bgra(image)
+
+    def _load(self, item):
+        """item：圖片路徑，或錄製檔的畫面序號"""
+        if self._session is not None:
+            return self._session.frame(item)
+        image = cv2.imread(item, cv2.IMREAD_UNCHANGED)
+        if image is None:
+            raise ValueError(f"無法讀取圖片: {item}")
+        return _to_bgra(image)
+
+    def _advance(self, steps):
+        """往後播 steps 張"""
+        if self._files is not None:
+            n = len(self._files)
+            target = self._position + steps
+            if target >= n and not self.loop:
+                target = n - 1
+            if target != self._position:
+                self._current = self._load(self._files[target % n])
+            self._position = target
+            return
+
+        for _ in range(steps):
+            ok, image = self._video.read()
+            if not ok:
+                if not self.loop:
+                    return      # 停在最後一張
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, image = self._video.read()
+                if not ok:
+                    return
+            self._current = _to_bgra(image)
+            self._position += 1
+
+    def grab(self, monitor):
+        if self.grab_count > 0:
+            if self.fps:
+                self._advance(max(0, int((time.time() - self._start) * self.fps) - self._position))
+            else:
+                self._advance(1)
+        self.grab_count += 1
+        return _crop(self._current, self.monitors[0], monitor)
+
+
+class SyntheticBackend:
+    """程式產生的畫面：固定亂數種子的平滑雜訊背景 + 任意放置的目標圖
+
+    place() / remove() 可以在執行中讓目標出現或消失（可跨執行緒呼叫），
+    用來量測從畫面變化到點擊的反應時間
+    """
+
+    def __init__(self, width=1920, height=1080, seed=0, left=0, top=0):
+        rng = np.random.default_rng(seed)
+        noise = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        self._background = _to_bgra(cv2.GaussianBlur(noise, (0, 0), 3))
+        self.monitors = [{"left": left, "top": top, "width": width, "height": height}]
+        self.grab_count = 0
+        self._targets = {}       # key -> (BGRA 影像, 螢幕 x, 螢幕 y)
+        self._next_key = 0
+        self._screen = self._background
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def place(self, image, x, y, key=None):
+        """在螢幕座標 (x, y)（左上角）放一張目標圖，回傳 key"""
+        with self._lock:
+            if key is None:
+                key = self._next_key
+                self._next_key += 1
+            self._targets[key] = (_to_bgra(image), x, y)
+            self._screen = None
+        return key
+
+    def remove(self, key):
+        with self._lock:
+            self._targets.pop(key, None)
+            self._screen = None
+
+    def clear(self):
+        with self._lock:
+            self._targets.clear()
+            self._screen = None
+
+    def _compose(self):
+        """背景 + 所有目標圖（目標改變後才重畫）"""
+        screen = self._background.copy()
+        ox, oy = self.monitors[0]["left"], self.monitors[0]["top"]
+        for image, x, y in self._targets.values():
+            h, w = image.shape[:2]
+            x1, y1 = max(0, x - ox), max(0, y - oy)
+            x2 = min(screen.shape[1], x - ox + w)
+            y2 = min(screen.shape[0], y - oy + h)
+            if x2 > x1 and y2 > y1:
+                screen[y1:y2, x1:x2] = image[y1 - (y - oy):y2 - (y - oy), x1 - (x - ox):x2 - (x - ox)]
+        return screen
+
+    def grab(self, monitor):
+        with self._lock:
+            if self._screen is None:
+                self._screen = self._compose()
+            screen = self._screen
+        self.grab_count += 1
+        return _crop(screen, self.monitors[0], monitor)
+
+
+def backend_from_spec(spec=None):
+    """由設定字串建立截圖來源工廠（在截圖執行緒內呼叫才建立來源）
+
+    spec: "mss"（即時螢幕）、"replay:<資料夾或影片>[@fps]"、"synthetic[:<寬>x<高>]"，
+    None 則讀環境變數 PYCLICK_CAPTURE，沒設定就是 mss
+    """
+    if spec is None:
+        spec = os.environ.get(CAPTURE_BACKEND_ENV) or "mss"
+    kind, _, arg = spec.partition(":")
+    kind = kind.strip().lower()
+
+    if kind == "mss":
+        return mss.mss
+    if kind == "replay":
+        source, _, fps = arg.rpartition("@") if "@" in arg else (arg, "", "")
+        if not source:
+            raise ValueError("replay 需要指定資料夾或影片: replay:<路徑>")
+        return lambda: ReplayBackend(source, fps=float(fps) if fps else None)
+    if kind == "synthetic":
+        width, height = (int(v) for v in (arg or "1920x1080").lower().split("x"))
+        return lambda: SyntheticBackend(width, height)
+    raise ValueError(f"未知的截圖來源: {spec}")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+PyClick 反應時間量測：從目標出現在畫面上到送出點擊
+不需要螢幕：SyntheticBackend 當截圖來源（在已知時間點放上目標），RecordingInput 當輸入來源
+（只記錄點擊時間），中間跑和自動模式相同的掃描流程（autoscan.AutoScanner）。
+
+每次試驗：移除目標 → 等一段隨機時間（讓閒置退避累積）→ 放上目標並記下時間 → 等到點擊。
+掃描間隔、掃描排程、ROI 三種設定交叉量測，輸出 p50 / p95 / p99 反應時間（JSON）。
+
+排程設定：
+    adaptive 依變動頻率 / 命中率調整間隔（autoscan.ScanScheduler，受 --max-reaction 限制）
+    fixed    固定 auto_interval
+
+ROI 設定：
+    same     目標每次出現在同一位置（ROI 命中）
+    moving   目標每次出現在隨機位置（ROI 失敗後回到全螢幕）
+    off      不使用 ROI
+
+用法：
+    python bench_latency.py                    # 完整組合
+    python bench_latency.py --quick            # 快速檢查
+    python bench_latency.py --intervals 0.5 --roi same off --trials 30
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from autoscan import AutoScanner, MAX_REACTION_TIME, ROI_MAX_MISS, ScanScheduler
+from backends import SyntheticBackend
+from bench_matching import make_templates, RESULTS_DIR
+from capture import CaptureService
+from inputs import RecordingInput
+from matcher import PYRAMID_MAX_LEVEL
+
+INTERVALS = [0.1, 0.25, 0.5, 1.0]
+SCHEDULES = ["adaptive", "fixed"]
+ROI_MODES = ["same", "moving", "off"]
+IDLE_RANGE = (0.5, 3.0)     # 目標出現前的閒置時間範圍（秒）
+
+
+def auto_loop(autoscan, inputs, templates, use_color, threshold, max_level, interval, stop):
+    """自動模式迴圈：每輪執行與 TrayClicker._auto_loop 相同的 AutoScanner.run_round，
+    點擊送到 RecordingInput（不含 UI、冷卻、CPU 預算與定時停止）"""
+    autoscan.start()
+    while not stop.is_set():
+        delay = autoscan.run_round(templates, use_color, threshold, max_level, interval, inputs.click)
+        stop.wait(delay)
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "mean_ms": round(float(ms.mean()), 2),
+        "max_ms": round(float(ms.max()), 2),
+    }
+
+
+def bench_config(args, interval, schedule, roi, rng):
+    """一組設定跑 args.trials 次試驗，回傳統計"""
+    width, height = args.size
+    # 模糊雜訊切出的模板對比很低，和背景的平均差異剛好落在變動偵測門檻附近，
+    # 偵測得到與否取決於出現位置；拉開對比，量到的才是排程與掃描的延遲
+    templates = [cv2.normalize(t, None, 0, 255, cv2.NORM_MINMAX) for t in make_templates(args.templates)]
+    target = templates[0]
+    backend = SyntheticBackend(width, height)
+    capture = CaptureService(backend=lambda: backend)
+    scheduler = ScanScheduler(max_reaction=args.max_reaction, adaptive=schedule == "adaptive")
+    autoscan = AutoScanner(capture, roi_max_miss=0 if roi == "off" else ROI_MAX_MISS, scheduler=scheduler)
+    inputs = RecordingInput()
+    match_templates = templates if args.mode == "color" else [
+        cv2.cvtColor(t, cv2.COLOR_BGR2GRAY) for t in templates]
+
+    stop = threading.Event()
+    loop = threading.Thread(target=auto_loop, daemon=True, args=(
+        autoscan, inputs, match_templates, args.mode == "color", args.threshold,
+        args.max_level, interval, stop))
+    loop.start()
+
+    th, tw = target.shape[:2]
+    fixed = (int(rng.integers(0, width - tw)), int(rng.integers(0, height - th)))
+    latencies, missed = [], 0
+    timeout = max(5.0, interval * 10)
+    try:
+        for _ in range(args.trials):
+            backend.clear()
+            stop.wait(rng.uniform(*args.idle))
+            x, y = fixed if roi != "moving" else (
+                int(rng.integers(0, width - tw)), int(rng.integers(0, height - th)))
+            backend.place(target, x, y)
+            appeared = time.perf_counter()
+            event = inputs.wait_for("down", after=appeared, timeout=timeout)
+            if event is None:
+                missed += 1
+                continue
+            latencies.append(event[0] - appeared)
+    finally:
+        stop.set()
+        loop.join()
+        capture.stop()
+
+    return {
+        "interval": interval, "schedule": schedule, "roi": roi,
+        "trials": args.trials, "clicked": len(latencies), "missed": missed,
+        "grabs": backend.grab_count,
+        **percentiles(latencies),
+    }
+
+
+def metadata(args):
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "size": list(args.size),
+        "templates": args.templates,
+        "mode": args.mode,
+        "threshold": args.threshold,
+        "pyramid_max_level": args.max_level,
+        "idle_range": list(args.idle),
+        "max_reaction": args.max_reaction,
+        "note": "反應時間 = 目標放上合成畫面 → 送出滑鼠按下；不含音效提示與點擊冷卻",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyClick 反應時間量測")
+    parser.add_argument("--intervals", nargs="+", type=float, default=INTERVALS, help="掃描間隔（秒）")
+    parser.add_argument("--schedule", nargs="+", choices=SCHEDULES, default=SCHEDULES, help="掃描排程")
+    parser.add_argument("--max-reaction", type=float, default=MAX_REACTION_TIME,
+                        help="自適應排程的最差反應時間上限（秒，0 = 不限制）")
+    parser.add_argument("--roi", nargs="+", choices=ROI_MODES, default=ROI_MODES)
+    parser.add_argument("--trials", type=int, default=10, help="每組設定的試驗次數")
+    parser.add_argument("--size", type=lambda s: tuple(int(v) for v in s.lower().split("x")),
+                        default=(1920, 1080), help="畫面大小，例如 3840x2160")
+    parser.add_argument("--templates", type=int, default=1, help="模板數（只有第一個會出現在畫面上）")
+    parser.add_argument("--mode", choices=["color", "gray"], default="gray")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--max-level", type=int, default=PYRAMID_MAX_LEVEL, help="金字塔層數")
+    parser.add_argument("--idle", nargs=2, type=float, default=IDLE_RANGE, metavar=("MIN", "MAX"),
+                        help="目標出現前的閒置時間範圍（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="快速檢查（間隔 0.25 / 0.5 秒、每組 5 次）")
+    parser.add_argument("--output", help="結果 JSON 路徑（預設 bench_results/latency-<時間>.json）")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.intervals = [0.25, 0.5]
+        args.trials = 5
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("latency-%Y%m%d-%H%M%S.json"))
+    report = {"meta": metadata(args), "results": []}
+
+    for i, interval in enumerate(args.intervals):
+        for schedule in args.schedule:
+            for roi in args.roi:
+                # 同一間隔 + ROI 設定的各排程用相同的亂數（閒置時間、出現位置相同），才能直接比較
+                rng = np.random.default_rng([args.seed, i, ROI_MODES.index(roi)])
+                stats = bench_config(args, interval, schedule, roi, rng)
+                report["results"].append(stats)
+                print(f"間隔 {interval:5.2f}s 排程 {schedule:>8} ROI {roi:>6}: "
+                      f"p50 {stats.get('p50_ms', 0):7.1f} ms  p95 {stats.get('p95_ms', 0):7.1f} ms  "
+                      f"p99 {stats.get('p99_ms', 0):7.1f} ms  未點擊 {stats['missed']}/{stats['trials']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {output}")
+
+
+if __name__ == "__main__":
+    main()
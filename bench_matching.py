@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+PyClick 匹配效能量測
+不需要螢幕：用 SyntheticBackend 產生畫面並放上目標圖，直接呼叫自動模式用的掃描函式
+（scanner.match_roi / FullScreenScanner），量測不同解析度、模板數、彩色 / 灰階、門檻值的耗時。
+
+情境：
+    find_all     每個模板全解析度逐一匹配（沒有金字塔 / 增量，對照組）
+    roi          ROI 分支：目標附近 ±ROI_MARGIN 的小區域
+    full_cold    全螢幕分支：整張重新匹配（啟動、點擊後）
+    full_incr    全螢幕分支：只有一個目標移動（增量掃描）
+    full_idle    全螢幕分支：畫面沒變（只做變動偵測）
+
+結果寫成 JSON（每個組合一筆，含中位數 / p95 / 最小耗時、CPU 時間與換算的 CPU 使用率）
+
+用法：
+    python bench_matching.py                  # 完整組合
+    python bench_matching.py --quick          # 快速檢查
+    python bench_matching.py --resolutions 4k --templates 1 20 --thresholds 0.8
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from backends import SyntheticBackend
+from capture import grab_frame, roi_region
+from matcher import find_all_matches, PYRAMID_MAX_LEVEL
+from scanner import FullScreenScanner, match_roi
+
+# 名稱 -> 各螢幕 (寬, 高)，多螢幕時左右並排（主螢幕在右，左邊螢幕座標為負）
+RESOLUTIONS = {
+    "1080p": [(1920, 1080)],
+    "1440p": [(2560, 1440)],
+    "4k": [(3840, 2160)],
+    "dual-1080p": [(1920, 1080), (1920, 1080)],
+}
+TEMPLATE_COUNTS = [1, 5, 20, 50]
+THRESHOLDS = [0.5, 0.7, 0.8, 0.95]
+SCENARIOS = ["find_all", "roi", "full_cold", "full_incr", "full_idle"]
+TEMPLATE_SIZES = (24, 32, 48, 64)
+ROI_MARGIN = 200            # 與 tray_clicker 的 _roi_margin 相同
+AUTO_INTERVAL = 0.5         # 換算 CPU 使用率用的掃描間隔（秒，tray_clicker 預設值）
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+
+
+def make_templates(count, seed=1):
+    """從另一張雜訊圖切出模板（大小輪流），不會和背景本身相似"""
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (512, 512, 3), dtype=np.uint8)
+    texture = cv2.GaussianBlur(noise, (0, 0), 2)
+    templates = []
+    for i in range(count):
+        size = TEMPLATE_SIZES[i % len(TEMPLATE_SIZES)]
+        x, y = rng.integers(0, 512 - size, 2)
+        templates.append(texture[y:y + size, x:x + size].copy())
+    return templates
+
+
+def make_backend(monitors, templates, seed=0):
+    """合成畫面，一半的模板放在畫面上（其餘找不到，反映實際上大部分模板沒出現的情況）"""
+    width = sum(w for w, _ in monitors)
+    height = max(h for _, h in monitors)
+    left = -sum(w for w, _ in monitors[:-1])
+    backend = SyntheticBackend(width, height, seed=seed, left=left, top=0)
+    rng = np.random.default_rng(seed + 1)
+    placed = []
+    for i, template in enumerate(templates[::2]):
+        th, tw = template.shape[:2]
+        x = left + int(rng.integers(0, width - tw))
+        y = int(rng.integers(0, height - th))
+        backend.place(template, x, y, key=i)
+        placed.append((i, template, x, y))
+    return backend, placed
+
+
+def summarize(wall, cpu, matches, interval):
+    wall = np.array(wall) * 1000
+    cpu = np.array(cpu) * 1000
+    cpu_med = float(np.median(cpu))
+    wall_med = float(np.median(wall))
+    return {
+        "runs": len(wall),
+        "wall_ms_median": round(wall_med, 3),
+        "wall_ms_p95": round(float(np.percentile(wall, 95)), 3),
+        "wall_ms_min": round(float(wall.min()), 3),
+        "cpu_ms_median": round(cpu_med, 3),
+        # 每輪工作 + 睡 interval 秒（自動模式的迴圈節奏），單核 CPU 使用率
+        "cpu_percent": round(100 * cpu_med / (wall_med + interval * 1000), 2),
+        "matches": matches,
+    }
+
+
+def timed(fn, repeat, prepare=None):
+    """執行 repeat 次，回傳 (每次牆鐘時間, 每次 CPU 時間, 最後一次結果)；prepare 不計時"""
+    wall, cpu, result = [], [], None
+    for _ in range(repeat):
+        args = prepare() if prepare else ()
+        c0, t0 = time.process_time(), time.perf_counter()
+        result = fn(*args)
+        wall.append(time.perf_counter() - t0)
+        cpu.append(time.process_time() - c0)
+    return wall, cpu, result
+
+
+def bench_config(monitors, count, use_color, threshold, scenarios, repeat, max_level, interval):
+    """一組（解析度、模板數、彩色/灰階、門檻值）跑所有情境"""
+    templates = make_templates(count)
+    backend, placed = make_backend(monitors, templates)
+    if not use_color:
+        templates = [cv2.cvtColor(t, cv2.COLOR_BGR2GRAY) for t in templates]
+    monitor = backend.monitors[0]
+    results = {}
+
+    def grab(region=None):
+        return grab_frame(backend, region)
+
+    if "find_all" in scenarios:
+        def run(frame):
+            image = frame.match_image(use_color)
+            found = []
+            for t in templates:
+                found.extend(find_all_matches([image], t, threshold, frame.left, frame.top))
+            return found
+        wall, cpu, found = timed(run, repeat, lambda: (grab(),))
+        results["find_all"] = summarize(wall, cpu, len(found), interval)
+
+    if "roi" in scenarios and placed:
+        _, template, x, y = placed[0]
+        th, tw = template.shape[:2]
+        region = roi_region(monitor, x + tw // 2, y + th // 2, ROI_MARGIN)
+        wall, cpu, found = timed(
+            lambda frame: match_roi(frame, templates, use_color, threshold),
+            repeat, lambda: (grab(region),))
+        results["roi"] = summarize(wall, cpu, len(found), interval)
+
+    scanner = FullScreenScanner()
+
+    def scan(frame):
+        if not scanner.changed(frame):
+            return None
+        return scanner.scan(frame, templates, use_color, threshold, max_level)
+
+    if "full_cold" in scenarios:
+        def prepare_cold():
+            scanner.reset()
+            return (grab(),)
+        wall, cpu, found = timed(scan, repeat, prepare_cold)
+        results["full_cold"] = summarize(wall, cpu, len(found), interval)
+
+    if "full_incr" in scenarios and placed:
+        key, template, x0, y0 = placed[0]
+        step = [0]
+
+        def prepare_incr():
+            # 目標每輪往右移 16 像素（小範圍變動）
+            step[0] += 1
+            backend.place(template, x0 + 16 * (step[0] % 8), y0, key=key)
+            return (grab(),)
+        scanner.reset()
+        scan(grab())
+        wall, cpu, found = timed(scan, repeat, prepare_incr)
+        results["full_incr"] = summarize(wall, cpu, len(found), interval)
+
+    if "full_idle" in scenarios:
+        scanner.reset()
+        scan(grab())
+        wall, cpu, found = timed(scan, repeat, lambda: (grab(),))
+        results["full_idle"] = summarize(wall, cpu, 0 if found is None else len(found), interval)
+
+    return results
+
+
+def metadata(args):
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "repeat": args.repeat,
+        "pyramid_max_level": args.max_level,
+        "auto_interval": args.interval,
+        "note": "只計匹配時間，不含截圖；cpu_percent 以單核計",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyClick 匹配效能量測")
+    parser.add_argument("--resolutions", nargs="+", choices=list(RESOLUTIONS), default=list(RESOLUTIONS))
+    parser.add_argument("--templates", nargs="+", type=int, default=TEMPLATE_COUNTS, help="模板數")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=THRESHOLDS)
+    parser.add_argument("--modes", nargs="+", choices=["color", "gray"], default=["color", "gray"])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--repeat", type=int, default=10, help="每個情境執行次數")
+    parser.add_argument("--max-level", type=int, default=PYRAMID_MAX_LEVEL, help="金字塔層數")
+    parser.add_argument("--interval", type=float, default=AUTO_INTERVAL, help="換算 CPU 使用率的掃描間隔（秒）")
+    parser.add_argument("--quick", action="store_true", help="快速檢查（1080p / 4K、1 與 20 個模板、門檻 0.8、3 次）")
+    parser.add_argument("--output", help="結果 JSON 路徑（預設 bench_results/matching-<時間>.json）")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.resolutions = ["1080p", "4k"]
+        args.templates = [1, 20]
+        args.thresholds = [0.8]
+        args.repeat = 3
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("matching-%Y%m%d-%H%M%S.json"))
+    report = {"meta": metadata(args), "results": []}
+
+    for name in args.resolutions:
+        for count in args.templates:
+            for mode in args.modes:
+                for threshold in args.thresholds:
+                    results = bench_config(RESOLUTIONS[name], count, mode == "color", threshold,
+                                           args.scenarios, args.repeat, args.max_level, args.interval)
+                    for scenario, stats in results.items():
+                        report["results"].append({
+                            "resolution": name, "templates": count, "mode": mode,
+                            "threshold": threshold, "scenario": scenario, **stats,
+                        })
+                        print(f"{name:>10} {count:>3} 模板 {mode:>5} 門檻 {threshold:.2f} "
+                              f"{scenario:>9}: 中位數 {stats['wall_ms_median']:8.2f} ms  "
+                              f"p95 {stats['wall_ms_p95']:8.2f} ms  CPU {stats['cpu_percent']:5.1f}%  "
+                              f"找到 {stats['matches']}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {output}")
+
+
+if __name__ == "__main__":
+    main()
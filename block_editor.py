@@ -7,149 +7,20 @@ PyClick 積木式腳本編輯器
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from PIL import Image, ImageTk
-import json
+import logging
 import os
-import uuid
 import cv2
-import numpy as np
-import mss
-import time
 import threading
-import pyautogui
-import ctypes
 
-# Windows API
-user32 = ctypes.windll.user32
-kernel32 = ctypes.windll.kernel32
-MOUSEEVENTF_LEFTDOWN = 0x0002
-MOUSEEVENTF_LEFTUP = 0x0004
-MOUSEEVENTF_RIGHTDOWN = 0x0008
-MOUSEEVENTF_RIGHTUP = 0x0010
+# 積木資料結構與執行引擎不依賴 Tk，放在獨立模組（無螢幕也能執行，見 run_script.py）
+from blocks import BLOCK_COLORS, BLOCK_TYPES, Block, Script
+from inputs import input_from_spec
+from script_runner import ScriptRunner
+from tracing import Tracer, tracing_enabled, trace_path
+from uibus import UiBus
 
-# ============================================================
-# 積木類型定義
-# ============================================================
+logger = logging.getLogger('PyClick')
 
-BLOCK_COLORS = {
-    "trigger": "#9966FF",   # 紫色 - 觸發
-    "action": "#4C97FF",    # 藍色 - 動作
-    "keyboard": "#59C059",  # 綠色 - 鍵盤
-    "wait": "#FFBF00",      # 黃色 - 等待
-    "control": "#FF8C1A",   # 橙色 - 控制
-}
-
-BLOCK_TYPES = {
-    # === 觸發類 ===
-    "trigger_hotkey": {
-        "category": "trigger",
-        "label": "當按下 [{key}] 時",
-        "icon": "🎬",
-        "params": {"key": "F7"},
-        "is_trigger": True,
-    },
-    "trigger_image": {
-        "category": "trigger",
-        "label": "當找到 [{image}] 時",
-        "icon": "🎬",
-        "params": {"image": ""},
-        "is_trigger": True,
-    },
-
-    # === 動作類 ===
-    "click": {
-        "category": "action",
-        "label": "點擊 [{image}]",
-        "icon": "🖱️",
-        "params": {"image": ""},
-    },
-    "click_xy": {
-        "category": "action",
-        "label": "點擊座標 X:[{x}] Y:[{y}]",
-        "icon": "🖱️",
-        "params": {"x": 0, "y": 0},
-    },
-    "right_click": {
-        "category": "action",
-        "label": "右鍵 [{image}]",
-        "icon": "🖱️",
-        "params": {"image": ""},
-    },
-    "double_click": {
-        "category": "action",
-        "label": "雙擊 [{image}]",
-        "icon": "🖱️",
-        "params": {"image": ""},
-    },
-    "scroll": {
-        "category": "action",
-        "label": "滾輪 [{direction}] [{amount}] 格",
-        "icon": "🖲️",
-        "params": {"direction": "上", "amount": 3},
-    },
-
-    # === 鍵盤類 ===
-    "press_key": {
-        "category": "keyboard",
-        "label": "按 [{key}]",
-        "icon": "⌨️",
-        "params": {"key": "Enter"},
-    },
-    "hotkey": {
-        "category": "keyboard",
-        "label": "按 [{modifier}]+[{key}]",
-        "icon": "⌨️",
-        "params": {"modifier": "Ctrl", "key": "C"},
-    },
-    "type_text": {
-        "category": "keyboard",
-        "label": "輸入 \"{text}\"",
-        "icon": "📝",
-        "params": {"text": ""},
-    },
-
-    # === 等待類 ===
-    "wait": {
-        "category": "wait",
-        "label": "等待 [{seconds}] 秒",
-        "icon": "⏱️",
-        "params": {"seconds": 1.0},
-    },
-    "wait_image": {
-        "category": "wait",
-        "label": "等到 [{image}] 出現",
-        "icon": "👁️",
-        "params": {"image": "", "timeout": 30},
-    },
-    "wait_image_gone": {
-        "category": "wait",
-        "label": "等到 [{image}] 消失",
-        "icon": "👁️",
-        "params": {"image": "", "timeout": 30},
-    },
-
-    # === 控制類 ===
-    "repeat": {
-        "category": "control",
-        "label": "重複 [{count}] 次",
-        "icon": "🔁",
-        "params": {"count": 3},
-        "has_children": True,
-    },
-    "repeat_until": {
-        "category": "control",
-        "label": "重複直到 [{image}] 出現",
-        "icon": "🔁",
-        "params": {"image": "", "max_iterations": 100},
-        "has_children": True,
-    },
-    "if_image": {
-        "category": "control",
-        "label": "如果 [{image}] 存在",
-        "icon": "❓",
-        "params": {"image": ""},
-        "has_children": True,
-    },
-}
 
 # 常用按鍵選項
 KEY_OPTIONS = [
@@ -164,98 +35,6 @@ KEY_OPTIONS = [
 MODIFIER_OPTIONS = ["Ctrl", "Alt", "Shift", "Ctrl+Shift", "Ctrl+Alt", "Alt+Shift"]
 
 
-# ============================================================
-# Block 資料類別
-# ============================================================
-
-class Block:
-    """積木資料結構"""
-
-    def __init__(self, block_type, params=None, children=None):
-        self.id = str(uuid.uuid4())[:8]
-        self.type = block_type
-        self.params = params or dict(BLOCK_TYPES[block_type]["params"])
-        self.children = children or []
-
-    def to_dict(self):
-        """轉換為字典"""
-        return {
-            "id": self.id,
-            "type": self.type,
-            "params": self.params,
-            "children": [c.to_dict() for c in self.children],
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        """從字典建立"""
-        block = cls(data["type"], data.get("params"))
-        block.id = data.get("id", str(uuid.uuid4())[:8])
-        block.children = [cls.from_dict(c) for c in data.get("children", [])]
-        return block
-
-    def get_label(self):
-        """取得顯示標籤"""
-        info = BLOCK_TYPES[self.type]
-        label = info["label"]
-        for key, value in self.params.items():
-            # 圖像參數顯示檔名
-            if key == "image" and value:
-                display = os.path.basename(value) if value else "(未設定)"
-            else:
-                display = str(value)
-            label = label.replace(f"[{{{key}}}]", f"[{display}]")
-        return f"{info['icon']} {label}"
-
-    def get_color(self):
-        """取得積木顏色"""
-        category = BLOCK_TYPES[self.type]["category"]
-        return BLOCK_COLORS[category]
-
-    def has_children(self):
-        """是否可包含子積木"""
-        return BLOCK_TYPES[self.type].get("has_children", False)
-
-    def is_trigger(self):
-        """是否為觸發積木"""
-        return BLOCK_TYPES[self.type].get("is_trigger", False)
-
-
-# ============================================================
-# Script 腳本類別
-# ============================================================
-
-class Script:
-    """腳本資料結構"""
-
-    def __init__(self, name="未命名"):
-        self.name = name
-        self.blocks = []  # Block 列表
-
-    def to_dict(self):
-        return {
-            "name": self.name,
-            "blocks": [b.to_dict() for b in self.blocks],
-        }
-
-    @classmethod
-    def from_dict(cls, data):
-        script = cls(data.get("name", "未命名"))
-        script.blocks = [Block.from_dict(b) for b in data.get("blocks", [])]
-        return script
-
-    def save(self, filepath):
-        """儲存腳本"""
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
-
-    @classmethod
-    def load(cls, filepath):
-        """載入腳本"""
-        with open(filepath, "r", encoding="utf-8") as f:
-            return cls.from_dict(json.load(f))
-
-
 # ============================================================
 # 積木 UI 元件
 # ============================================================
@@ -446,6 +225,9 @@ class BlockEditor:
         self.window.title("PyClick 腳本編輯器")
         self.window.geometry("900x700")
         self.window.configure(bg="#2D2D2D")
+        # 執行緒中的高亮 / 狀態更新經由匯流排合併，定時在 Tk 執行緒套用
+        self._ui = UiBus(self.window)
+        self._ui.start()
 
         # === 工具列 ===
         toolbar = tk.Frame(self.window, bg="#3D3D3D", height=40)
@@ -836,22 +618,20 @@ class BlockEditor:
             self.drag_indicator.destroy()
             self.drag_indicator = None
 
-    def highlight_executing_block(self, block):
-        """高亮正在執行的積木"""
+    def show_executing(self, block, label):
+        """高亮正在執行的積木並更新狀態列（執行緒中呼叫，只保留最新的）"""
         def _update():
             for widget in self.block_widgets:
-                if widget.block == block:
-                    widget.set_executing(True)
-                else:
-                    widget.set_executing(False)
-        self.window.after(0, _update)
+                widget.set_executing(widget.block is block)
+            self.status_var.set(f"執行: {label}")
+        self._ui.post("executing", _update)
 
     def clear_highlight(self):
-        """清除所有高亮"""
+        """清除所有高亮（取代尚未套用的高亮）"""
         def _update():
             for widget in self.block_widgets:
                 widget.set_executing(False)
-        self.window.after(0, _update)
+        self._ui.post("executing", _update)
 
     def _find_block_index(self, block, blocks=None):
         """尋找積木索引"""
@@ -930,17 +710,45 @@ class BlockEditor:
     def _execute_script(self):
         """執行腳本（在執行緒中）"""
         try:
-            runner = ScriptRunner(self)
-            runner.run(self.script.blocks)
+            # PYCLICK_TRACE=1 時記錄每個積木的執行時間，結束後寫到 traces/
+            tracer = Tracer() if tracing_enabled() else None
+            runner = ScriptRunner(inputs=input_from_spec(), tracer=tracer,
+                                  should_stop=lambda: self.stop_flag, on_step=self.show_executing)
+            try:
+                # 執行前先檢查並載入所有圖片，缺圖直接停止（否則要到執行中途才會卡在等待逾時）
+                missing = runner.preload(self.script.blocks)
+                if missing:
+                    self._report_missing(missing)
+                    return
+                runner.run(self.script.blocks)
+            finally:
+                runner.close()
+                logger.info(f"圖片等待: 檢查 {runner.watcher.ticks} 輪，匹配 {runner.watcher.matched} 輪")
+                stats = runner.templates.stats()
+                logger.info(f"模板快取: 命中 {stats['hits']}，未命中 {stats['misses']}，"
+                            f"移除 {stats['evictions']}，保留 {stats['size']} 個")
+                if tracer:
+                    tracer.write(trace_path(os.path.join(os.path.dirname(__file__), "traces"), "blocks"))
         except Exception as e:
-            self.window.after(0, lambda: self.status_var.set(f"錯誤: {e}"))
+            self._ui.post("status", self.status_var.set, f"錯誤: {e}")
         finally:
             self.running = False
             self.clear_highlight()
             if not self.stop_flag:
-                self.window.after(0, lambda: self.status_var.set("執行完成"))
+                self._ui.post("status", self.status_var.set, "執行完成")
             else:
-                self.window.after(0, lambda: self.status_var.set("已停止"))
+                self._ui.post("status", self.status_var.set, "已停止")
+
+    def _report_missing(self, missing):
+        """回報缺少 / 無法讀取的圖片（執行緒中呼叫）"""
+        lines = []
+        for path, labels in missing.items():
+            name = os.path.basename(path) if path else "(未設定圖片)"
+            lines.append(f"{name}：{'、'.join(labels)}")
+            logger.warning(f"腳本圖片無法載入: {path or '(未設定)'}（{'、'.join(labels)}）")
+        self.stop_flag = True
+        self._ui.post("missing", lambda: messagebox.showwarning(
+            "圖片無法載入", "以下積木的圖片不存在或無法讀取，腳本未執行：\n\n" + "\n".join(lines)))
 
     def run(self):
         """啟動編輯器"""
@@ -1227,189 +1035,6 @@ class ScriptSelectDialog:
         self.dialog.destroy()
 
 
-# ============================================================
-# 腳本執行引擎
-# ============================================================
-
-class ScriptRunner:
-    """腳本執行引擎"""
-
-    def __init__(self, editor):
-        self.editor = editor
-        self.threshold = 0.7
-
-    def run(self, blocks):
-        """執行積木列表"""
-        for block in blocks:
-            if self.editor.stop_flag:
-                break
-            self._execute_block(block)
-
-    def _execute_block(self, block):
-        """執行單個積木"""
-        if self.editor.stop_flag:
-            return
-
-        action = block.type
-        params = block.params
-
-        # 高亮當前積木
-        self.editor.highlight_executing_block(block)
-
-        # 更新狀態
-        self.editor.window.after(0, lambda: self.editor.status_var.set(f"執行: {block.get_label()}"))
-
-        # 根據類型執行
-        if action == "trigger_hotkey" or action == "trigger_image":
-            # 觸發積木只是標記，實際觸發邏輯在外部
-            pass
-
-        elif action == "click":
-            self._click_image(params["image"])
-
-        elif action == "click_xy":
-            self._click_xy(params["x"], params["y"])
-
-        elif action == "right_click":
-            self._right_click_image(params["image"])
-
-        elif action == "double_click":
-            self._double_click_image(params["image"])
-
-        elif action == "scroll":
-            self._scroll(params["direction"], params["amount"])
-
-        elif action == "press_key":
-            self._press_key(params["key"])
-
-        elif action == "hotkey":
-            self._hotkey(params["modifier"], params["key"])
-
-        elif action == "type_text":
-            self._type_text(params["text"])
-
-        elif action == "wait":
-            time.sleep(params["seconds"])
-
-        elif action == "wait_image":
-            self._wait_image(params["image"], params.get("timeout", 30))
-
-        elif action == "wait_image_gone":
-            self._wait_image_gone(params["image"], params.get("timeout", 30))
-
-        elif action == "repeat":
-            for i in range(params["count"]):
-                if self.editor.stop_flag:
-                    break
-                self.run(block.children)
-
-        elif action == "repeat_until":
-            max_iter = params.get("max_iterations", 100)
-            for i in range(max_iter):
-                if self.editor.stop_flag:
-                    break
-                if self._find_image(params["image"]):
-                    break
-                self.run(block.children)
-
-        elif action == "if_image":
-            if self._find_image(params["image"]):
-                self.run(block.children)
-
-    def _find_image(self, template_path):
-        """尋找圖像，回傳位置或 None"""
-        if not template_path or not os.path.exists(template_path):
-            return None
-
-        template = cv2.imread(template_path)
-        if template is None:
-            return None
-
-        with mss.mss() as sct:
-            screen = np.array(sct.grab(sct.monitors[0]))
-            screen = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-
-        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
-        _, max_val, _, max_loc = cv2.minMaxLoc(result)
-
-        if max_val >= self.threshold:
-            h, w = template.shape[:2]
-            cx = max_loc[0] + w // 2
-            cy = max_loc[1] + h // 2
-            return (cx, cy)
-        return None
-
-    def _click_image(self, template_path):
-        """點擊圖像"""
-        pos = self._find_image(template_path)
-        if pos:
-            self._click_xy(pos[0], pos[1])
-
-    def _click_xy(self, x, y):
-        """點擊座標"""
-        user32.SetCursorPos(int(x), int(y))
-        user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-        user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
-        time.sleep(0.05)
-
-    def _right_click_image(self, template_path):
-        """右鍵點擊圖像"""
-        pos = self._find_image(template_path)
-        if pos:
-            user32.SetCursorPos(int(pos[0]), int(pos[1]))
-            user32.mouse_event(MOUSEEVENTF_RIGHTDOWN, 0, 0, 0, 0)
-            user32.mouse_event(MOUSEEVENTF_RIGHTUP, 0, 0, 0, 0)
-            time.sleep(0.05)
-
-    def _double_click_image(self, template_path):
-        """雙擊圖像"""
-        pos = self._find_image(template_path)
-        if pos:
-            self._click_xy(pos[0], pos[1])
-            time.sleep(0.05)
-            self._click_xy(pos[0], pos[1])
-
-    def _scroll(self, direction, amount):
-        """滾輪"""
-        scroll_amount = amount if direction == "上" else -amount
-        pyautogui.scroll(scroll_amount)
-
-    def _press_key(self, key):
-        """按鍵"""
-        pyautogui.press(key.lower())
-
-    def _hotkey(self, modifier, key):
-        """組合鍵"""
-        keys = modifier.lower().split("+") + [key.lower()]
-        pyautogui.hotkey(*keys)
-
-    def _type_text(self, text):
-        """輸入文字"""
-        pyautogui.typewrite(text, interval=0.05)
-
-    def _wait_image(self, template_path, timeout):
-        """等待圖像出現"""
-        start = time.time()
-        while time.time() - start < timeout:
-            if self.editor.stop_flag:
-                break
-            if self._find_image(template_path):
-                return True
-            time.sleep(0.5)
-        return False
-
-    def _wait_image_gone(self, template_path, timeout):
-        """等待圖像消失"""
-        start = time.time()
-        while time.time() - start < timeout:
-            if self.editor.stop_flag:
-                break
-            if not self._find_image(template_path):
-                return True
-            time.sleep(0.5)
-        return False
-
-
 # ============================================================
 # 主程式入口
 # ============================================================
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+PyClick 積木資料結構
+積木類型、Block / Script 與走訪工具，不依賴 Tk 或 Windows API，
+編輯器、無螢幕執行（run_script.py）都從這裡載入腳本
+"""
+
+import json
+import os
+import uuid
+
+
+# ============================================================
+# 積木類型定義
+# ============================================================
+
+BLOCK_COLORS = {
+    "trigger": "#9966FF",   # 紫色 - 觸發
+    "action": "#4C97FF",    # 藍色 - 動作
+    "keyboard": "#59C059",  # 綠色 - 鍵盤
+    "wait": "#FFBF00",      # 黃色 - 等待
+    "control": "#FF8C1A",   # 橙色 - 控制
+}
+
+BLOCK_TYPES = {
+    # === 觸發類 ===
+    "trigger_hotkey": {
+        "category": "trigger",
+        "label": "當按下 [{key}] 時",
+        "icon": "🎬",
+        "params": {"key": "F7"},
+        "is_trigger": True,
+    },
+    "trigger_image": {
+        "category": "trigger",
+        "label": "當找到 [{image}] 時",
+        "icon": "🎬",
+        "params": {"image": ""},
+        "is_trigger": True,
+    },
+
+    # === 動作類 ===
+    "click": {
+        "category": "action",
+        "label": "點擊 [{image}]",
+        "icon": "🖱️",
+        "params": {"image": ""},
+    },
+    "click_xy": {
+        "category": "action",
+        "label": "點擊座標 X:[{x}] Y:[{y}]",
+        "icon": "🖱️",
+        "params": {"x": 0, "y": 0},
+    },
+    "right_click": {
+        "category": "action",
+        "label": "右鍵 [{image}]",
+        "icon": "🖱️",
+        "params": {"image": ""},
+    },
+    "double_click": {
+        "category": "action",
+        "label": "雙擊 [{image}]",
+        "icon": "🖱️",
+        "params": {"image": ""},
+    },
+    "scroll": {
+        "category": "action",
+        "label": "滾輪 [{direction}] [{amount}] 格",
+        "icon": "🖲️",
+        "params": {"direction": "上", "amount": 3},
+    },
+
+    # === 鍵盤類 ===
+    "press_key": {
+        "category": "keyboard",
+        "label": "按 [{key}]",
+        "icon": "⌨️",
+        "params": {"key": "Enter"},
+    },
+    "hotkey": {
+        "category": "keyboard",
+        "label": "按 [{modifier}]+[{key}]",
+        "icon": "⌨️",
+        "params": {"modifier": "Ctrl", "key": "C"},
+    },
+    "type_text": {
+        "category": "keyboard",
+        "label": "輸入 \"{text}\"",
+        "icon": "📝",
+        "params": {"text": ""},
+    },
+
+    # === 等待類 ===
+    "wait": {
+        "category": "wait",
+        "label": "等待 [{seconds}] 秒",
+        "icon": "⏱️",
+        "params": {"seconds": 1.0},
+    },
+    "wait_image": {
+        "category": "wait",
+        "label": "等到 [{image}] 出現",
+        "icon": "👁️",
+        "params": {"image": "", "timeout": 30},
+    },
+    "wait_image_gone": {
+        "category": "wait",
+        "label": "等到 [{image}] 消失",
+        "icon": "👁️",
+        "params": {"image": "", "timeout": 30},
+    },
+
+    # === 控制類 ===
+    "repeat": {
+        "category": "control",
+        "label": "重複 [{count}] 次",
+        "icon": "🔁",
+        "params": {"count": 3},
+        "has_children": True,
+    },
+    "repeat_until": {
+        "category": "control",
+        "label": "重複直到 [{image}] 出現",
+        "icon": "🔁",
+        "params": {"image": "", "max_iterations": 100},
+        "has_children": True,
+    },
+    "if_image": {
+        "category": "control",
+        "label": "如果 [{image}] 存在",
+        "icon": "❓",
+        "params": {"image": ""},
+        "has_children": True,
+    },
+}
+
+
+# ============================================================
+# Block 資料類別
+# ============================================================
+
+class Block:
+    """積木資料結構"""
+
+    def __init__(self, block_type, params=None, children=None):
+        self.id = str(uuid.uuid4())[:8]
+        self.type = block_type
+        self.params = params or dict(BLOCK_TYPES[block_type]["params"])
+        self.children = children or []
+
+    def to_dict(self):
+        """轉換為字典"""
+        return {
+            "id": self.id,
+            "type": self.type,
+            "params": self.params,
+            "children": [c.to_dict() for c in self.children],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """從字典建立"""
+        block = cls(data["type"], data.get("params"))
+        block.id = data.get("id", str(uuid.uuid4())[:8])
+        block.children = [cls.from_dict(c) for c in data.get("children", [])]
+        return block
+
+    def get_label(self):
+        """取得顯示標籤"""
+        info = BLOCK_TYPES[self.type]
+        label = info["label"]
+        for key, value in self.params.items():
+            # 圖像參數顯示檔名
+            if key == "image" and value:
+                display = os.path.basename(value) if value else "(未設定)"
+            else:
+                display = str(value)
+            label = label.replace(f"[{{{key}}}]", f"[{display}]")
+        return f"{info['icon']} {label}"
+
+    def get_color(self):
+        """取得積木顏色"""
+        category = BLOCK_TYPES[self.type]["category"]
+        return BLOCK_COLORS[category]
+
+    def has_children(self):
+        """是否可包含子積木"""
+        return BLOCK_TYPES[self.type].get("has_children", False)
+
+    def is_trigger(self):
+        """是否為觸發積木"""
+        return BLOCK_TYPES[self.type].get("is_trigger", False)
+
+
+# ============================================================
+# Script 腳本類別
+# ============================================================
+
+def walk_blocks(blocks):
+    """依執行順序走訪所有積木（含 repeat / if_image 等的子積木）"""
+    for block in blocks:
+        yield block
+        yield from walk_blocks(block.children)
+
+
+def referenced_images(blocks):
+    """腳本用到的圖片 {路徑: [積木標籤, ...]}（依第一次出現的順序；未設定圖片的積木路徑為 ""）"""
+    images = {}
+    for block in walk_blocks(blocks):
+        if "image" in block.params:
+            images.setdefault(block.params["image"] or "", []).append(block.get_label())
+    return images
+
+
+class Script:
+    """腳本資料結構"""
+
+    def __init__(self, name="未命名"):
+        self.name = name
+        self.blocks = []  # Block 列表
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "blocks": [b.to_dict() for b in self.blocks],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        script = cls(data.get("name", "未命名"))
+        script.blocks = [Block.from_dict(b) for b in data.get("blocks", [])]
+        return script
+
+    def save(self, filepath):
+        """儲存腳本"""
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, filepath):
+        """載入腳本"""
+        with open(filepath, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+PyClick 緩衝區重用模組
+匹配結果圖是數十 MB 的陣列，每輪重新配置會造成記憶體抖動，
+改用重複使用的陣列（借出 / 歸還都由呼叫端明確進行）
+"""
+
+import collections
+import contextlib
+import threading
+
+import numpy as np
+
+POOL_PER_SHAPE = 2              # 每種尺寸最多保留幾個閒置陣列
+POOL_MAX_BYTES = 64 << 20       # 閒置陣列合計上限（超過則丟掉最久沒用的尺寸）
+
+
+class BufferPool:
+    """依 (shape, dtype) 重複使用陣列
+
+    take() 借出、give() 歸還；池只保留閒置（已歸還）的陣列，借出的陣列與池無關，
+    沒有歸還只是少了一次重用，不會被覆寫。閒置陣列的總大小不超過 max_bytes
+    """
+
+    def __init__(self, per_shape=POOL_PER_SHAPE, max_bytes=POOL_MAX_BYTES):
+        self.per_shape = per_shape
+        self.max_bytes = max_bytes
+        self._free = collections.OrderedDict()     # (shape, dtype) -> [閒置陣列]
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(shape, dtype):
+        return tuple(shape), np.dtype(dtype).str
+
+    def take(self, shape, dtype=np.uint8):
+        """借一個指定尺寸的陣列（內容未初始化）"""
+        key = self._key(shape, dtype)
+        with self._lock:
+            arrays = self._free.get(key)
+            if arrays:
+                arr = arrays.pop()
+                self._bytes -= arr.nbytes
+                if not arrays:
+                    del self._free[key]
+                return arr
+        return np.empty(key[0], dtype)
+
+    def give(self, arr):
+        """歸還陣列（呼叫後不可再使用）；不是完整連續的陣列、太大或該尺寸已滿就直接丟掉"""
+        if arr is None or not arr.flags.c_contiguous or arr.base is not None:
+            return
+        if arr.nbytes > self.max_bytes:
+            return
+        key = self._key(arr.shape, arr.dtype)
+        with self._lock:
+            arrays = self._free.setdefault(key, [])
+            self._free.move_to_end(key)
+            if len(arrays) >= self.per_shape or any(a is arr for a in arrays):
+                return
+            arrays.append(arr)
+            self._bytes += arr.nbytes
+            # 超過上限：由最久沒用的尺寸開始丟
+            while self._bytes > self.max_bytes:
+                old_key, old = next(iter(self._free.items()))
+                self._bytes -= old.pop(0).nbytes
+                if not old:
+                    del self._free[old_key]
+
+    @contextlib.contextmanager
+    def checkout(self, shape, dtype=np.uint8):
+        """with pool.checkout(shape) as arr: ... 離開時自動歸還"""
+        arr = self.take(shape, dtype)
+        try:
+            yield arr
+        finally:
+            self.give(arr)
+
+    @property
+    def nbytes(self):
+        """目前閒置陣列的總大小"""
+        return self._bytes
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+PyClick 截圖模組
+Frame：一次截圖只轉換一次，BGR / 灰階 / 指紋縮圖 / 金字塔都延遲產生並快取
+CaptureService：常駐截圖執行緒，最近的畫面放在環形緩衝區給所有使用者共用
+"""
+
+import collections
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from backends import backend_from_spec
+from matcher import build_pyramid
+
+logger = logging.getLogger('PyClick')
+
+CAPTURE_RING_SIZE = 4        # 環形緩衝區保留最近幾張截圖
+CAPTURE_TIMEOUT = 2.0        # 等待截圖的上限（秒）
+
+
+class Frame:
+    """一次截圖（BGRA 原始資料 + 螢幕座標偏移）
+
+    各種轉換結果在第一次使用時才計算，之後同一張截圖的所有使用者共用：
+    - bgr / gray：直接由 BGRA 轉換（灰階不經過 BGR）
+      轉換結果隨 Frame 一起釋放，不放緩衝區池：同一張截圖可能同時被多個使用者持有，無法判斷何時可以重用
+    - pyramid()：金字塔（彩色/灰階各一份，層數不足時才補算）
+    """
+
+    def __init__(self, bgra, left=0, top=0, timestamp=None):
+        self.bgra = bgra
+        self.left = left              # 截圖左上角的螢幕座標
+        self.top = top
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.is_full_screen = False   # 是否為整個虛擬螢幕的截圖
+        self._views = {}
+        self._lock = threading.RLock()     # 可重入：轉換過程中可以再取其他轉換
+
+    @property
+    def width(self):
+        return self.bgra.shape[1]
+
+    @property
+    def height(self):
+        return self.bgra.shape[0]
+
+    def _view(self, key, build):
+        """取得快取的轉換結果，沒有就建立"""
+        view = self._views.get(key)
+        if view is None:
+            with self._lock:
+                view = self._views.get(key)
+                if view is None:
+                    view = build()
+                    self._views[key] = view
+        return view
+
+    @property
+    def bgr(self):
+        return self._view("bgr", lambda: cv2.cvtColor(self.bgra, cv2.COLOR_BGRA2BGR))
+
+    @property
+    def gray(self):
+        return self._view("gray", lambda: cv2.cvtColor(self.bgra, cv2.COLOR_BGRA2GRAY))
+
+    def match_image(self, use_color):
+        """匹配用影像：彩色 = BGR，否則灰階"""
+        return self.bgr if use_color else self.gray
+
+    def pyramid(self, use_color, max_level):
+        """匹配用影像的金字塔 [原圖, 1/2, 1/4, ...]"""
+        base = self.match_image(use_color)
+        key = ("pyramid", use_color)
+        with self._lock:
+            levels = self._views.get(key, [base])
+            if len(levels) <= max_level:
+                # 只補算缺少的層級
+                levels = levels + build_pyramid(levels[-1], max_level + 1 - len(levels))[1:]
+                self._views[key] = levels
+        return levels[:max_level + 1]
+
+    def crop(self, x1, y1, x2, y2):
+        """裁切成子截圖（共用記憶體，不複製），座標為截圖內座標"""
+        return Frame(self.bgra[y1:y2, x1:x2], self.left + x1, self.top + y1, self.timestamp)
+
+
+def roi_region(monitor, cx, cy, margin):
+    """以螢幕座標 (cx, cy) 為中心、margin 為邊距的截圖區域（不超出螢幕）"""
+    ox, oy = monitor["left"], monitor["top"]
+    # 將螢幕座標轉為截圖座標
+    sx = cx - ox
+    sy = cy - oy
+    x1 = max(0, sx - margin)
+    y1 = max(0, sy - margin)
+    x2 = min(monitor["width"], sx + margin)
+    y2 = min(monitor["height"], sy + margin)
+    return {"left": x1 + ox, "top": y1 + oy, "width": x2 - x1, "height": y2 - y1}
+
+
+def grab_frame(sct, region=None):
+    """截圖並包成 Frame（sct 為 mss 或 backends.py 的截圖來源，region=None 表示整個虛擬螢幕）
+
+    直接以 NumPy 檢視 mss 的 BGRA 緩衝區（__array_interface__），不再複製一份
+    """
+    monitor = region or sct.monitors[0]
+    timestamp = time.time()   # 截圖開始的時間（畫面內容不會比這更新）
+    bgra = np.asarray(sct.grab(monitor))
+    return Frame(bgra, monitor["left"], monitor["top"], timestamp)
+
+
+def _covers(frame, region):
+    """截圖是否完整包含 region（None = 整個虛擬螢幕）"""
+    if region is None:
+        return frame.is_full_screen
+    return (frame.left <= region["left"] and frame.top <= region["top"]
+            and region["left"] + region["width"] <= frame.left + frame.width
+            and region["top"] + region["height"] <= frame.top + frame.height)
+
+
+def _union(regions):
+    """多個區域的外接矩形"""
+    left = min(r["left"] for r in regions)
+    top = min(r["top"] for r in regions)
+    right = max(r["left"] + r["width"] for r in regions)
+    bottom = max(r["top"] + r["height"] for r in regions)
+    return {"left": left, "top": top, "width": right - left, "height": bottom - top}
+
+
+class CaptureService:
+    """常駐截圖服務
+
+    單一執行緒持有截圖來源（不用每次重開），需要時才截圖（不空轉），
+    截到的畫面放進環形緩衝區。同一瞬間多個地方要畫面時，
+    只截一次、共用同一個 Frame（轉換結果也共用）。
+    backend: 截圖來源工廠（見 backends.py），None = 依 PYCLICK_CAPTURE 環境變數，預設 mss
+    """
+
+    def __init__(self, backend=None, ring_size=CAPTURE_RING_SIZE):
+        self._backend = backend or backend_from_spec()
+        self._ring = collections.deque(maxlen=ring_size)
+        self._cond = threading.Condition()
+        self._requests = []          # 等待截圖的 (序號, 區域)，區域 None = 整個虛擬螢幕
+        self._tickets = 0            # 已發出的請求序號
+        self._served = 0             # 已處理完的請求序號（失敗也算，讓等待者不會卡住）
+        self._error = None
+        self._thread = None
+        self._running = False
+        self._monitor = None
+
+    def start(self):
+        """啟動截圖執行緒（已啟動則不做事）"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._error = None
+            self._thread = threading.Thread(target=self._run, name="CaptureService", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止截圖執行緒"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=CAPTURE_TIMEOUT)
+        self._thread = None
+
+    @property
+    def monitor(self):
+        """整個虛擬螢幕的範圍 {"left", "top", "width", "height"}"""
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._monitor is not None or not self._running,
+                                CAPTURE_TIMEOUT)
+            if self._monitor is None:
+                raise RuntimeError(f"截圖服務無法啟動: {self._error}")
+            return self._monitor
+
+    def get_frame(self, max_age_ms=0, region=None):
+        """取得不超過 max_age_ms 毫秒的截圖（region 為螢幕座標，None = 整個虛擬螢幕）
+
+        緩衝區有夠新且涵蓋 region 的畫面就直接共用（裁切不複製），否則請截圖執行緒截一張
+        """
+        self.start()
+        deadline = time.time() + CAPTURE_TIMEOUT
+        with self._cond:
+            frame = self._find(time.time() - max_age_ms / 1000, region)
+            if frame is not None:
+                return frame
+
+            requested_at = time.time()
+            self._tickets += 1
+            ticket = self._tickets
+            self._requests.append((ticket, region))
+            self._cond.notify_all()
+            while True:
+                frame = self._find(requested_at, region)
+                if frame is not None:
+                    return frame
+                if self._served >= ticket:
+                    # 處理這個請求的那輪截圖失敗了
+                    raise RuntimeError(f"截圖失敗: {self._error}")
+                remaining = deadline - time.time()
+                if not self._running or remaining <= 0:
+                    raise RuntimeError("截圖逾時")
+                self._cond.wait(remaining)
+
+    def _find(self, min_timestamp, region):
+        """在緩衝區找夠新且涵蓋 region 的畫面（呼叫時須持有鎖）"""
+        for frame in reversed(self._ring):
+            if frame.timestamp < min_timestamp:
+                break
+            if _covers(frame, region):
+                if region is None:
+                    return frame
+                x1, y1 = region["left"] - frame.left, region["top"] - frame.top
+                return frame.crop(x1, y1, x1 + region["width"], y1 + region["height"])
+        return None
+
+    def _run(self):
+        try:
+            with self._backend() as sct:
+                with self._cond:
+                    self._monitor = dict(sct.monitors[0])
+                    self._cond.notify_all()
+                self._serve(sct)
+        except Exception as e:
+            logger.error(f"截圖服務錯誤: {e}", exc_info=True)
+            with self._cond:
+                self._error = e
+                self._running = False
+                self._cond.notify_all()
+
+    def _serve(self, sct):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._requests or not self._running)
+                if not self._running:
+                    return
+                requests = self._requests
+                self._requests = []
+
+            # 同時間的請求合併成一次截圖：有人要全螢幕就截全螢幕，否則截外接矩形
+            regions = [region for _, region in requests]
+            region = None if None in regions else _union(regions)
+            frame = error = None
+            try:
+                frame = grab_frame(sct, region)
+                frame.is_full_screen = region is None
+            except Exception as e:
+                logger.error(f"截圖失敗: {e}")
+                error = e
+
+            with self._cond:
+                if frame is not None:
+                    self._ring.append(frame)
+                else:
+                    self._error = error
+                self._served = max(ticket for ticket, _ in requests)
+                self._cond.notify_all()
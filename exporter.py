@@ -4,6 +4,7 @@ PyClick 腳本導出器
 將腳本打包成獨立 EXE
 """
 
+import ast
 import os
 import sys
 import shutil
@@ -15,6 +16,34 @@ import threading
 
 from utils import encode_config, encode_image
 
+# EXE 的主程式（它 import 的本地模組由 runner_modules() 找出一起打包）
+RUNNER_ENTRY = "lite_runner.py"
+
+
+def runner_modules(src_dir, entry=RUNNER_ENTRY):
+    """主程式與它（直接或間接）import 的本地模組檔名，主程式排第一
+
+    由原始碼的 import 找出，不用手動維護清單（少一個 EXE 就會在執行時才失敗）
+    """
+    modules = [entry]
+    pending = [entry]
+    while pending:
+        with open(os.path.join(src_dir, pending.pop()), encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                module = name.split(".")[0] + ".py"
+                if module not in modules and os.path.isfile(os.path.join(src_dir, module)):
+                    modules.append(module)
+                    pending.append(module)
+    return modules
+
 
 def export_script(parent, script, template_path):
     """導出腳本為 EXE"""
@@ -169,11 +198,11 @@ class ExportDialog:
             temp_dir = tempfile.mkdtemp(prefix="pyclick_export_")
 
             try:
-                # 複製 lite_runner.py
+                # 複製 lite_runner.py 與它 import 的本地模組
                 src_dir = os.path.dirname(os.path.abspath(__file__))
-                runner_src = os.path.join(src_dir, "lite_runner.py")
-                runner_dst = os.path.join(temp_dir, "lite_runner.py")
-                shutil.copy(runner_src, runner_dst)
+                for module in runner_modules(src_dir):
+                    shutil.copy(os.path.join(src_dir, module), os.path.join(temp_dir, module))
+                runner_dst = os.path.join(temp_dir, RUNNER_ENTRY)
 
                 # 寫入設定檔
                 config_path = os.path.join(temp_dir, "config.dat")
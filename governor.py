@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+PyClick CPU 預算控制
+量測自動模式佔用的 CPU（行程 CPU 時間，含 OpenCV 工作執行緒），超過目標百分比時逐級降載，
+遠低於目標時逐級恢復。每一級依序加上一項：
+
+    1  OpenCV 執行緒減半
+    2  金字塔多一層（粗搜更小）
+    3  偏好 ROI（ROI 連續失敗更多次才回到全螢幕）
+    4  OpenCV 單執行緒
+    5+ 掃描間隔加長（每級 ×1.5）
+
+百分比以整台電腦計算（和工作管理員相同：單核心跑滿 = 100 / 核心數 %）
+"""
+
+import logging
+import os
+import time
+
+import cv2
+
+logger = logging.getLogger('PyClick')
+
+CPU_BUDGET_WINDOW = 2.0     # 每隔幾秒量一次 CPU 使用率並調整
+CPU_RELAX_RATIO = 0.6       # 使用率低於 目標 × 此比例 時恢復一級
+INTERVAL_STEP = 1.5         # 第 5 級起每級間隔倍數
+MAX_PYRAMID_LEVEL = 4       # 降載時金字塔層級上限（與設定視窗相同）
+ROI_PREFER_FACTOR = 3       # 偏好 ROI 時，ROI 連續失敗次數上限的倍數
+MAX_LEVEL = 8
+
+
+class CpuGovernor:
+    """依 CPU 使用率調整掃描間隔、金字塔層級、ROI 偏好與 OpenCV 執行緒數
+
+    target: 目標 CPU 百分比（整台電腦），0 = 不限制
+    """
+
+    def __init__(self, target=0, window=CPU_BUDGET_WINDOW):
+        self.target = target
+        self.window = window
+        self.cpu_count = os.cpu_count() or 1
+        self.level = 0
+        self.usage = None               # 最近一次量到的 CPU 百分比
+        self._base_threads = None       # 啟動時的 OpenCV 執行緒數（停止時恢復）
+        self._wall = None
+        self._cpu = None
+
+    def start(self):
+        """自動模式啟動時呼叫"""
+        self.level = 0
+        self.usage = None
+        self._base_threads = cv2.getNumThreads()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def stop(self):
+        """自動模式停止時呼叫（恢復 OpenCV 執行緒數）"""
+        if self._base_threads is not None and self.level:
+            cv2.setNumThreads(self._base_threads)
+        self._base_threads = None
+        self.level = 0
+
+    def sample(self):
+        """每輪呼叫；累積滿一個量測區間才計算使用率並調整，有調整時回傳 True"""
+        if self._wall is None:
+            return False
+        now = time.perf_counter()
+        elapsed = now - self._wall
+        if elapsed < self.window:
+            return False
+        cpu = time.process_time()
+        self.usage = (cpu - self._cpu) / elapsed / self.cpu_count * 100
+        self._wall, self._cpu = now, cpu
+        if self.target <= 0:
+            return self._set_level(0)
+        if self.usage > self.target:
+            return self._set_level(self.level + 1)
+        if self.usage < self.target * CPU_RELAX_RATIO:
+            return self._set_level(self.level - 1)
+        return False
+
+    def _set_level(self, level):
+        level = max(0, min(level, MAX_LEVEL))
+        if level == self.level:
+            return False
+        self.level = level
+        if self._base_threads is not None:
+            cv2.setNumThreads(self.threads)
+        logger.info(f"CPU 預算: 使用率 {self.usage:.1f}% / 目標 {self.target}%，{self.describe()}")
+        return True
+
+    @property
+    def threads(self):
+        """OpenCV 執行緒數"""
+        base = self._base_threads if self._base_threads is not None else cv2.getNumThreads()
+        if self.level >= 4:
+            return 1
+        if self.level >= 1:
+            return max(1, base // 2)
+        return base
+
+    def pyramid_level(self, level):
+        """降載後的金字塔層級"""
+        return min(level + 1, MAX_PYRAMID_LEVEL) if self.level >= 2 else level
+
+    def roi_max_miss(self, max_miss):
+        """降載後的 ROI 連續失敗上限（0 = 不使用 ROI，維持不變）"""
+        return max_miss * ROI_PREFER_FACTOR if self.level >= 3 else max_miss
+
+    def interval_scale(self):
+        """掃描間隔倍數"""
+        return INTERVAL_STEP ** (self.level - 4) if self.level > 4 else 1.0
+
+    def describe(self):
+        """目前降載內容（日誌 / 狀態列）"""
+        if not self.level:
+            return "未降載"
+        parts = [f"第 {self.level} 級", f"執行緒 {self.threads}"]
+        if self.level >= 2:
+            parts.append("金字塔 +1")
+        if self.level >= 3:
+            parts.append("偏好 ROI")
+        if self.level > 4:
+            parts.append(f"間隔 ×{self.interval_scale():.1f}")
+        return "，".join(parts)
+
+    def summary(self):
+        """一行文字摘要（狀態列顯示用，沒有設定目標回傳 ""）"""
+        if self.target <= 0 or self.usage is None:
+            return ""
+        return f"CPU {self.usage:.1f}%/{self.target}% {self.describe()}"
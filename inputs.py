@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+PyClick 輸入來源模組
+點擊 / 按鍵都透過輸入來源送出，和截圖來源（backends.py）一樣可以替換：
+- Win32Input：實際送出滑鼠鍵盤事件（預設，僅 Windows）
+- RecordingInput：不送出任何事件，只記下動作與時間（無螢幕測試、反應時間量測）
+"""
+
+import os
+import threading
+import time
+
+INPUT_BACKEND_ENV = "PYCLICK_INPUT"    # 環境變數：輸入來源設定字串
+
+
+class Win32Input:
+    """實際的滑鼠鍵盤輸入（SetCursorPos / mouse_event / pyautogui）"""
+
+    def __init__(self):
+        # Windows 專用模組在建立時才載入，其他來源不需要
+        import pyautogui
+        from utils import (user32, force_focus, MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP,
+                           MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP)
+        self._pyautogui = pyautogui
+        self._user32 = user32
+        self._force_focus = force_focus
+        self._down = MOUSEEVENTF_LEFTDOWN
+        self._up = MOUSEEVENTF_LEFTUP
+        self._right_down = MOUSEEVENTF_RIGHTDOWN
+        self._right_up = MOUSEEVENTF_RIGHTUP
+
+    def position(self):
+        return tuple(self._pyautogui.position())
+
+    def foreground_window(self):
+        return self._user32.GetForegroundWindow()
+
+    def move(self, x, y):
+        self._user32.SetCursorPos(int(x), int(y))
+
+    def mouse_down(self):
+        self._user32.mouse_event(self._down, 0, 0, 0, 0)
+
+    def mouse_up(self):
+        self._user32.mouse_event(self._up, 0, 0, 0, 0)
+
+    def click(self, x, y):
+        self.move(x, y)
+        self.mouse_down()
+        self.mouse_up()
+
+    def right_click(self, x, y):
+        self.move(x, y)
+        self._user32.mouse_event(self._right_down, 0, 0, 0, 0)
+        self._user32.mouse_event(self._right_up, 0, 0, 0, 0)
+
+    def scroll(self, amount):
+        self._pyautogui.scroll(amount)
+
+    def press(self, key):
+        self._pyautogui.press(key.lower())
+
+    def hotkey(self, *keys):
+        self._pyautogui.hotkey(*(k.lower() for k in keys))
+
+    def type_text(self, text, interval=0.0):
+        self._pyautogui.typewrite(text, interval=interval)
+
+    def block_input(self, blocked):
+        self._user32.BlockInput(bool(blocked))
+
+    def restore_focus(self, hwnd):
+        self._force_focus(hwnd)
+
+
+class RecordingInput:
+    """只記錄不送出的輸入來源
+
+    events 為 (時間, 動作, 參數) 清單，時間用 time.perf_counter()；
+    wait_for() 可等待下一個符合條件的動作（跨執行緒）
+    """
+
+    def __init__(self, position=(0, 0)):
+        self.events = []
+        self._position = tuple(position)
+        self._cond = threading.Condition()
+
+    def _record(self, action, *args):
+        with self._cond:
+            self.events.append((time.perf_counter(), action, args))
+            self._cond.notify_all()
+
+    def position(self):
+        return self._position
+
+    def foreground_window(self):
+        return 0
+
+    def move(self, x, y):
+        self._position = (int(x), int(y))
+        self._record("move", int(x), int(y))
+
+    def mouse_down(self):
+        self._record("down", *self._position)
+
+    def mouse_up(self):
+        self._record("up", *self._position)
+
+    def click(self, x, y):
+        self.move(x, y)
+        self.mouse_down()
+        self.mouse_up()
+
+    def right_click(self, x, y):
+        self.move(x, y)
+        self._record("right_click", *self._position)
+
+    def scroll(self, amount):
+        self._record("scroll", int(amount))
+
+    def press(self, key):
+        self._record("press", key.lower())
+
+    def hotkey(self, *keys):
+        self._record("hotkey", *(k.lower() for k in keys))
+
+    def type_text(self, text, interval=0.0):
+        self._record("type", text)
+
+    def block_input(self, blocked):
+        self._record("block", bool(blocked))
+
+    def restore_focus(self, hwnd):
+        pass
+
+    def clear(self):
+        with self._cond:
+            self.events.clear()
+
+    def wait_for(self, action, after=0.0, timeout=None):
+        """等待時間晚於 after 的 action 動作，回傳該事件；逾時回傳 None"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._cond:
+            while True:
+                for event in self.events:
+                    if event[0] > after and event[1] == action:
+                        return event
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+
+def input_from_spec(spec=None):
+    """由設定字串建立輸入來源
+
+    spec: "win32"（實際輸入）或 "record"（只記錄），None 則讀環境變數 PYCLICK_INPUT，沒設定就是 win32
+    """
+    if spec is None:
+        spec = os.environ.get(INPUT_BACKEND_ENV) or "win32"
+    kind = spec.strip().lower()
+    if kind == "win32":
+        return Win32Input()
+    if kind == "record":
+        return RecordingInput()
+    raise ValueError(f"未知的輸入來源: {spec}")
@@ -15,7 +15,6 @@ import tkinter as tk
 from tkinter import ttk
 import cv2
 import numpy as np
-import mss
 import pyautogui
 import pystray
 from pystray import MenuItem as Item
@@ -25,6 +24,10 @@ import winsound
 import keyboard
 import random
 
+from capture import CaptureService
+from matcher import best_match
+from uibus import UiBus
+
 # Windows API
 user32 = ctypes.windll.user32
 kernel32 = ctypes.windll.kernel32
@@ -148,10 +151,14 @@ class LiteRunner:
         # 狀態
         self.last_click_time = 0
         self.click_cooldown = 1.0
+
+        # 截圖來源（預設即時螢幕，可用 PYCLICK_CAPTURE 環境變數換成重播/合成畫面）
+        self.capture = CaptureService()
         self.total_clicks = 0
 
         # UI
         self.root = None
+        self._ui = None     # 設定視窗開啟後才有（背景執行緒的 UI 更新經由匯流排合併）
         self.icon = None
 
         # 載入資源
@@ -211,8 +218,7 @@ class LiteRunner:
         self.update_icon()
 
         # 更新 UI（如果面板開啟）
-        if self.root and self.root.winfo_exists():
-            self.root.after(0, self._update_control_buttons)
+        self._post_ui("controls", self._update_control_buttons)
 
     def create_icon_image(self):
         """建立托盤圖示"""
@@ -308,6 +314,8 @@ class LiteRunner:
 
         # 關閉視窗時縮到托盤而非結束程式
         self.root.protocol("WM_DELETE_WINDOW", self._hide_to_tray)
+        self._ui = UiBus(self.root)
+        self._ui.start()
 
         # 標題
         tk.Label(
@@ -435,9 +443,6 @@ class LiteRunner:
         )
         tip_label.pack(pady=(0, 10))
 
-        # 啟動統計更新（面板開啟時持續更新）
-        self._start_stats_update()
-
         self.root.mainloop()
 
     def _hide_to_tray(self):
@@ -482,15 +487,15 @@ class LiteRunner:
         self.update_icon()
         self._update_control_buttons()
 
-    def _start_stats_update(self):
-        """啟動統計更新"""
-        def update():
-            if self.root and self.root.winfo_exists():
-                if hasattr(self, 'stats_label'):
-                    self.stats_label.config(text=f"已點擊: {self.total_clicks} 次")
-                # 面板開啟時持續更新
-                self.root.after(500, update)
-        update()
+    def _post_ui(self, key, fn, *args):
+        """從背景執行緒更新 UI（面板沒開就略過；同一個鍵只套用最新的）"""
+        if self._ui:
+            self._ui.post(key, fn, *args)
+
+    def _update_stats(self):
+        """更新統計"""
+        if hasattr(self, 'stats_label'):
+            self.stats_label.config(text=f"已點擊: {self.total_clicks} 次")
 
     def start_auto_thread(self):
         """啟動自動執行緒"""
@@ -535,6 +540,7 @@ class LiteRunner:
         force_focus(original_hwnd)
 
         self.total_clicks += self.click_count
+        self._post_ui("clicks", self._update_stats)
 
     def _auto_loop(self):
         """自動偵測迴圈"""
@@ -547,15 +553,12 @@ class LiteRunner:
                     break
 
             try:
-                with mss.mss() as sct:
-                    monitor = sct.monitors[0]
-                    screen = np.array(sct.grab(monitor))
-                    screen = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-                    ox, oy = monitor["left"], monitor["top"]
+                frame = self.capture.get_frame()
+                screen = frame.bgr
+                ox, oy = frame.left, frame.top
 
                 # 模板匹配
-                result = cv2.matchTemplate(screen, self.template, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, max_loc = cv2.minMaxLoc(result)
+                max_val, max_loc = best_match(screen, self.template)
 
                 if max_val >= self.threshold:
                     # 冷卻檢查
@@ -579,8 +582,7 @@ class LiteRunner:
         self.auto_start_time = None
         self.update_icon()
         # 更新 UI（如果面板開啟）
-        if self.root and self.root.winfo_exists():
-            self.root.after(0, self._on_auto_stop_complete)
+        self._post_ui("auto_stop", self._on_auto_stop_complete)
 
     def _on_auto_stop_complete(self):
         """定時停止後更新 UI"""
@@ -592,6 +594,7 @@ class LiteRunner:
         """結束程式"""
         self.running = False
         self.mode = "off"
+        self.capture.stop()
         if self.icon:
             self.icon.stop()
         if self.root:
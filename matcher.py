@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+PyClick 模板匹配模組
+金字塔粗到細搜尋：先在縮小的畫面找候選，再只在候選附近做全解析度匹配
+候選擷取與 NMS 全部以 NumPy 向量化處理
+多模板時用 BatchMatcher：畫面每個分塊只做一次 DFT，所有模板共用
+"""
+
+import cv2
+import numpy as np
+
+from buffers import BufferPool
+
+# 金字塔設定
+PYRAMID_MAX_LEVEL = 2            # 預設最大層級（2 = 1/4 尺寸）
+PYRAMID_MIN_TEMPLATE_SIZE = 12   # 縮小後模板最短邊下限（太小的模板不縮）
+PYRAMID_COARSE_SLACK = 0.15      # 粗搜尋門檻放寬量（縮小會降低分數）
+PYRAMID_MAX_CANDIDATES = 256     # 粗搜尋候選上限，超過則退回全解析度
+PYRAMID_REFINE_PAD = 2           # 細搜尋視窗額外邊距（像素）
+
+# 批次 FFT 匹配設定
+BATCH_MIN_TEMPLATES = 3          # 彩色匹配時模板數達此值才改用批次 FFT 匹配
+BATCH_TILE_SIZES = (256, 512, 1024)  # 分塊 DFT 尺寸（依模板大小分組）
+BATCH_MAX_TEMPLATE_RATIO = 0.5   # 模板邊長 <= 分塊的一半才放進該組
+
+# 去重設定
+NMS_DISTANCE_RATIO = 0.8         # 同一模板：80% 模板尺寸內視為同一個
+DEDUP_DISTANCE = 50              # 不同模板：50 像素內視為同一處
+
+# matchTemplate 結果圖重複使用（全解析度 4K 單張約 30 MB）
+_result_pool = BufferPool()
+
+
+def build_pyramid(image, max_level):
+    """建立影像金字塔：[原圖, 1/2, 1/4, ...]"""
+    levels = [image]
+    for _ in range(max_level):
+        prev = levels[-1]
+        h, w = prev.shape[:2]
+        if h < 2 or w < 2:
+            break
+        levels.append(cv2.resize(prev, (w // 2, h // 2), interpolation=cv2.INTER_AREA))
+    return levels
+
+
+def template_level(template, level):
+    """模板第 level 層縮圖（預編譯模板直接取用，見 template_cache.py）"""
+    pyramid = getattr(template, "pyramid", None)
+    if pyramid is not None and len(pyramid) > level:
+        return pyramid[level]
+    return build_pyramid(template, level)[level]
+
+
+def match_template(image, template):
+    """TM_CCOEFF_NORMED 匹配，結果圖借自緩衝區池（用完以 release_result 歸還才會重用）"""
+    h = image.shape[0] - template.shape[0] + 1
+    w = image.shape[1] - template.shape[1] + 1
+    result = _result_pool.take((h, w), np.float32)
+    return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, result=result)
+
+
+def release_result(result):
+    """歸還 match_template 的結果圖（之後不可再使用）"""
+    _result_pool.give(result)
+
+
+def best_match(image, template):
+    """匹配並回傳 (最高分, 左上角)，結果圖用完即歸還"""
+    result = match_template(image, template)
+    try:
+        _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    finally:
+        release_result(result)
+    return max_val, max_loc
+
+
+def pyramid_level_for(template, max_level, min_size=PYRAMID_MIN_TEMPLATE_SIZE):
+    """依模板尺寸決定可用的金字塔層級（每個模板各自判斷）"""
+    th, tw = template.shape[:2]
+    level = 0
+    while level < max_level and min(th, tw) >> (level + 1) >= min_size:
+        level += 1
+    return level
+
+
+def _empty_candidates():
+    """沒有任何候選時的回傳值"""
+    empty = np.empty(0, dtype=np.intp)
+    return empty, empty, np.empty(0, dtype=np.float32)
+
+
+def _threshold_candidates(result, threshold, x0=0, y0=0):
+    """取出結果圖中所有 >= 門檻的位置（左上角座標）"""
+    ys, xs = np.nonzero(result >= threshold)
+    scores = result[ys, xs]
+    return xs + x0, ys + y0, scores
+
+
+def _coarse_peaks(result, threshold):
+    """粗搜尋結果的局部極大值（只保留 3x3 內最高者）"""
+    peaks = (result >= threshold) & (result >= cv2.dilate(result, None))
+    ys, xs = np.nonzero(peaks)
+    return xs, ys, result[ys, xs]
+
+
+def match_candidates(screen_levels, template, threshold, max_level=0,
+                     min_size=PYRAMID_MIN_TEMPLATE_SIZE, template_levels=None):
+    """找出所有 >= 門檻的匹配位置，回傳 (xs, ys, scores)，座標為左上角
+
+    screen_levels: build_pyramid() 的結果（或只含原圖的 list）
+    template_levels: 模板的金字塔（可選，省去重複縮圖）
+    分數一律是全解析度的 TM_CCOEFF_NORMED，門檻語意與直接匹配相同
+    """
+    screen = screen_levels[0]
+    th, tw = template.shape[:2]
+    sh, sw = screen.shape[:2]
+    if sh < th or sw < tw:
+        return _empty_candidates()
+
+    level = min(pyramid_level_for(template, max_level, min_size), len(screen_levels) - 1)
+    if level > 0:
+        if template_levels is not None and len(template_levels) > level:
+            small_template = template_levels[level]
+        else:
+            small_template = template_level(template, level)
+        small_screen = screen_levels[level]
+        if (small_screen.shape[0] < small_template.shape[0]
+                or small_screen.shape[1] < small_template.shape[1]):
+            level = 0
+
+    if level == 0:
+        return _match_threshold(screen, template, threshold)
+
+    # --- 粗搜尋：在縮小的畫面上找候選 ---
+    coarse = match_template(small_screen, small_template)
+    try:
+        return _refine_candidates(screen, template, coarse, level, threshold)
+    finally:
+        release_result(coarse)
+
+
+def _match_threshold(image, template, threshold, x0=0, y0=0):
+    """全解析度匹配並取出 >= 門檻的位置（候選會複製出來，結果圖直接歸還）"""
+    result = match_template(image, template)
+    try:
+        return _threshold_candidates(result, threshold, x0, y0)
+    finally:
+        release_result(result)
+
+
+def _refine_candidates(screen, template, coarse, level, threshold):
+    """由粗搜尋結果取候選，再在候選附近的小視窗做全解析度匹配"""
+    th, tw = template.shape[:2]
+    sh, sw = screen.shape[:2]
+    cxs, cys, _ = _coarse_peaks(coarse, max(threshold - PYRAMID_COARSE_SLACK, 0.0))
+
+    if len(cxs) > PYRAMID_MAX_CANDIDATES:
+        # 候選太多（重複性高的畫面），細搜尋反而更慢，直接全解析度匹配
+        return _match_threshold(screen, template, threshold)
+
+    # --- 細搜尋：只在候選附近的小視窗做全解析度匹配 ---
+    scale = 1 << level
+    pad = scale + PYRAMID_REFINE_PAD
+    max_x = sw - tw
+    max_y = sh - th
+    all_xs, all_ys, all_scores = [], [], []
+    for cx, cy in zip(cxs, cys):
+        x1 = max(0, int(cx) * scale - pad)
+        y1 = max(0, int(cy) * scale - pad)
+        x2 = min(max_x, int(cx) * scale + pad)
+        y2 = min(max_y, int(cy) * scale + pad)
+        if x2 < x1 or y2 < y1:
+            continue
+        window = screen[y1:y2 + th, x1:x2 + tw]
+        xs, ys, scores = _match_threshold(window, template, threshold, x1, y1)
+        all_xs.append(xs)
+        all_ys.append(ys)
+        all_scores.append(scores)
+
+    if not all_xs:
+        return _empty_candidates()
+
+    xs = np.concatenate(all_xs)
+    ys = np.concatenate(all_ys)
+    scores = np.concatenate(all_scores)
+
+    # 相鄰候選的視窗可能重疊，去除重複位置（依列優先順序排列，與全圖掃描一致）
+    keys = ys.astype(np.int64) * sw + xs
+    _, first = np.unique(keys, return_index=True)
+    return xs[first], ys[first], scores[first]
+
+
+def suppress(xs, ys, scores, min_distance, top_k=None):
+    """非極大值抑制 (NMS)：依分數由高到低，移除與已保留點距離 < min_distance 的點
+
+    結果與逐點比對的貪婪演算法完全相同（同分時保持原本順序），
+    但每保留一個點只做一次向量化距離計算，不再是 O(n²) 的 Python 迴圈
+    top_k: 最多保留幾個（None/0 = 不限制）
+    """
+    if len(xs) == 0:
+        return []
+    order = np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable")
+    xs = np.asarray(xs, dtype=np.float64)[order]
+    ys = np.asarray(ys, dtype=np.float64)[order]
+    return _greedy_keep(xs, ys, min_distance, top_k)
+
+
+def dedup_points(points, min_distance=DEDUP_DISTANCE):
+    """去除重複位置（不同模板可能匹配到同一處），保留先出現的點"""
+    if len(points) <= 1:
+        return list(points)
+    pts = np.asarray(points, dtype=np.float64)
+    return _greedy_keep(pts[:, 0], pts[:, 1], min_distance)
+
+
+def _greedy_keep(xs, ys, min_distance, top_k=None):
+    """依序保留點：剩餘清單的第一個一定保留，再一次刪掉它附近的所有點"""
+    kept = []
+    while len(xs):
+        x, y = xs[0], ys[0]
+        kept.append((int(x), int(y)))
+        if top_k and len(kept) >= top_k:
+            break
+        far = np.sqrt((xs - x) ** 2 + (ys - y) ** 2) >= min_distance
+        xs = xs[far]
+        ys = ys[far]
+    return kept
+
+
+def find_all_matches(screen_levels, template, threshold, ox=0, oy=0, max_level=0,
+                     min_size=PYRAMID_MIN_TEMPLATE_SIZE, template_levels=None, top_k=None):
+    """找出螢幕上所有匹配位置（使用 NMS 避免重複），回傳中心點 [(x, y), ...]
+
+    top_k: 每個模板最多回傳幾個（分數最高的前 K 個，None/0 = 不限制）
+    """
+    if isinstance(screen_levels, np.ndarray):
+        screen_levels = [screen_levels]
+
+    xs, ys, scores = match_candidates(screen_levels, template, threshold,
+                                      max_level, min_size, template_levels)
+    return to_centers(xs, ys, scores, template, ox, oy, top_k)
+
+
+def to_centers(xs, ys, scores, template, ox=0, oy=0, top_k=None):
+    """候選左上角 → 中心點（螢幕座標），並做 NMS"""
+    if len(xs) == 0:
+        return []
+    th, tw = template.shape[:2]
+    cxs = xs + (tw // 2 + ox)
+    cys = ys + (th // 2 + oy)
+    return suppress(cxs, cys, scores, max(tw, th) * NMS_DISTANCE_RATIO, top_k)
+
+
+# ============================================================
+# 批次 FFT 匹配
+# ============================================================
+
+def should_batch(templates):
+    """是否值得用批次匹配：彩色（多通道）且模板數夠多
+
+    灰階單通道時 OpenCV 的 matchTemplate 本身已很快，批次反而較慢
+    """
+    return len(templates) >= BATCH_MIN_TEMPLATES and templates[0].ndim == 3
+
+
+def _tile_size_for(th, tw):
+    """依模板尺寸選分塊 DFT 大小，太大的模板回傳 None（改用 matchTemplate）"""
+    for size in BATCH_TILE_SIZES:
+        if max(th, tw) <= size * BATCH_MAX_TEMPLATE_RATIO:
+            return size
+    return None
+
+
+class _BatchEntry:
+    """批次匹配中的單一模板：預先算好零均值頻譜與範數（預編譯模板直接取用範數）"""
+
+    def __init__(self, index, template, level, tile):
+        self.index = index
+        self.template = template          # 全解析度模板（細搜尋用）
+        self.level = level
+        self.small = template if level == 0 else template_level(template, level)
+        self.th, self.tw = self.small.shape[:2]
+        self.tile = tile
+
+        norms = getattr(template, "norms", None)
+        cached = norms is not None and len(norms) > level
+        zero_mean = []
+        if tile or not cached:
+            planes = cv2.split(self.small.astype(np.float32))
+            zero_mean = [p - float(p.mean()) for p in planes]
+        if cached:
+            self.norm = norms[level]
+        else:
+            self.norm = float(np.sqrt(sum(float((p.astype(np.float64) ** 2).sum()) for p in zero_mean)))
+
+        # 模板頻譜（補零到分塊大小，只算一次）
+        self.spectra = []
+        if tile:
+            for p in zero_mean:
+                padded = np.zeros((tile, tile), np.float32)
+                padded[:self.th, :self.tw] = p
+                self.spectra.append(cv2.dft(padded))
+
+
+class BatchMatcher:
+    """批次 FFT 模板匹配
+
+    模板依分塊 DFT 尺寸分組；畫面每個分塊（overlap-save）只做一次正轉換，
+    組內所有模板共用同一份頻譜，每個模板只需頻譜相乘 + 一次反轉換。
+    視窗平均與能量用 boxFilter 計算，每種模板尺寸只算一次。
+    結果與 cv2.matchTemplate(TM_CCOEFF_NORMED) 相同（浮點誤差內），門檻語意不變。
+    """
+
+    def __init__(self, templates, max_level=0, min_size=PYRAMID_MIN_TEMPLATE_SIZE):
+        self.templates = list(templates)
+        self.max_level = max_level
+        self.entries = []
+        for i, template in enumerate(self.templates):
+            level = pyramid_level_for(template, max_level, min_size)
+            small_h, small_w = template.shape[0] >> level, template.shape[1] >> level
+            self.entries.append(_BatchEntry(i, template, level, _tile_size_for(small_h, small_w)))
+
+    def __len__(self):
+        return len(self.templates)
+
+    def match_results(self, image, entries):
+        """對同一張影像計算多個模板的 TM_CCOEFF_NORMED 結果圖，回傳 {index: result}"""
+        ih, iw = image.shape[:2]
+        results = {}
+        groups = {}
+        for entry in entries:
+            if ih < entry.th or iw < entry.tw:
+                continue
+            if entry.tile is None:
+                results[entry.index] = match_template(image, entry.small)
+            else:
+                groups.setdefault(entry.tile, []).append(entry)
+
+        if not groups:
+            return results
+
+        planes = cv2.split(image.astype(np.float32))
+        for tile, group in groups.items():
+            numerators = self._correlate_tiled(planes, ih, iw, tile, group)
+            results.update(numerators)
+
+        self._normalize(image, [e for g in groups.values() for e in g], results)
+        return results
+
+    def _correlate_tiled(self, planes, ih, iw, tile, group):
+        """分塊相關運算：每個畫面分塊的 DFT 只做一次，組內模板共用"""
+        max_th = max(e.th for e in group)
+        max_tw = max(e.tw for e in group)
+        step_y = tile - max_th + 1
+        step_x = tile - max_tw + 1
+
+        # 補零讓最後一排分塊也是完整大小
+        pad_h = -(-ih // step_y) * step_y + tile - step_y - ih
+        pad_w = -(-iw // step_x) * step_x + tile - step_x - iw
+        padded = [cv2.copyMakeBorder(p, 0, pad_h, 0, pad_w, cv2.BORDER_CONSTANT, value=0)
+                  for p in planes]
+
+        out = {e.index: np.empty((ih - e.th + 1, iw - e.tw + 1), np.float32) for e in group}
+        flags = cv2.DFT_SCALE | cv2.DFT_REAL_OUTPUT
+        for y in range(0, ih, step_y):
+            for x in range(0, iw, step_x):
+                tile_spectra = [cv2.dft(np.ascontiguousarray(p[y:y + tile, x:x + tile]))
+                                for p in padded]
+                for e in group:
+                    rh = min(step_y, ih - e.th + 1 - y)
+                    rw = min(step_x, iw - e.tw + 1 - x)
+                    if rh <= 0 or rw <= 0:
+                        continue
+                    acc = cv2.mulSpectrums(tile_spectra[0], e.spectra[0], 0, conjB=True)
+                    for c in range(1, len(tile_spectra)):
+                        acc += cv2.mulSpectrums(tile_spectra[c], e.spectra[c], 0, conjB=True)
+                    corr = cv2.idft(acc, flags=flags)
+                    out[e.index][y:y + rh, x:x + rw] = corr[:rh, :rw]
+        return out
+
+    def _normalize(self, image, entries, results):
+        """分子除以（視窗標準差 x 模板範數），規則同 OpenCV 的 TM_CCOEFF_NORMED"""
+        planes = cv2.split(image.astype(np.float64))
+        sq_sum = planes[0] * planes[0]
+        for p in planes[1:]:
+            sq_sum += p * p
+
+        stds = {}
+        for e in entries:
+            if e.norm < np.finfo(np.float64).eps:
+                # 單色模板：OpenCV 回傳全 1
+                results[e.index] = np.ones_like(results[e.index])
+                continue
+
+            key = (e.th, e.tw)
+            rh, rw = results[e.index].shape
+            if key not in stds:
+                # 視窗總和（anchor 左上角，每種模板尺寸只算一次）
+                box = lambda src: cv2.boxFilter(src, cv2.CV_64F, (e.tw, e.th), anchor=(0, 0),
+                                                normalize=False, borderType=cv2.BORDER_CONSTANT)[:rh, :rw]
+                mean_sq = sum(box(p) ** 2 for p in planes) / (e.th * e.tw)
+                stds[key] = np.sqrt(np.maximum(box(sq_sum) - mean_sq, 0)).astype(np.float32)
+
+            # |分子| < t → 分子/t；< 1.125t → ±1；其餘（含 t = 0）→ 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = results[e.index] / (stds[key] * np.float32(e.norm))
+            ratio[~(np.abs(ratio) < 1.125)] = 0
+            results[e.index] = np.clip(ratio, -1, 1, out=ratio)
+
+    def match(self, screen_levels, threshold):
+        """所有模板的候選位置，回傳 [(xs, ys, scores), ...]（依模板順序）"""
+        if isinstance(screen_levels, np.ndarray):
+            screen_levels = [screen_levels]
+        screen = screen_levels[0]
+        top_level = len(screen_levels) - 1
+
+        candidates = [_empty_candidates() for _ in self.entries]
+        by_level = {}
+        for e in self.entries:
+            if e.level > top_level:
+                # 畫面金字塔層數不足：退回單模板匹配
+                candidates[e.index] = match_candidates(screen_levels, e.template, threshold, top_level)
+            else:
+                by_level.setdefault(e.level, []).append(e)
+
+        for level, entries in by_level.items():
+            results = self.match_results(screen_levels[level], entries)
+            for e in entries:
+                if e.index not in results:
+                    if level > 0:
+                        # 縮小後畫面比模板還小：改用全解析度
+                        candidates[e.index] = match_candidates([screen], e.template, threshold)
+                elif level == 0:
+                    candidates[e.index] = _threshold_candidates(results[e.index], threshold)
+                else:
+                    candidates[e.index] = _refine_candidates(
+                        screen, e.template, results[e.index], level, threshold)
+                # 候選已複製出來，結果圖可以給下一輪用
+                release_result(results.pop(e.index, None))
+        return candidates
+
+    def find_all_matches(self, screen_levels, threshold, ox=0, oy=0, top_k=None):
+        """所有模板的匹配中心點（依模板順序串接，各模板各自做 NMS）"""
+        all_matches = []
+        for entry, (xs, ys, scores) in zip(self.entries, self.match(screen_levels, threshold)):
+            all_matches.extend(to_centers(xs, ys, scores, entry.template, ox, oy, top_k))
+        return all_matches
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+PyClick 指標輸出（Prometheus 文字格式）
+在 127.0.0.1 開一個 HTTP 端點（GET /metrics），輸出掃描次數、變動偵測略過次數、
+ROI 命中 / 失敗、匹配數、點擊數與各階段耗時分桶，可用 Prometheus 收集多個 PyClick。
+
+只讀取 StageTimer 的累計值（複製後輸出），不持有任何掃描執行緒會用到的鎖
+"""
+
+import http.server
+import logging
+import threading
+
+logger = logging.getLogger('PyClick')
+
+METRICS_HOST = "127.0.0.1"      # 只接受本機連線
+METRICS_PREFIX = "pyclick"
+
+# 計數器名稱 -> (指標名稱, 說明, 標籤)
+COUNTERS = (
+    ("scans", "scans_total", "掃描輪數（含畫面未變動而略過匹配的）", ""),
+    ("scans_skipped", "scans_skipped_total", "畫面未變動、略過匹配的輪數", ""),
+    ("roi_hits", "roi_scans_total", "ROI 掃描次數", 'result="hit"'),
+    ("roi_misses", "roi_scans_total", "ROI 掃描次數", 'result="miss"'),
+    ("matches", "matches_total", "找到的匹配位置數", ""),
+    ("clicks", "clicks_total", "點擊次數", ""),
+)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(timer, gauges=None):
+    """StageTimer + 額外數值 → Prometheus 文字格式
+
+    gauges: {名稱: (說明, 數值)}，例如累計總點擊數
+    """
+    lines = []
+    declared = set()
+    counters = timer.snapshot_counters()
+    for key, name, help_text, labels in COUNTERS:
+        full = f"{METRICS_PREFIX}_{name}"
+        if full not in declared:
+            lines.append(f"# HELP {full} {help_text}")
+            lines.append(f"# TYPE {full} counter")
+            declared.add(full)
+        label_text = f"{{{labels}}}" if labels else ""
+        lines.append(f"{full}{label_text} {counters.get(key, 0)}")
+
+    full = f"{METRICS_PREFIX}_stage_seconds"
+    lines.append(f"# HELP {full} 各階段耗時（秒）")
+    lines.append(f"# TYPE {full} histogram")
+    for stage in timer.stages:
+        buckets, total, count = timer.cumulative[stage].snapshot()
+        for bound, n in buckets:
+            lines.append(f'{full}_bucket{{stage="{stage}",le="{_format_value(bound)}"}} {n}')
+        lines.append(f'{full}_sum{{stage="{stage}"}} {total!r}')
+        lines.append(f'{full}_count{{stage="{stage}"}} {count}')
+
+    values = {
+        "scans_per_second": ("最近幾秒的掃描速率", timer.scans_per_second()),
+        "best_score": ("最近一次匹配的最高相似度", timer.best_score),
+    }
+    values.update(gauges or {})
+    for name, (help_text, value) in values.items():
+        if value is None:
+            continue
+        full = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {full} {help_text}")
+        lines.append(f"# TYPE {full} gauge")
+        lines.append(f"{full} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """本機指標 HTTP 端點（背景執行緒）
+
+    gauges: 回傳 {名稱: (說明, 數值)} 的函式，每次收集時呼叫
+    """
+
+    def __init__(self, timer, port, gauges=None, host=METRICS_HOST):
+        self.timer = timer
+        self.port = port
+        self.host = host
+        self.gauges = gauges
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        if self._server is not None:
+            return
+        server_ref = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                try:
+                    gauges = server_ref.gauges() if server_ref.gauges else None
+                    body = render_metrics(server_ref.timer, gauges).encode("utf-8")
+                except Exception as e:
+                    logger.error(f"指標輸出失敗: {e}")
+                    self.send_error(500)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass    # 不寫入日誌（每次收集都會呼叫）
+
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        logger.info(f"指標端點: http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        self._thread = None
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+PyClick 掃描錄製模組
+把自動模式實際看到的畫面、時間與匹配結果錄成檔案，供離線重播分析
+
+檔案格式（.pyrec）：
+    檔頭：MAGIC + uint32 長度 + JSON（畫面尺寸、螢幕偏移、tile 大小）
+    之後是一連串記錄，每筆 = 記錄頭 (種類 1 byte, 時間 float64, 長度 uint32) + zlib 壓縮內容
+      K 關鍵畫面：整張畫面
+      D 差異畫面：只存變動的 tile，內容為與前一張的 XOR（未變動的像素壓縮後幾乎不佔空間）
+      M 匹配結果：JSON（對應的畫面序號、匹配位置、點擊位置；畫面被丟棄時序號為 null）
+沒有結尾索引，讀取時掃過記錄頭即可建立索引，程式中斷時已寫入的部分仍可讀取。
+讀取用 mmap，隨機存取只需從最近的關鍵畫面開始套用差異。
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import cv2
+import numpy as np
+
+MAGIC = b"PYCREC\x00\x01"
+RECORDING_EXT = ".pyrec"
+RECORD_TILE_SIZE = 64           # 差異比對的 tile 邊長
+RECORD_KEYFRAME_INTERVAL = 300  # 每隔幾張全螢幕畫面存一張關鍵畫面（方便跳轉）
+RECORD_COMPRESS_LEVEL = 1       # zlib 壓縮等級（1 = 最快，錄製不拖慢掃描）
+RECORD_QUEUE_SIZE = 8           # 待寫入畫面上限，寫不完就丟棄（不阻塞掃描）
+
+_RECORD = struct.Struct("<cdI")        # 種類, 時間, 內容長度
+_FRAME = struct.Struct("<iiIII")       # 區域 x, y, w, h（相對畫面左上角）, tile 數
+
+
+def _tile_slices(h, w, tile, ty, tx):
+    return slice(ty * tile, min((ty + 1) * tile, h)), slice(tx * tile, min((tx + 1) * tile, w))
+
+
+def _dirty_tiles(new, old, tile):
+    """兩張同尺寸影像中有任何像素不同的 tile（回傳 (ty, tx) 陣列）"""
+    h, w = new.shape[:2]
+    changed = (new != old).any(axis=2)
+    rows, cols = -(-h // tile), -(-w // tile)
+    padded = np.zeros((rows * tile, cols * tile), bool)
+    padded[:h, :w] = changed
+    return np.argwhere(padded.reshape(rows, tile, cols, tile).any(axis=(1, 3)))
+
+
+class SessionRecorder:
+    """錄製掃描畫面（背景執行緒壓縮寫入，不阻塞掃描迴圈）"""
+
+    def __init__(self, path, screen, tile=RECORD_TILE_SIZE,
+                 keyframe_interval=RECORD_KEYFRAME_INTERVAL):
+        self.path = path
+        self.screen = dict(screen)      # 整個虛擬螢幕 {"left", "top", "width", "height"}
+        self.tile = tile
+        self.keyframe_interval = keyframe_interval
+        self.frame_count = 0            # 已接受的畫面數
+        self.dropped = 0                # 寫入跟不上而丟棄的記錄數（畫面 + 匹配結果）
+        self._queue = queue.Queue(maxsize=RECORD_QUEUE_SIZE)
+        self._canvas = np.zeros((screen["height"], screen["width"], 3), np.uint8)
+        self._since_key = None          # 距離上一張關鍵畫面的全螢幕畫面數（None = 還沒有）
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "wb")
+        header = json.dumps({
+            "version": 1,
+            "left": self.screen["left"], "top": self.screen["top"],
+            "width": self.screen["width"], "height": self.screen["height"],
+            "tile": tile, "created": time.time(),
+        }).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+        self._thread = threading.Thread(target=self._run, name="SessionRecorder", daemon=True)
+        self._thread.start()
+
+    def add_frame(self, frame):
+        """加入一張掃描畫面（全螢幕或 ROI），回傳畫面序號；佇列滿則丟棄回傳 None"""
+        try:
+            self._queue.put_nowait(("F", frame.timestamp, frame.left, frame.top, frame.bgra))
+        except queue.Full:
+            self.dropped += 1
+            return None
+        self.frame_count += 1
+        return self.frame_count - 1
+
+    def add_matches(self, frame_index, matches, clicked=()):
+        """記錄一張畫面（add_frame 的回傳值）的匹配結果與點擊位置（螢幕座標）；佇列滿則丟棄"""
+        event = {
+            "frame": frame_index,
+            "matches": [list(p) for p in matches],
+            "clicked": [list(p) for p in clicked],
+        }
+        try:
+            self._queue.put_nowait(("M", time.time(), event))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """寫完佇列內的資料並關閉檔案"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+
+    def _write(self, kind, timestamp, payload):
+        data = zlib.compress(payload, RECORD_COMPRESS_LEVEL)
+        self._file.write(_RECORD.pack(kind, timestamp, len(data)) + data)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if item[0] == "M":
+                _, timestamp, event = item
+                self._write(b"M", timestamp, json.dumps(event).encode())
+                continue
+            _, timestamp, left, top, bgra = item
+            self._encode_frame(timestamp, left - self.screen["left"], top - self.screen["top"], bgra)
+        self._file.flush()
+
+    def _encode_frame(self, timestamp, x, y, bgra):
+        h, w = bgra.shape[:2]
+        new = bgra[:, :, :3]
+        full = (x, y, w, h) == (0, 0, self.screen["width"], self.screen["height"])
+        region = self._canvas[y:y + h, x:x + w]
+
+        if full and (self._since_key is None or self._since_key >= self.keyframe_interval):
+            region[:] = new
+            self._since_key = 0
+            self._write(b"K", timestamp, _FRAME.pack(x, y, w, h, 0) + region.tobytes())
+            return
+        if full:
+            self._since_key += 1
+
+        tiles = _dirty_tiles(new, region, self.tile)
+        parts = [_FRAME.pack(x, y, w, h, len(tiles)), tiles.astype(np.uint16).tobytes()]
+        for ty, tx in tiles:
+            sy, sx = _tile_slices(h, w, self.tile, ty, tx)
+            parts.append(np.bitwise_xor(new[sy, sx], region[sy, sx]).tobytes())
+            region[sy, sx] = new[sy, sx]
+        self._write(b"D", timestamp, b"".join(parts))
+
+
+class SessionReader:
+    """讀取 .pyrec 錄製檔（mmap，依序或隨機取畫面）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"不是 PyClick 錄製檔: {path}")
+        (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[start:start + header_len])
+        self.screen = {k: self.header[k] for k in ("left", "top", "width", "height")}
+        self.tile = self.header["tile"]
+
+        self._frames = []       # (offset, length, 是否關鍵畫面)
+        self.timestamps = []
+        self.events = []        # 匹配結果
+        self._scan(start + header_len)
+        self.timestamps = np.array(self.timestamps, dtype=np.float64)
+        self.keyframes = [i for i, f in enumerate(self._frames) if f[2]]
+
+        self._canvas = None
+        self._canvas_index = -1
+
+    def _scan(self, offset):
+        """掃過所有記錄頭建立索引（最後一筆不完整則忽略）"""
+        size = len(self._mmap)
+        while offset + _RECORD.size <= size:
+            kind, timestamp, length = _RECORD.unpack_from(self._mmap, offset)
+            body = offset + _RECORD.size
+            if body + length > size:
+                break
+            if kind == b"M":
+                event = json.loads(zlib.decompress(self._mmap[body:body + length]))
+                event["time"] = timestamp
+                self.events.append(event)
+            else:
+                self._frames.append((body, length, kind == b"K"))
+                self.timestamps.append(timestamp)
+            offset = body + length
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def frame(self, index):
+        """第 index 張畫面（整個虛擬螢幕，BGRA）
+
+        依序讀取時只套用一張差異；跳轉時從最近的關鍵畫面開始重建
+        """
+        if not 0 <= index < len(self._frames):
+            raise IndexError(index)
+        k = bisect.bisect_right(self.keyframes, index)
+        start = self.keyframes[k - 1] if k else 0   # 沒有關鍵畫面則從頭開始，未錄到的區域為黑色
+        if self._canvas is None or not start <= self._canvas_index < index:
+            self._canvas = np.zeros((self.screen["height"], self.screen["width"], 3), np.uint8)
+            self._canvas_index = start - 1
+
+        for i in range(self._canvas_index + 1, index + 1):
+            self._apply(i)
+        self._canvas_index = index
+        return cv2.cvtColor(self._canvas, cv2.COLOR_BGR2BGRA)
+
+    def _apply(self, i):
+        offset, length, _ = self._frames[i]
+        payload = zlib.decompress(self._mmap[offset:offset + length])
+        x, y, w, h, count = _FRAME.unpack_from(payload)
+        region = self._canvas[y:y + h, x:x + w]
+        pos = _FRAME.size
+        if self._frames[i][2]:
+            region[:] = np.frombuffer(payload, np.uint8, h * w * 3, pos).reshape(h, w, 3)
+            return
+        tiles = np.frombuffer(payload, np.uint16, count * 2, pos).reshape(count, 2)
+        pos += count * 4
+        for ty, tx in tiles:
+            sy, sx = _tile_slices(h, w, self.tile, int(ty), int(tx))
+            th, tw = sy.stop - sy.start, sx.stop - sx.start
+            delta = np.frombuffer(payload, np.uint8, th * tw * 3, pos).reshape(th, tw, 3)
+            region[sy, sx] ^= delta
+            pos += th * tw * 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyClick 錄製檔工具")
+    parser.add_argument("path", help=".pyrec 錄製檔")
+    parser.add_argument("--export", metavar="DIR", help="把每張畫面輸出成 PNG（可再用 replay 來源重播）")
+    args = parser.parse_args()
+
+    with SessionReader(args.path) as reader:
+        count = len(reader)
+        duration = reader.timestamps[-1] - reader.timestamps[0] if count > 1 else 0
+        keyframes = len(reader.keyframes)
+        clicks = sum(len(e["clicked"]) for e in reader.events)
+        size_mb = os.path.getsize(args.path) / 1024 / 1024
+        print(f"畫面: {count} 張（關鍵畫面 {keyframes}），{reader.screen['width']}x{reader.screen['height']}")
+        print(f"時間: {duration:.1f} 秒，檔案 {size_mb:.1f} MB")
+        print(f"匹配記錄: {len(reader.events)} 筆，點擊 {clicks} 次")
+
+        if args.export:
+            os.makedirs(args.export, exist_ok=True)
+            for i in range(count):
+                cv2.imwrite(os.path.join(args.export, f"frame_{i:06d}.png"), reader.frame(i)[:, :, :3])
+            print(f"已輸出到 {args.export}")
+
+
+if __name__ == "__main__":
+    main()
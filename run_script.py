@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+PyClick 積木腳本命令列執行（不需要編輯器視窗）
+載入腳本 JSON（積木編輯器存的 scripts/<名稱>.json），用指定的截圖 / 輸入來源執行，
+結束後列出每個積木的執行次數與時間（不含子積木），可以在沒有螢幕的機器上批次執行、找出慢的積木、做回歸測試。
+
+截圖來源同 PYCLICK_CAPTURE（見 backends.py）："mss"、"replay:<資料夾或影片>[@fps]"、"synthetic[:<寬>x<高>]"
+輸入來源同 PYCLICK_INPUT（見 inputs.py）："record"（只記錄，預設）或 "win32"（實際送出）
+
+結束代碼：0 = 執行完成，1 = 被中斷（Ctrl+C），2 = 腳本圖片無法載入（未執行）
+
+用法：
+    python run_script.py scripts/登入.json --capture replay:recordings/login
+    python run_script.py scripts/登入.json --capture synthetic --repeat 10 --json result.json
+    python run_script.py scripts/登入.json --input win32          # 實際操作（Windows）
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from backends import backend_from_spec
+from blocks import Script
+from capture import CaptureService
+from inputs import INPUT_BACKEND_ENV, input_from_spec
+from script_runner import ScriptRunner
+from tracing import Tracer, tracing_enabled, trace_path
+
+TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+
+
+def _depths(blocks, depth=0, out=None):
+    """積木 id -> 巢狀深度（輸出時縮排用）"""
+    if out is None:
+        out = {}
+    for block in blocks:
+        out[block.id] = depth
+        _depths(block.children, depth + 1, out)
+    return out
+
+
+def print_timings(script, runner):
+    """依腳本順序列出每個積木的執行次數與時間"""
+    depths = _depths(script.blocks)
+    # 標籤含中文與圖示，寬度不一，放在最後一欄
+    print(f"{'次數':>6} {'總計 ms':>10} {'平均 ms':>9} {'最長 ms':>9}  積木")
+    for timing in runner.timings(script.blocks):
+        indent = "  " * depths.get(timing.block.id, 0)
+        print(f"{timing.count:>8} {timing.total * 1000:>10.1f} {timing.mean * 1000:>9.2f} "
+              f"{timing.max * 1000:>9.2f}  {indent}{timing.label}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyClick 積木腳本命令列執行")
+    parser.add_argument("script", help="腳本 JSON 路徑")
+    parser.add_argument("--capture", help="截圖來源（預設依 PYCLICK_CAPTURE，沒設定為 mss）")
+    parser.add_argument("--input", choices=["record", "win32"],
+                        help="輸入來源（預設依 PYCLICK_INPUT，沒設定為 record）")
+    parser.add_argument("--threshold", type=float, default=0.7, help="找圖門檻")
+    parser.add_argument("--repeat", type=int, default=1, help="整份腳本執行幾次（時間累計）")
+    parser.add_argument("--json", dest="json_path", help="結果另外寫成 JSON")
+    parser.add_argument("--trace", action="store_true",
+                        help="記錄效能追蹤到 traces/（PYCLICK_TRACE=1 也會開啟）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="顯示執行紀錄")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    script = Script.load(args.script)
+    inputs = input_from_spec(args.input or os.environ.get(INPUT_BACKEND_ENV) or "record")
+    tracer = Tracer() if args.trace or tracing_enabled() else None
+    runner = ScriptRunner(CaptureService(backend_from_spec(args.capture)), inputs, tracer,
+                          threshold=args.threshold)
+
+    try:
+        missing = runner.preload(script.blocks)
+        if missing:
+            for path, labels in missing.items():
+                print(f"圖片無法載入: {path or '(未設定)'}（{'、'.join(labels)}）", file=sys.stderr)
+            return 2
+
+        plan = runner.compile(script.blocks)
+        runs = 0
+        error = []
+        done = threading.Event()
+
+        def work():
+            nonlocal runs
+            try:
+                while runs < args.repeat and not runner.stopped():
+                    runner.execute(plan)
+                    if not runner.stopped():
+                        runs += 1
+            except Exception as e:
+                error.append(e)
+            finally:
+                done.set()
+
+        # 在背景執行緒執行，主執行緒才能接到 Ctrl+C 並要求停止
+        # （用 Event 等待：join() 被中斷後再 join 可能提早返回）
+        start = time.perf_counter()
+        threading.Thread(target=work, name="ScriptRunner", daemon=True).start()
+        try:
+            while not done.wait(0.2):
+                pass
+        except KeyboardInterrupt:
+            print("中斷，等待目前的積木結束...", file=sys.stderr)
+            runner.stop()
+            done.wait()
+        wall = time.perf_counter() - start
+        if error:
+            raise error[0]
+    finally:
+        runner.close()
+
+    print(f"腳本: {script.name}  執行 {runs}/{args.repeat} 次  共 {wall:.2f} 秒")
+    print_timings(script, runner)
+    events = getattr(inputs, "events", None)
+    if events is not None:
+        print(f"輸入動作: {len(events)} 個")
+    stats = runner.templates.stats()
+    print(f"圖片等待: 檢查 {runner.watcher.ticks} 輪，匹配 {runner.watcher.matched} 輪；"
+          f"模板快取: 命中 {stats['hits']}，未命中 {stats['misses']}")
+
+    if tracer:
+        print(f"追蹤已寫入 {tracer.write(trace_path(TRACE_DIR, 'blocks'))}")
+    if args.json_path:
+        report = {
+            "script": script.name,
+            "path": os.path.abspath(args.script),
+            "runs": runs,
+            "repeat": args.repeat,
+            "stopped": runner.stop_flag,
+            "wall_s": wall,
+            "blocks": [timing.to_dict() for timing in runner.timings(script.blocks)],
+            "inputs": None if events is None else [[t, action, list(params)] for t, action, params in events],
+            "watcher": {"ticks": runner.watcher.ticks, "matched": runner.watcher.matched},
+            "templates": stats,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果已寫入 {args.json_path}")
+    return 1 if runner.stop_flag else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+PyClick 全螢幕掃描模組
+分塊變動偵測：畫面切成 tile，只重新匹配有變動的 tile（依模板大小外擴），
+其餘區域沿用上次的匹配結果。變動偵測有容許值（忽略雜訊），並可設定忽略區域
+（時鐘、轉圈圖示、影片縮圖等持續變動的地方）
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+from matcher import (
+    best_match, build_pyramid, match_candidates, to_centers, should_batch, BatchMatcher, dedup_points
+)
+
+TILE_SIZE = 128             # tile 邊長（像素）
+TILE_CELL = 8               # 指紋縮圖：每 8x8 像素平均成一格
+FULL_RESCAN_RATIO = 0.5     # 變動 tile 超過此比例就直接整張重新匹配
+CHANGE_TOLERANCE = 6        # 格子內平均每像素灰階差超過此值才算變動（壓縮雜訊、漸層抖動）
+
+
+def cell_means(image, cell):
+    """每 cell x cell 像素平均成一格的縮圖（邊緣不足一格也算一格）"""
+    h, w = image.shape[:2]
+    pad_y, pad_x = -h % cell, -w % cell
+    if pad_y or pad_x:
+        image = cv2.copyMakeBorder(image, 0, pad_y, 0, pad_x, cv2.BORDER_REPLICATE)
+    return cv2.resize(image, ((w + pad_x) // cell, (h + pad_y) // cell),
+                      interpolation=cv2.INTER_AREA)
+
+
+def roi_candidates(frame, templates, use_color, threshold, top_k=None):
+    """ROI 掃描：區域很小，直接全解析度匹配所有模板
+
+    回傳 (中心點（螢幕座標，未跨模板去重）, 最高相似度（沒找到為 None）)
+    """
+    screen_match = frame.match_image(use_color)
+    all_matches = []
+    best_score = None
+    for template in templates:
+        th, tw = template.shape[:2]
+        if screen_match.shape[0] < th or screen_match.shape[1] < tw:
+            continue
+        xs, ys, scores = match_candidates([screen_match], template, threshold)
+        if len(scores):
+            best_score = max(best_score or 0.0, float(scores.max()))
+        all_matches.extend(to_centers(xs, ys, scores, template, frame.left, frame.top, top_k))
+    return all_matches, best_score
+
+
+def match_roi(frame, templates, use_color, threshold, top_k=None):
+    """ROI 掃描，回傳去重後的中心點（螢幕座標）"""
+    matches, _ = roi_candidates(frame, templates, use_color, threshold, top_k)
+    # 去除重複位置（不同模板可能匹配到同一處）
+    return dedup_points(matches)
+
+
+class TileTracker:
+    """把畫面切成 tile，和上次匹配時的灰階畫面比較，找出有變動的 tile
+
+    以格子內的平均差異判斷（不是比較格子平均亮度），平均亮度不變的變化（換成紋理相近的圖）
+    也偵測得到，零星雜訊則被平均掉
+    """
+
+    def __init__(self, tile_size=TILE_SIZE, cell=TILE_CELL, tolerance=CHANGE_TOLERANCE):
+        self.tile_size = tile_size
+        self.cell = cell
+        self.tolerance = tolerance
+        self._ref = None            # 上次匹配時的灰階畫面
+        self._ignore_rects = ()     # 忽略區域（螢幕座標）
+        self._ignore_mask = None
+        self._ignore_key = None
+
+    def reset(self):
+        """清除指紋（下次視為整張畫面都變了）"""
+        self._ref = None
+
+    def set_ignore_rects(self, rects):
+        """設定忽略區域 [(x1, y1, x2, y2), ...]（螢幕座標），區域內的變動不算變動"""
+        self._ignore_rects = tuple(tuple(r) for r in rects)
+
+    @property
+    def ignore_rects(self):
+        return self._ignore_rects
+
+    def _get_ignore_mask(self, frame, shape):
+        """忽略區域 → 格子層級的遮罩（區域或截圖位置改變才重建）"""
+        rects = self._ignore_rects
+        if not rects:
+            return None
+        key = (rects, frame.left, frame.top, shape)
+        if self._ignore_key != key:
+            mask = np.zeros(shape, bool)
+            c = self.cell
+            for x1, y1, x2, y2 in rects:
+                # 轉成截圖座標，部分覆蓋的格子也忽略（框住時鐘的邊緣不會漏掉）
+                cx1 = (x1 - frame.left) // c
+                cy1 = (y1 - frame.top) // c
+                cx2 = -(-(x2 - frame.left) // c)
+                cy2 = -(-(y2 - frame.top) // c)
+                mask[max(0, cy1):max(0, cy2), max(0, cx1):max(0, cx2)] = True
+            self._ignore_mask = mask
+            self._ignore_key = key
+        return self._ignore_mask
+
+    def update(self, frame):
+        """比對新畫面，回傳變動 tile 的 bool 陣列（None = 沒有基準，視為全部變動）
+
+        每格和「上次匹配時」的畫面比（不是和上一張比），緩慢累積的變化超過容許值一樣會被偵測到
+        """
+        gray = frame.gray
+        if self._ref is None or self._ref.shape != gray.shape:
+            self._ref = gray.copy()
+            return None
+
+        diff = cell_means(cv2.absdiff(gray, self._ref), self.cell)
+        changed = diff > self.tolerance
+        ignore = self._get_ignore_mask(frame, diff.shape)
+        if ignore is not None:
+            changed &= ~ignore
+        dirty = self._tile_any(changed)
+        self._accept(gray, dirty)
+        return dirty
+
+    def _tile_any(self, changed):
+        """格子層級的變動 → tile 層級（任一格變動即整個 tile 變動）"""
+        n = self.tile_size // self.cell
+        h, w = changed.shape
+        rows, cols = -(-h // n), -(-w // n)
+        padded = np.zeros((rows * n, cols * n), bool)
+        padded[:h, :w] = changed
+        return padded.reshape(rows, n, cols, n).any(axis=(1, 3))
+
+    def _accept(self, gray, dirty):
+        """變動區域會重新匹配（與 dirty_rects 相同的矩形），更新基準畫面"""
+        h, w = gray.shape
+        for x1, y1, x2, y2 in self.dirty_rects(dirty, w, h):
+            self._ref[y1:y2, x1:x2] = gray[y1:y2, x1:x2]
+
+    def dirty_rects(self, dirty, width, height):
+        """變動 tile 合併成矩形 [(x1, y1, x2, y2), ...]（像素座標）"""
+        count, _, stats, _ = cv2.connectedComponentsWithStats(dirty.astype(np.uint8), connectivity=8)
+        t = self.tile_size
+        rects = []
+        for x, y, w, h, _ in stats[1:count]:
+            rects.append((x * t, y * t, min((x + w) * t, width), min((y + h) * t, height)))
+        return rects
+
+
+class FullScreenScanner:
+    """全螢幕增量掃描
+
+    每個模板保留上次的候選 (xs, ys, scores)；畫面部分變動時，
+    只在變動區域（外擴模板大小）重新匹配，未變動區域的結果（含「沒找到」）繼續沿用。
+    忽略區域內的變動不會觸發重新匹配，所以沿用的候選若碰到忽略區域，每輪在原位置重新確認
+    """
+
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tracker = TileTracker(tile_size)
+        self._dirty = None
+        self._origin = (0, 0)       # 最近一次變動偵測的截圖左上角（螢幕座標）
+        self._candidates = None     # 每個模板的候選（左上角，截圖座標）
+        self._cache_key = None
+        self._reset_pending = False
+        self.best_score = None      # 最近一次匹配的最高相似度（沒找到為 None）
+        self._batch = None
+        self._batch_key = None
+        self._batch_lock = threading.Lock()
+
+    def reset(self):
+        """要求下次掃描整張重新匹配（點擊後、模板變更時呼叫，可跨執行緒）"""
+        self._reset_pending = True
+
+    def set_ignore_rects(self, rects):
+        """設定變動偵測的忽略區域（螢幕座標）"""
+        self.tracker.set_ignore_rects(rects)
+
+    def changed(self, frame):
+        """更新變動偵測，回傳畫面是否有任何變動"""
+        if self._reset_pending:
+            self._reset_pending = False
+            self.tracker.reset()
+            self._candidates = None
+        self._dirty = self.tracker.update(frame)
+        self._origin = (frame.left, frame.top)
+        return self._dirty is None or bool(self._dirty.any())
+
+    def changed_near(self, points, margin):
+        """最近一次變動偵測中，points（螢幕座標）周圍 margin 像素內是否有變動"""
+        dirty = self._dirty
+        if dirty is None:
+            return bool(points)     # 沒有基準 = 整張都算變動
+        t = self.tracker.tile_size
+        rows, cols = dirty.shape
+        ox, oy = self._origin
+        for x, y in points:
+            tx1, ty1 = max(0, (x - margin - ox) // t), max(0, (y - margin - oy) // t)
+            tx2, ty2 = min(cols, (x + margin - ox) // t + 1), min(rows, (y + margin - oy) // t + 1)
+            if tx2 > tx1 and ty2 > ty1 and dirty[ty1:ty2, tx1:tx2].any():
+                return True
+        return False
+
+    def scan(self, frame, templates, use_color, threshold, max_level, top_k=None):
+        """增量匹配所有模板，回傳中心點（螢幕座標，依模板順序串接）"""
+        key = (tuple(id(t) for t in templates), use_color, threshold, max_level, frame.bgra.shape)
+        dirty = self._dirty
+        if (self._candidates is None or key != self._cache_key or dirty is None
+                or dirty.mean() > FULL_RESCAN_RATIO):
+            self._candidates = self._match_candidates(frame, templates, use_color, threshold, max_level)
+            self._cache_key = key
+        else:
+            if dirty.any():
+                self._rematch_dirty(frame, templates, use_color, threshold, max_level, dirty)
+            self._verify_ignored(frame, templates, use_color, threshold)
+        return self._centers(frame, templates, self._candidates, top_k)
+
+    def match_full(self, frame, templates, use_color, threshold, max_level, top_k=None):
+        """整張匹配（不使用也不更新增量快取），回傳中心點"""
+        candidates = self._match_candidates(frame, templates, use_color, threshold, max_level)
+        return self._centers(frame, templates, candidates, top_k)
+
+    def _centers(self, frame, templates, candidates, top_k):
+        all_matches = []
+        best_score = None
+        for template, (xs, ys, scores) in zip(templates, candidates):
+            if len(scores):
+                best_score = max(best_score or 0.0, float(scores.max()))
+            all_matches.extend(to_centers(xs, ys, scores, template, frame.left, frame.top, top_k))
+        self.best_score = best_score
+        return all_matches
+
+    def _get_batch(self, templates, max_level):
+        """批次匹配器：模板清單或金字塔層級改變才重建（頻譜只算一次）"""
+        key = (tuple(id(t) for t in templates), max_level)
+        with self._batch_lock:
+            if self._batch_key != key:
+                self._batch = BatchMatcher(templates, max_level)
+                self._batch_key = key
+            return self._batch
+
+    def _match_candidates(self, frame, templates, use_color, threshold, max_level):
+        """整張畫面所有模板的候選：彩色多模板走批次 FFT，其餘逐一匹配（共用金字塔）"""
+        screen_levels = frame.pyramid(use_color, max_level)
+        if should_batch(templates):
+            return self._get_batch(templates, max_level).match(screen_levels, threshold)
+        return [match_candidates(screen_levels, t, threshold, max_level) for t in templates]
+
+    def _verify_ignored(self, frame, templates, use_color, threshold):
+        """與忽略區域重疊的候選：在原位置重新計算相似度，低於門檻（目標已消失）就移除"""
+        rects = self.tracker.ignore_rects
+        if not rects:
+            return
+        image = None
+        for i, template in enumerate(templates):
+            xs, ys, scores = self._candidates[i]
+            if not len(xs):
+                continue
+            th, tw = template.shape[:2]
+            hit = np.zeros(len(xs), bool)
+            for x1, y1, x2, y2 in rects:
+                # 忽略區域轉成截圖座標，模板視窗有任何重疊就要確認
+                x1, x2 = x1 - frame.left, x2 - frame.left
+                y1, y2 = y1 - frame.top, y2 - frame.top
+                hit |= (xs < x2) & (xs + tw > x1) & (ys < y2) & (ys + th > y1)
+            if not hit.any():
+                continue
+            if image is None:
+                image = frame.match_image(use_color)
+            keep = np.ones(len(xs), bool)
+            scores = scores.copy()
+            for j in np.flatnonzero(hit):
+                x, y = int(xs[j]), int(ys[j])
+                score, _ = best_match(image[y:y + th, x:x + tw], template)
+                if score >= threshold:
+                    scores[j] = score
+                else:
+                    keep[j] = False
+            self._candidates[i] = (xs[keep], ys[keep], scores[keep])
+
+    def _rematch_dirty(self, frame, templates, use_color, threshold, max_level, dirty):
+        """只在變動區域重新匹配，並替換該區域內的舊候選"""
+        image = frame.match_image(use_color)
+        height, width = image.shape[:2]
+        rects = self.tracker.dirty_rects(dirty, width, height)
+
+        for i, template in enumerate(templates):
+            th, tw = template.shape[:2]
+            if height < th or width < tw:
+                continue
+            xs, ys, scores = self._candidates[i]
+            keep = np.ones(len(xs), bool)
+            parts_x, parts_y, parts_s = [], [], []
+            for x1, y1, x2, y2 in rects:
+                # 模板視窗與變動區域有重疊的左上角位置範圍
+                px1, py1 = max(0, x1 - tw + 1), max(0, y1 - th + 1)
+                px2, py2 = min(width - tw + 1, x2), min(height - th + 1, y2)
+                if px2 <= px1 or py2 <= py1:
+                    continue
+                keep &= ~((xs >= px1) & (xs < px2) & (ys >= py1) & (ys < py2))
+                crop = image[py1:py2 + th - 1, px1:px2 + tw - 1]
+                cx, cy, cs = match_candidates(build_pyramid(crop, max_level), template,
+                                              threshold, max_level)
+                parts_x.append(cx + px1)
+                parts_y.append(cy + py1)
+                parts_s.append(cs)
+
+            if not parts_x:
+                continue
+            xs = np.concatenate([xs[keep]] + parts_x)
+            ys = np.concatenate([ys[keep]] + parts_y)
+            scores = np.concatenate([scores[keep]] + parts_s)
+            # 區域可能重疊：去除重複位置，並恢復列優先順序（與整張掃描一致）
+            _, first = np.unique(ys.astype(np.int64) * width + xs, return_index=True)
+            self._candidates[i] = (xs[first], ys[first], scores[first])
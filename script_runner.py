@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+PyClick 積木腳本執行引擎
+不依賴編輯器視窗：截圖來源（backends.py）、輸入來源（inputs.py）、停止條件與目前積木的通知都由呼叫端傳入，
+編輯器與無螢幕命令列（run_script.py）共用同一份執行邏輯。
+
+每個積木自己的執行時間（不含子積木）記在 block_times，可用 timings() 依腳本順序取出
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from blocks import referenced_images, walk_blocks
+from capture import CaptureService
+from inputs import input_from_spec
+from template_cache import TemplateLRU, TEMPLATE_LRU_SIZE
+from tracing import trace_span
+from watcher import ImageWatcher, find_best
+
+logger = logging.getLogger('PyClick')
+
+PRELOAD_WORKERS = 8         # 執行前平行載入模板的執行緒數
+FRAME_MAX_AGE_MS = 30       # 連續的找圖積木可共用多舊的截圖（毫秒）；輸入動作後一律重新截圖
+INPUT_ACTIONS = ("click", "click_xy", "right_click", "double_click", "scroll",
+                 "press_key", "hotkey", "type_text")
+CLICK_PAUSE = 0.05          # 每次點擊後的停頓（秒）
+TYPE_INTERVAL = 0.05        # 輸入文字每個字元的間隔（秒）
+
+
+# 編譯後的步驟種類
+_OP_CALL = 0            # 動作（call）
+_OP_LOOP_INIT = 1       # 重複開始：計數器 = count，count <= 0 直接跳到迴圈後
+_OP_LOOP_NEXT = 2       # 重複結束：計數器 - 1，還有剩就跳回 jump
+_OP_UNTIL = 3           # 重複直到：圖像出現就跳到迴圈後
+_OP_IF = 4              # 如果圖像存在：沒找到就跳過子積木
+
+
+class _Step:
+    """編譯後的一個步驟（show=False 的步驟不更新高亮，例如迴圈結尾）"""
+
+    __slots__ = ("block", "label", "op", "call", "template", "slot", "count", "jump", "show")
+
+    def __init__(self, block, label, op, call=None, template=None, slot=-1, count=0, jump=0, show=True):
+        self.block = block
+        self.label = label
+        self.op = op
+        self.call = call
+        self.template = template
+        self.slot = slot
+        self.count = count
+        self.jump = jump
+        self.show = show
+
+
+class BlockTiming:
+    """一個積木的執行統計（秒），不含子積木
+
+    count = 執行次數（「重複直到」每次檢查圖片各算一次），max = 單次最長
+    """
+
+    __slots__ = ("block", "label", "count", "total", "max")
+
+    def __init__(self, block, label):
+        self.block = block
+        self.label = label
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        return {"id": self.block.id, "type": self.block.type, "label": self.label,
+                "count": self.count, "total": self.total, "mean": self.mean, "max": self.max}
+
+
+class ScriptRunner:
+    """腳本執行引擎：先把積木編譯成扁平的步驟列表，再依序執行
+
+    should_stop: 回傳 True 時停止的函式（另外也可以呼叫 stop()）
+    on_step: 每執行一個積木前呼叫 on_step(block, label)，例如編輯器的高亮
+    """
+
+    def __init__(self, capture=None, inputs=None, tracer=None, should_stop=None, on_step=None,
+                 threshold=0.7):
+        self.threshold = threshold
+        # 截圖來源（None = 預設即時螢幕，或依 PYCLICK_CAPTURE 環境變數）
+        self.capture = capture or CaptureService()
+        # 輸入來源（None = 依 PYCLICK_INPUT 環境變數，預設實際送出滑鼠鍵盤事件）
+        self.inputs = inputs or input_from_spec()
+        self.tracer = tracer        # 效能追蹤（tracing.Tracer，None = 不追蹤）
+        self.should_stop = should_stop
+        self.on_step = on_step
+        self.stop_flag = False
+        self.block_times = {}       # 積木 id -> BlockTiming
+        # 模板快取（路徑 + 修改時間），整個腳本執行期間共用，不用每次查找都重新讀檔解碼
+        self.templates = TemplateLRU()
+        # 等待圖片出現 / 消失共用同一個截圖迴圈（條件一成立就返回）
+        self.watcher = ImageWatcher(self.capture)
+        self.frame_max_age_ms = FRAME_MAX_AGE_MS
+        self._input_at = 0.0        # 最近一次輸入動作結束的時間（之前的截圖不能再用）
+
+    def preload(self, blocks):
+        """執行前平行載入腳本用到的所有圖片，並先截一張畫面（第一個積木不用等冷啟動）
+
+        回傳無法載入的圖片 {路徑: [積木標籤, ...]}，全部成功回傳空 dict
+        """
+        images = referenced_images(blocks)
+        paths = [path for path in images if path]
+        # 快取要放得下整份腳本，否則預先載入的會被後面的擠掉
+        self.templates.max_entries = max(self.templates.max_entries, len(paths), TEMPLATE_LRU_SIZE)
+        with trace_span(self.tracer, "preload", "block", images=len(paths)):
+            if paths:
+                # 解碼、縮圖都在 OpenCV 內進行（不佔 GIL），多執行緒可以平行
+                with ThreadPoolExecutor(min(PRELOAD_WORKERS, len(paths)), thread_name_prefix="Preload") as pool:
+                    loaded = dict(zip(paths, pool.map(self.templates.get, paths)))
+            else:
+                loaded = {}
+            missing = {path: labels for path, labels in images.items() if loaded.get(path) is None}
+            if paths and not missing:
+                self._warm_capture()
+        if paths:
+            logger.info(f"預先載入 {len(paths)} 張圖片，{len(missing)} 張無法載入")
+        return missing
+
+    def _warm_capture(self):
+        """圖片積木都是整個螢幕找圖（見 _find_image），先截一張並轉好 BGR"""
+        self.capture.get_frame().bgr
+
+    def run(self, blocks):
+        """編譯並執行積木列表"""
+        self.execute(self.compile(blocks))
+
+    def stop(self):
+        """要求停止（目前的積木結束後生效，等待圖片中會提早返回）"""
+        self.stop_flag = True
+
+    def stopped(self):
+        return self.stop_flag or (self.should_stop is not None and bool(self.should_stop()))
+
+    def close(self):
+        """執行結束後呼叫：停止圖片等待與截圖的背景執行緒（統計數字仍可讀取）"""
+        self.watcher.stop()
+        self.capture.stop()
+
+    def timings(self, blocks):
+        """依腳本順序回傳有執行過的積木的 BlockTiming"""
+        return [self.block_times[block.id] for block in walk_blocks(blocks)
+                if block.id in self.block_times]
+
+    # ------------------------------------------------------------
+    # 編譯：積木樹 → 扁平的步驟列表（處理函式、模板、標籤都先準備好）
+    # ------------------------------------------------------------
+
+    def compile(self, blocks):
+        """積木樹 → [_Step, ...]，控制積木變成跳躍（重複 / 條件不需要遞迴）"""
+        plan = []
+        self._compile_into(blocks, plan, [0])
+        return plan
+
+    def _compile_into(self, blocks, plan, slots):
+        for block in blocks:
+            action = block.type
+            params = block.params
+            label = block.get_label()
+
+            if action in ("repeat", "repeat_until"):
+                slot = slots[0]
+                slots[0] += 1
+                count = params["count"] if action == "repeat" else params.get("max_iterations", 100)
+                init = _Step(block, label, _OP_LOOP_INIT, slot=slot, count=count)
+                plan.append(init)
+                check = len(plan)
+                if action == "repeat_until":
+                    plan.append(_Step(block, label, _OP_UNTIL, template=self._resolve(params["image"]),
+                                      show=False))
+                self._compile_into(block.children, plan, slots)
+                plan.append(_Step(block, label, _OP_LOOP_NEXT, slot=slot, jump=check, show=False))
+                init.jump = len(plan)
+                if action == "repeat_until":
+                    plan[check].jump = len(plan)
+
+            elif action == "if_image":
+                step = _Step(block, label, _OP_IF, template=self._resolve(params["image"]))
+                plan.append(step)
+                self._compile_into(block.children, plan, slots)
+                step.jump = len(plan)
+
+            else:
+                call = self._bind(action, params)
+                if call is not None and action in INPUT_ACTIONS:
+                    call = self._input_step(call)
+                plan.append(_Step(block, label, _OP_CALL, call=call))
+
+    def _input_step(self, call):
+        """輸入動作執行完就讓共用截圖失效（畫面可能因此改變）"""
+        def run():
+            try:
+                call()
+            finally:
+                self._input_at = time.time()
+        return run
+
+    def _frame(self):
+        """找圖用的截圖：共用不超過 frame_max_age_ms 的畫面，但一定是最近一次輸入動作之後截的
+
+        轉換結果（BGR / 灰階 / 金字塔）存在 Frame 內，同一張畫面的後續積木直接沿用
+        """
+        since_input = (time.time() - self._input_at) * 1000
+        return self.capture.get_frame(max(0.0, min(self.frame_max_age_ms, since_input)))
+
+    def _resolve(self, template_path):
+        """模板路徑 → 預編譯模板（找不到為 None，執行時當作沒找到）"""
+        return self.templates.get(template_path) if template_path else None
+
+    def _bind(self, action, params):
+        """動作積木 → 不需參數的函式（參數在編譯時解析）"""
+        if action in ("trigger_hotkey", "trigger_image"):
+            # 觸發積木只是標記，實際觸發邏輯在外部
+            return None
+        if action == "click_xy":
+            x, y = int(params["x"]), int(params["y"])
+            return lambda: self._click_xy(x, y)
+        if action in ("click", "right_click", "double_click"):
+            template = self._resolve(params["image"])
+            handler = {"click": self._click_at, "right_click": self._right_click_at,
+                       "double_click": self._double_click_at}[action]
+            return lambda: self._act_on(template, handler)
+        if action == "scroll":
+            amount = params["amount"] if params["direction"] == "上" else -params["amount"]
+            return lambda: self.inputs.scroll(amount)
+        if action == "press_key":
+            key = params["key"].lower()
+            return lambda: self.inputs.press(key)
+        if action == "hotkey":
+            keys = params["modifier"].lower().split("+") + [params["key"].lower()]
+            return lambda: self.inputs.hotkey(*keys)
+        if action == "type_text":
+            text = params["text"]
+            return lambda: self._type_text(text)
+        if action == "wait":
+            seconds = params["seconds"]
+            return lambda: time.sleep(seconds)
+        if action in ("wait_image", "wait_image_gone"):
+            template = self._resolve(params["image"])
+            present = action == "wait_image"
+            timeout = params.get("timeout", 30)
+            return lambda: self._wait_for(template, present, timeout)
+        return None
+
+    # ------------------------------------------------------------
+    # 執行
+    # ------------------------------------------------------------
+
+    def execute(self, plan):
+        """依序執行步驟（on_step 應該很快，例如編輯器經由 UI 匯流排合併更新）"""
+        tracer = self.tracer
+        on_step = self.on_step
+        times = self.block_times
+        counters = [0] * (max((step.slot for step in plan), default=-1) + 1)
+        pc = 0
+        while pc < len(plan) and not self.stopped():
+            step = plan[pc]
+            if step.show and on_step is not None:
+                on_step(step.block, step.label)
+            if step.op == _OP_LOOP_NEXT:
+                # 迴圈結尾只是計數，不算積木的執行時間
+                pc = self._step(step, counters, pc)
+                continue
+            timing = times.get(step.block.id)
+            if timing is None:
+                timing = times[step.block.id] = BlockTiming(step.block, step.label)
+            start = time.perf_counter()
+            if tracer is None:
+                next_pc = self._step(step, counters, pc)
+            else:
+                with tracer.span(step.block.type, "block", label=step.label):
+                    next_pc = self._step(step, counters, pc)
+            elapsed = time.perf_counter() - start
+            timing.count += 1
+            timing.total += elapsed
+            if elapsed > timing.max:
+                timing.max = elapsed
+            pc = next_pc
+
+    def _step(self, step, counters, pc):
+        """執行一個步驟，回傳下一步的位置"""
+        op = step.op
+        if op == _OP_CALL:
+            if step.call is not None:
+                step.call()
+        elif op == _OP_LOOP_INIT:
+            counters[step.slot] = step.count
+            if step.count <= 0:
+                return step.jump
+        elif op == _OP_LOOP_NEXT:
+            counters[step.slot] -= 1
+            if counters[step.slot] > 0:
+                return step.jump
+        elif op == _OP_UNTIL:
+            if self._present(step.template):
+                return step.jump
+        elif op == _OP_IF:
+            if self._locate(step.template) is None:
+                return step.jump
+        return pc + 1
+
+    def _find_image(self, template_path):
+        """尋找圖像，回傳位置或 None"""
+        return self._locate(self._resolve(template_path))
+
+    def _locate(self, compiled):
+        """在目前畫面找預編譯模板，回傳中心點（螢幕座標）或 None
+
+        與「如果 / 等待圖片」相同的金字塔匹配（find_best），門檻附近不會一邊找到、一邊找不到
+        """
+        if compiled is None:
+            return None
+        with trace_span(self.tracer, "find_image", "match", image=os.path.basename(compiled.path)):
+            return find_best(self._frame(), compiled.color, self.threshold)
+
+    def _act_on(self, compiled, handler):
+        """找到圖像就對該位置執行 handler(x, y)"""
+        pos = self._locate(compiled)
+        if pos:
+            handler(pos[0], pos[1])
+
+    def _click_at(self, x, y):
+        self._click_xy(x, y)
+
+    def _click_xy(self, x, y):
+        """點擊座標"""
+        self.inputs.click(x, y)
+        time.sleep(CLICK_PAUSE)
+
+    def _right_click_at(self, x, y):
+        """右鍵點擊"""
+        self.inputs.right_click(x, y)
+        time.sleep(CLICK_PAUSE)
+
+    def _double_click_at(self, x, y):
+        """雙擊"""
+        self._click_xy(x, y)
+        time.sleep(CLICK_PAUSE)
+        self._click_xy(x, y)
+
+    def _type_text(self, text):
+        """輸入文字"""
+        self.inputs.type_text(text, interval=TYPE_INTERVAL)
+
+    def _present(self, compiled):
+        """圖像是否在畫面上（共用等待服務最近的畫面，不另外截圖）"""
+        if compiled is None:
+            return False
+        with trace_span(self.tracer, "check_image", "match", image=os.path.basename(compiled.path)):
+            return self.watcher.check(compiled.color, self.threshold, self._frame()) is not None
+
+    def _wait_for(self, compiled, present, timeout):
+        """等待圖像出現（present=True）或消失；模板無法載入時：等出現 = 失敗，等消失 = 立即成立"""
+        if compiled is None:
+            return not present
+        return self.watcher.wait(compiled.color, self.threshold, present, timeout,
+                                 self.stopped)
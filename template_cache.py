@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+PyClick 預編譯模板
+模板載入時一次算好彩色 / 灰階兩種版本、各層金字塔與零均值範數（批次 FFT 匹配用），
+存成可 memory-map 的快取檔（以檔案內容雜湊為鍵，改過的圖自然對不上舊快取）：
+
+    template_cache/<sha1>-v1.npy    所有影像平面串接成一維 uint8
+    template_cache/<sha1>-v1.json   各平面的形狀、位移與統計值（最後寫入，存在即代表快取完整）
+
+再次載入時只讀 PNG 原始位元組算雜湊，影像直接從 mmap 取得，不再解碼、縮圖。
+頻譜（DFT）依畫面分塊大小而定，單一平面 1024x1024 就要 8 MB，不存檔，由 BatchMatcher 在記憶體中保留
+
+積木腳本執行時用 TemplateLRU：同一個圖檔（路徑 + 修改時間相同）只載入一次
+"""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger('PyClick')
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template_cache")
+CACHE_PYRAMID_LEVELS = 4    # 預先建立幾層金字塔（與設定視窗的金字塔層級上限相同）
+TEMPLATE_LRU_SIZE = 64      # 記憶體中最多保留幾個模板（TemplateLRU）
+
+
+class TemplatePlane(np.ndarray):
+    """帶有預先計算資料的模板影像（一般 ndarray 可用的地方都能用）
+
+    pyramid: [原圖, 1/2, 1/4, ...]；norms: 各層零均值範數
+    由它衍生的陣列（切片、運算結果）不帶這些資料
+    """
+
+    def __array_finalize__(self, obj):
+        self.pyramid = None
+        self.norms = None
+
+
+def zero_mean_norm(image):
+    """零均值後的範數（多通道合計），算法與 matcher.BatchMatcher 相同"""
+    planes = cv2.split(image.astype(np.float32))
+    return float(np.sqrt(sum(float(((p - float(p.mean())).astype(np.float64) ** 2).sum())
+                             for p in planes)))
+
+
+def _build_pyramid(image, levels):
+    pyramid = [image]
+    for _ in range(levels):
+        h, w = pyramid[-1].shape[:2]
+        if h < 2 or w < 2:
+            break
+        pyramid.append(cv2.resize(pyramid[-1], (w // 2, h // 2), interpolation=cv2.INTER_AREA))
+    return pyramid
+
+
+def _plane(pyramid, norms):
+    """金字塔第 0 層包成 TemplatePlane（其餘層維持一般陣列）"""
+    plane = pyramid[0].view(TemplatePlane)
+    plane.pyramid = [plane] + list(pyramid[1:])
+    plane.norms = list(norms)
+    return plane
+
+
+class CompiledTemplate:
+    """預編譯模板：color / gray 為 TemplatePlane，可直接放進 templates / templates_gray"""
+
+    def __init__(self, path, digest, color_pyramid, gray_pyramid, color_norms, gray_norms):
+        self.path = path
+        self.digest = digest
+        self.color = _plane(color_pyramid, color_norms)
+        self.gray = _plane(gray_pyramid, gray_norms)
+
+    @property
+    def shape(self):
+        return self.color.shape
+
+    def image(self, use_color):
+        return self.color if use_color else self.gray
+
+    @classmethod
+    def from_image(cls, image, path=None, digest=None, levels=CACHE_PYRAMID_LEVELS):
+        """由已解碼的 BGR 影像建立（不寫快取）"""
+        color = _build_pyramid(np.ascontiguousarray(image), levels)
+        gray = _build_pyramid(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), levels)
+        return cls(path, digest, color, gray,
+                   [zero_mean_norm(p) for p in color], [zero_mean_norm(p) for p in gray])
+
+
+def _cache_paths(digest, cache_dir):
+    base = os.path.join(cache_dir, f"{digest}-v{CACHE_VERSION}")
+    return base + ".npy", base + ".json"
+
+
+def _read_cache(path, digest, cache_dir):
+    data_path, meta_path = _cache_paths(digest, cache_dir)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    data = np.load(data_path, mmap_mode="r")
+    pyramids = {}
+    for mode in ("color", "gray"):
+        pyramids[mode] = [data[offset:offset + int(np.prod(shape))].reshape(shape)
+                          for offset, shape in meta[mode]]
+    return CompiledTemplate(path, digest, pyramids["color"], pyramids["gray"],
+                            meta["color_norms"], meta["gray_norms"])
+
+
+def _write_cache(compiled, cache_dir):
+    data_path, meta_path = _cache_paths(compiled.digest, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = {"source": os.path.basename(compiled.path or ""),
+            "color_norms": compiled.color.norms, "gray_norms": compiled.gray.norms}
+    chunks, offset = [], 0
+    for mode, plane in (("color", compiled.color), ("gray", compiled.gray)):
+        layout = []
+        for level in plane.pyramid:
+            layout.append((offset, list(level.shape)))
+            chunks.append(np.asarray(level).ravel())
+            offset += level.size
+        meta[mode] = layout
+    # 先寫資料再寫說明檔（說明檔存在 = 快取完整）；寫到暫存檔再改名，不會留下寫一半的檔案
+    tmp = data_path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, np.concatenate(chunks))
+    os.replace(tmp, data_path)
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def compile_template(path, cache_dir=CACHE_DIR):
+    """載入模板（有快取直接 mmap，沒有就解碼、建立後寫入快取），讀不到回傳 None"""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return None
+    digest = hashlib.sha1(raw).hexdigest()
+    if cache_dir:
+        try:
+            compiled = _read_cache(path, digest, cache_dir)
+            if compiled is not None:
+                return compiled
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"模板快取損壞，重新建立: {os.path.basename(path)} ({e})")
+
+    image = cv2.imdecode(np.frombuffer(raw, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    compiled = CompiledTemplate.from_image(image, path, digest)
+    if cache_dir:
+        try:
+            _write_cache(compiled, cache_dir)
+        except OSError as e:
+            logger.warning(f"模板快取寫入失敗: {e}")
+    return compiled
+
+
+def compile_templates(paths, cache_dir=CACHE_DIR):
+    """載入多個模板，略過不存在 / 讀不到的檔案"""
+    compiled = []
+    for path in paths:
+        if path and os.path.exists(path):
+            template = compile_template(path, cache_dir)
+            if template is not None:
+                compiled.append(template)
+    return compiled
+
+
+class TemplateLRU:
+    """有上限的模板快取（最近最少使用的先移除），以 路徑 + 修改時間 為鍵
+
+    檔案被覆寫（修改時間或大小改變）時自動重新載入；每次查詢只做一次 os.stat
+    """
+
+    def __init__(self, max_entries=TEMPLATE_LRU_SIZE, cache_dir=CACHE_DIR):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = collections.OrderedDict()   # 路徑 -> ((mtime_ns, size), CompiledTemplate)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """取得預編譯模板，檔案不存在或讀不到回傳 None"""
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError, ValueError):
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        compiled = compile_template(path, self.cache_dir)
+        if compiled is None:
+            return None
+        with self._lock:
+            self._entries[path] = (stamp, compiled)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return compiled
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """{"hits", "misses", "evictions", "size"}"""
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self._entries)}
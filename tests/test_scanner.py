@@ -0,0 +1,56 @@
+"""scanner.FullScreenScanner 增量掃描與忽略區域"""
+
+import numpy as np
+
+from capture import Frame
+from matcher import PYRAMID_MAX_LEVEL
+from scanner import FullScreenScanner
+
+WIDTH, HEIGHT = 1920, 1080
+THRESHOLD = 0.8
+
+
+def _template():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 256, (40, 40), dtype=np.uint8)
+
+
+def _frame(template=None, center=None):
+    rng = np.random.default_rng(0)
+    gray = rng.integers(60, 80, (HEIGHT, WIDTH), dtype=np.uint8)
+    if template is not None:
+        th, tw = template.shape
+        x, y = center[0] - tw // 2, center[1] - th // 2
+        gray[y:y + th, x:x + tw] = template
+    bgra = np.dstack([gray, gray, gray, np.full_like(gray, 255)])
+    return Frame(np.ascontiguousarray(bgra))
+
+
+def _scan(scanner, frame, template):
+    scanner.changed(frame)
+    return scanner.scan(frame, [template], False, THRESHOLD, PYRAMID_MAX_LEVEL)
+
+
+def _near(matches, point, tolerance=2):
+    return any(abs(x - point[0]) <= tolerance and abs(y - point[1]) <= tolerance
+               for x, y, *_ in matches)
+
+
+def test_cached_match_inside_ignore_rect_disappears_with_target():
+    template = _template()
+    scanner = FullScreenScanner()
+    assert _near(_scan(scanner, _frame(template, (1500, 900)), template), (1500, 900))
+
+    # 目標所在區域之後才被設成忽略區域，目標消失的變動不會被偵測到
+    scanner.set_ignore_rects([(1400, 800, 1700, 1000)])
+    frame = _frame()
+    assert not scanner.changed(frame)
+    assert scanner.scan(frame, [template], False, THRESHOLD, PYRAMID_MAX_LEVEL) == []
+
+
+def test_cached_match_inside_ignore_rect_kept_while_target_stays():
+    template = _template()
+    scanner = FullScreenScanner()
+    _scan(scanner, _frame(template, (1500, 900)), template)
+    scanner.set_ignore_rects([(1400, 800, 1700, 1000)])
+    assert _near(_scan(scanner, _frame(template, (1500, 900)), template), (1500, 900))
@@ -0,0 +1,75 @@
+"""watcher.ImageWatcher 截圖次數與反應時間"""
+
+import threading
+import time
+
+import numpy as np
+
+from backends import SyntheticBackend
+from capture import CaptureService
+from watcher import ImageWatcher, WATCH_MAX_INTERVAL
+
+THRESHOLD = 0.9
+
+
+def _template():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 256, (24, 24, 3), dtype=np.uint8)
+
+
+def _watch(body):
+    backend = SyntheticBackend(320, 240)
+    capture = CaptureService(backend=lambda: backend)
+    watcher = ImageWatcher(capture)
+    try:
+        return body(backend, watcher)
+    finally:
+        watcher.stop()
+        capture.stop()
+
+
+def _grabs_while(backend, wait):
+    start = backend.grab_count
+    wait()
+    return backend.grab_count - start
+
+
+def test_static_wait_backs_off():
+    def body(backend, watcher):
+        return _grabs_while(backend, lambda: watcher.wait(_template(), THRESHOLD, True, timeout=3))
+
+    # 固定每 50 ms 檢查會截 60 次；靜止畫面退避後約為每 0.5 秒一次
+    assert _watch(body) <= 3 / WATCH_MAX_INTERVAL + 6
+
+
+def test_concurrent_waits_share_grabs():
+    def body(backend, watcher):
+        def wait_all():
+            threads = [threading.Thread(target=watcher.wait, args=(_template(), THRESHOLD, present, 3))
+                       for present in (True, True, False)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        return _grabs_while(backend, wait_all)
+
+    # 等消失的條件第一輪就成立，另外兩個共用同一組截圖
+    assert _watch(body) <= 3 / WATCH_MAX_INTERVAL + 8
+
+
+def test_wait_wakes_within_poll_interval():
+    template = _template()
+
+    def body(backend, watcher):
+        placed = []
+
+        def place():
+            time.sleep(1.0)
+            placed.append(time.perf_counter())
+            backend.place(template, 100, 80)
+
+        threading.Thread(target=place).start()
+        assert watcher.wait(template, THRESHOLD, True, timeout=5)
+        return time.perf_counter() - placed[0]
+
+    assert _watch(body) < WATCH_MAX_INTERVAL + 0.3
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+PyClick 各階段耗時統計
+掃描流程每個階段（截圖、轉換、變動偵測、匹配、去重、動作）記錄耗時，
+保留最近 STATS_WINDOW 筆，顯示時才計算 p50 / p95（記錄本身只是寫入環形陣列）。
+設定 tracer（見 tracing.py）時，各階段也同時記錄到追蹤時間軸
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+import numpy as np
+
+STATS_WINDOW = 512          # 每個階段保留最近幾筆
+RATE_WINDOW = 5.0           # 掃描速率以最近幾秒計算
+STAGES = ("capture", "convert", "detect", "match", "dedup", "action")
+STAGE_LABELS = {
+    "capture": "截圖", "convert": "轉換", "detect": "偵測",
+    "match": "匹配", "dedup": "去重", "action": "動作",
+}
+# 累計分桶上限（秒），供 metrics.py 輸出 Prometheus histogram
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RollingHistogram:
+    """最近 size 筆數值的環形陣列
+
+    寫入不加鎖（多執行緒同時寫入最多蓋掉一筆，統計用途可接受），讀取時複製一份再計算
+    """
+
+    def __init__(self, size=STATS_WINDOW):
+        self._values = np.zeros(size, dtype=np.float64)
+        self._count = 0
+
+    def add(self, value):
+        self._values[self._count % len(self._values)] = value
+        self._count += 1
+
+    @property
+    def count(self):
+        return self._count
+
+    def values(self):
+        return self._values[:min(self._count, len(self._values))].copy()
+
+    def percentiles(self, qs):
+        """百分位數（沒有資料回傳 None）"""
+        values = self.values()
+        if not len(values):
+            return None
+        return np.percentile(values, qs)
+
+    def reset(self):
+        self._count = 0
+
+
+class CumulativeHistogram:
+    """從啟動至今的累計分桶（每個值只做一次二分搜尋 + 加一，不加鎖）"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)    # 最後一格 = 超過最大上限
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self._counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """(每個上限的累計筆數 [(上限, 筆數), ..., (inf, 總筆數)], 總和, 總筆數)"""
+        counts = list(self._counts)
+        total, cumulative = 0, []
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            total += n
+            cumulative.append((bound, total))
+        return cumulative, self.sum, total
+
+
+class _Span:
+    """with timer.stage(name): 的計時區塊（每個階段一個，重複使用）"""
+
+    __slots__ = ("_timer", "_name", "_hist", "_cumulative", "_start")
+
+    def __init__(self, timer, name):
+        self._timer = timer
+        self._name = name
+        self._hist = timer._hists[name]
+        self._cumulative = timer.cumulative[name]
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self._hist.add(end - self._start)
+        self._cumulative.add(end - self._start)
+        tracer = self._timer.tracer
+        if tracer is not None:
+            tracer.complete(self._name, "stage", self._start, end)
+
+
+class StageTimer:
+    """掃描流程的各階段耗時、掃描速率、計數器與最近一次的最高相似度"""
+
+    def __init__(self, stages=STAGES, window=STATS_WINDOW):
+        self.stages = tuple(stages)
+        self._hists = {name: RollingHistogram(window) for name in self.stages}
+        self.cumulative = {name: CumulativeHistogram() for name in self.stages}
+        self.counters = collections.Counter()       # 掃描次數、ROI 命中、點擊數等（累計，讀取用 snapshot_counters()）
+        self._counters_lock = threading.Lock()      # 掃描執行緒新增計數器時，HTTP 執行緒可能正在複製
+        self._scans = RollingHistogram(window)      # 每輪掃描完成的時間
+        self.best_score = None                      # 最近一輪匹配的最高相似度（沒找到為 None）
+        self.tracer = None                          # 追蹤（tracing.Tracer，None = 不追蹤）
+        self._local = threading.local()
+
+    def stage(self, name):
+        """計時區塊：with timer.stage("match"): ...
+
+        同一執行緒重複使用同一個物件（不同執行緒各自一份，避免開始時間互相覆蓋）
+        """
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            spans = self._local.spans = {}
+        span = spans.get(name)
+        if span is None:
+            span = spans[name] = _Span(self, name)
+        return span
+
+    def add(self, name, seconds):
+        self._hists[name].add(seconds)
+        self.cumulative[name].add(seconds)
+
+    def count(self, name, n=1):
+        """計數器加 n"""
+        with self._counters_lock:
+            self.counters[name] += n
+
+    def snapshot_counters(self):
+        """計數器的複本 {名稱: 次數}（其他執行緒讀取用）"""
+        with self._counters_lock:
+            return dict(self.counters)
+
+    def tick(self, best_score=None, matched=True):
+        """一輪掃描完成（best_score：這輪的最高相似度，沒找到為 None）
+
+        matched=False 表示畫面沒變、這輪沒有匹配，保留上一輪的相似度（畫面還是同一張）；
+        有匹配的輪次一律更新，沒找到就清成 None，不會顯示過時的相似度
+        """
+        self._scans.add(time.perf_counter())
+        if matched:
+            self.best_score = best_score
+
+    def scans_per_second(self):
+        times = self._scans.values()
+        if len(times) < 2:
+            return 0.0
+        recent = times[times >= time.perf_counter() - RATE_WINDOW]
+        if len(recent) < 2:
+            return 0.0
+        return float((len(recent) - 1) / (recent.max() - recent.min()))
+
+    def reset(self):
+        """清除近期統計（累計分桶與計數器不清除，對外輸出的累計值必須遞增）"""
+        for hist in self._hists.values():
+            hist.reset()
+        self._scans.reset()
+        self.best_score = None
+
+    def snapshot(self):
+        """目前統計 {"scans_per_sec", "best_score", "stages": {階段: {"count", "p50_ms", "p95_ms"}}}"""
+        stages = {}
+        for name in self.stages:
+            hist = self._hists[name]
+            p = hist.percentiles([50, 95])
+            if p is None:
+                continue
+            stages[name] = {"count": hist.count, "p50_ms": float(p[0]) * 1000, "p95_ms": float(p[1]) * 1000}
+        return {
+            "scans_per_sec": self.scans_per_second(),
+            "best_score": self.best_score,
+            "stages": stages,
+        }
+
+    def summary(self):
+        """一行文字摘要（狀態列顯示用）"""
+        snap = self.snapshot()
+        if not snap["stages"]:
+            return ""
+        parts = [f"{snap['scans_per_sec']:.1f} 次/秒"]
+        for name, s in snap["stages"].items():
+            parts.append(f"{STAGE_LABELS.get(name, name)} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}")
+        if snap["best_score"] is not None:
+            parts.append(f"相似度 {snap['best_score']:.2f}")
+        return " | ".join(parts) + "  (ms p50/p95)"
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+PyClick 執行追蹤（Chrome trace event 格式）
+記錄每輪掃描、各階段、匹配與動作的起訖時間，停止時寫成 JSON，
+可用 chrome://tracing 或 https://ui.perfetto.dev 開啟，在時間軸上看時間花在哪裡。
+
+事件存在固定上限的記憶體佇列，超過上限丟棄最舊的（長時間執行不會無限成長）
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+TRACE_ENV = "PYCLICK_TRACE"         # 環境變數：設為 1 即開啟追蹤（積木編輯器 / 執行器）
+TRACE_MAX_EVENTS = 200000           # 記憶體中最多保留幾筆事件
+
+
+def tracing_enabled():
+    """環境變數 PYCLICK_TRACE 是否開啟追蹤"""
+    return os.environ.get(TRACE_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def trace_path(directory, prefix="trace"):
+    """追蹤檔路徑（檔名含時間）"""
+    return os.path.join(directory, f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+
+class _NullSpan:
+    """沒有開啟追蹤時的空區塊"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _TraceSpan:
+    __slots__ = ("_tracer", "_name", "_cat", "_args", "_start")
+
+    def __init__(self, tracer, name, cat, args):
+        self._tracer = tracer
+        self._name = name
+        self._cat = cat
+        self._args = args
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        args = self._args
+        if exc_type is not None:
+            args = dict(args or {}, error=repr(exc))
+        self._tracer.complete(self._name, self._cat, self._start, time.perf_counter(), args)
+
+
+class Tracer:
+    """收集追蹤事件（可跨執行緒，寫入不加鎖：deque.append 本身是原子操作）"""
+
+    def __init__(self, max_events=TRACE_MAX_EVENTS):
+        self._events = collections.deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+        self._threads = {}          # tid -> 執行緒名稱
+        self.total = 0              # 總事件數（含已丟棄的）
+
+    def _tid(self):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        return tid
+
+    def _us(self, t):
+        return (t - self._origin) * 1e6
+
+    def span(self, name, cat="scan", **args):
+        """計時區塊：with tracer.span("verify", "retry"): ..."""
+        return _TraceSpan(self, name, cat, args or None)
+
+    def complete(self, name, cat, start, end, args=None):
+        """加入一段已完成的區間（start / end 為 time.perf_counter()）"""
+        event = {"name": name, "cat": cat, "ph": "X", "ts": self._us(start),
+                 "dur": (end - start) * 1e6, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self._events.append(event)
+        self.total += 1
+
+    def to_dict(self):
+        pid = os.getpid()
+        events = [dict(e, pid=pid) for e in list(self._events)]
+        meta = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "PyClick"}}]
+        for tid, name in list(self._threads.items()):
+            meta.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return {
+            "traceEvents": meta + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped": self.total - len(events)},
+        }
+
+    def write(self, path):
+        """寫出追蹤檔"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        return path
+
+
+def trace_span(tracer, name, cat="scan", **args):
+    """tracer 為 None 時回傳空區塊，呼叫端不用判斷是否開啟追蹤"""
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, cat, **args)
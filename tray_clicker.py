@@ -10,7 +10,6 @@ from tkinter import ttk
 from PIL import Image, ImageTk, ImageDraw
 import cv2
 import numpy as np
-import mss
 import pyautogui
 import pystray
 from pystray import MenuItem as Item
@@ -32,10 +31,25 @@ from datetime import datetime
 __version__ = "1.2.0"
 GITHUB_REPO = "Jeffrey0117/PyClick"
 
+# 模板數超過此值時提示可能影響效能（彩色多模板已用批次匹配）
+TEMPLATE_WARN_COUNT = 20
+
 from utils import (
     force_focus, click_no_focus, check_single_instance, get_window_at,
-    user32, kernel32, MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP
+    user32, kernel32
 )
+from matcher import best_match, dedup_points, PYRAMID_MAX_LEVEL
+from capture import CaptureService, roi_region
+from scanner import FullScreenScanner
+from autoscan import AutoScanner, CAPTURE_MAX_AGE_MS, MAX_REACTION_TIME, ROI_MAX_MISS
+from governor import CpuGovernor
+from template_cache import CompiledTemplate, compile_template, compile_templates
+from uibus import UiBus
+from inputs import input_from_spec
+from timing import StageTimer
+from tracing import Tracer, trace_path, trace_span
+from metrics import MetricsServer
+from recorder import SessionRecorder, RECORDING_EXT
 
 # ============================================================
 # 日誌設定
@@ -104,6 +118,8 @@ class SimpleScript:
         self.auto_interval = 0.5     # 掃描間隔（秒）
         self.threshold = 0.7         # 相似度門檻
         self.sound_enabled = True    # 提示音
+        # 變動偵測忽略區域 [(x1, y1, x2, y2), ...]（螢幕座標）
+        self.ignore_rects = []
 
     @property
     def template_path(self):
@@ -139,6 +155,7 @@ class SimpleScript:
             "auto_interval": self.auto_interval,
             "threshold": self.threshold,
             "sound_enabled": self.sound_enabled,
+            "ignore_rects": [list(r) for r in self.ignore_rects],
         }
 
     @classmethod
@@ -165,6 +182,7 @@ class SimpleScript:
         script.auto_interval = data.get("auto_interval", 0.5)
         script.threshold = data.get("threshold", 0.7)
         script.sound_enabled = data.get("sound_enabled", True)
+        script.ignore_rects = [tuple(r) for r in data.get("ignore_rects", [])]
         return script
 
     def save(self, filepath):
@@ -189,7 +207,6 @@ class TrayClicker:
         # 模式
         self.mode = "off"  # off / hotkey / auto
         self.auto_interval = 0.5
-        self.last_screen_hash = None
         self.click_cooldown = 1.0
         self.last_click_time = 0
         self.instant_click = True  # 瞬間點擊模式
@@ -211,6 +228,30 @@ class TrayClicker:
         # 彩色匹配（預設開啟，關閉則用灰階匹配）
         self.use_color_match = True
 
+        # 金字塔搜尋：全螢幕掃描先在縮小畫面找候選（0 = 關閉）
+        self.pyramid_max_level = PYRAMID_MAX_LEVEL
+        # 每個模板最多取幾個匹配（0 = 不限制）
+        self.match_top_k = 0
+
+        # 錄製自動模式看到的畫面與匹配結果（供離線重播分析）
+        self.record_session = False
+        self.recordings_dir = os.path.join(os.path.dirname(__file__), "recordings")
+
+        # 效能追蹤：自動模式停止時寫出 Chrome trace 檔（traces/）
+        self.trace_enabled = False
+        self.traces_dir = os.path.join(os.path.dirname(__file__), "traces")
+
+        # 最差反應時間上限（秒，0 = 不限制）：自動模式的退避不會讓目標等超過這個時間
+        self.max_reaction_time = MAX_REACTION_TIME
+
+        # CPU 預算（整台電腦的百分比，0 = 不限制）：超過時自動降載
+        self.cpu_budget = 0
+        self._governor = CpuGovernor()
+
+        # 本機指標端點（Prometheus 格式，0 = 關閉）
+        self.metrics_port = 0
+        self._metrics = None
+
         # 設定檔路徑
         self.config_path = os.path.join(os.path.dirname(__file__), "config.json")
 
@@ -219,18 +260,27 @@ class TrayClicker:
         self.scripts_dir = os.path.join(os.path.dirname(__file__), "simple_scripts")
         os.makedirs(self.scripts_dir, exist_ok=True)
 
-        # 執行緒鎖
-        self._lock = threading.Lock()
+        # 執行緒鎖（可重入：持有時也能呼叫 AutoScanner 的 ROI 方法，它們共用這個鎖）
+        self._lock = threading.RLock()
 
-        # ROI 優化：記錄上次匹配位置
-        self._last_match_pos = None  # (x, y) 上次找到的螢幕位置
-        self._roi_margin = 200       # ROI 邊距像素
-        self._roi_miss_count = 0     # ROI 連續未找到次數
-        self._roi_max_miss = 3       # 超過此次數回退到全螢幕搜尋
-        self._idle_streak = 0        # 連續未找到次數（用於閒置退避）
         self._suppress_pos = None    # 重試失敗後暫時忽略的位置 (x, y)
         self._suppress_until = 0     # 忽略到期時間 (timestamp)
 
+        # 常駐截圖服務（所有截圖共用一個 mss 與環形緩衝區）
+        self._capture = CaptureService()
+
+        # 全螢幕增量掃描（分塊變動偵測 + 匹配結果快取）
+        self._scanner = FullScreenScanner()
+
+        # 各階段耗時統計（顯示在主視窗下方）
+        self._timer = StageTimer()
+
+        # 自動模式掃描流程（ROI 優先 + 閒置退避，記錄上次匹配位置）
+        self._autoscan = AutoScanner(self._capture, self._scanner, timer=self._timer, lock=self._lock)
+
+        # 滑鼠鍵盤輸入（PYCLICK_INPUT=record 時只記錄不送出）
+        self._input = input_from_spec()
+
         # 音效提示
         self.sound_enabled = True
 
@@ -283,6 +333,13 @@ class TrayClicker:
                     self.click_offset_enabled = config.get("click_offset_enabled", False)
                     self.click_offset_range = config.get("click_offset_range", 5)
                     self.use_color_match = config.get("use_color_match", True)
+                    self.pyramid_max_level = config.get("pyramid_max_level", PYRAMID_MAX_LEVEL)
+                    self.match_top_k = config.get("match_top_k", 0)
+                    self.record_session = config.get("record_session", False)
+                    self.trace_enabled = config.get("trace_enabled", False)
+                    self.metrics_port = config.get("metrics_port", 0)
+                    self.max_reaction_time = config.get("max_reaction_time", MAX_REACTION_TIME)
+                    self.cpu_budget = config.get("cpu_budget", 0)
             except Exception as e:
                 logger.warning(f"載入設定失敗: {e}")
 
@@ -304,6 +361,13 @@ class TrayClicker:
             config["click_offset_enabled"] = self.click_offset_enabled
             config["click_offset_range"] = self.click_offset_range
             config["use_color_match"] = self.use_color_match
+            config["pyramid_max_level"] = self.pyramid_max_level
+            config["match_top_k"] = self.match_top_k
+            config["record_session"] = self.record_session
+            config["trace_enabled"] = self.trace_enabled
+            config["metrics_port"] = self.metrics_port
+            config["max_reaction_time"] = self.max_reaction_time
+            config["cpu_budget"] = self.cpu_budget
             config["last_used"] = time.strftime("%Y-%m-%d %H:%M:%S")
 
             with open(self.config_path, "w", encoding="utf-8") as f:
@@ -317,6 +381,9 @@ class TrayClicker:
         self.root.title("PyClick 智能點擊器")
         self.root.geometry("850x650")
         self.root.protocol("WM_DELETE_WINDOW", self.hide_to_tray)
+        # 背景執行緒的 UI 更新（點擊數、定時停止）經由匯流排合併後定時套用
+        self._ui = UiBus(self.root)
+        self._ui.start()
 
         # === 上方控制區 ===
         ctrl_frame = ttk.LabelFrame(self.root, text="控制")
@@ -361,6 +428,11 @@ class TrayClicker:
         ttk.Separator(row1, orient="vertical").pack(side="left", fill="y", padx=10)
         ttk.Button(row1, text="🎯 測試找圖", command=self.test_find, width=12).pack(side="left", padx=5)
 
+        # 忽略區域：時鐘、轉圈圖示等持續變動的地方不觸發重新掃描
+        ttk.Separator(row1, orient="vertical").pack(side="left", fill="y", padx=10)
+        ttk.Button(row1, text="🚫 忽略選取", command=self.add_ignore_region, width=10).pack(side="left", padx=2)
+        ttk.Button(row1, text="清除忽略", command=self.clear_ignore_regions, width=8).pack(side="left", padx=2)
+
         # 第二排：動作設定
         row2 = ttk.Frame(ctrl_frame)
         row2.pack(fill="x", padx=10, pady=5)
@@ -563,6 +635,11 @@ class TrayClicker:
         self.status_var = tk.StringVar(value="按「截圖」開始")
         ttk.Label(bottom_frame, textvariable=self.status_var).pack(side="right", padx=10)
 
+        # 效能統計：掃描速率、各階段耗時 p50/p95、最高相似度
+        self.perf_var = tk.StringVar(value="")
+        ttk.Label(self.root, textvariable=self.perf_var, foreground="gray",
+                  font=("Consolas", 8)).pack(fill="x", padx=10, pady=(0, 5))
+
         # 狀態
         self.screenshot = None
         self.selection = None
@@ -878,6 +955,7 @@ class TrayClicker:
             self.current_script = SimpleScript()
             with self._lock:
                 self.template = None
+            self._scanner.set_ignore_rects([])
             self._update_ui_from_script()
             self.status_var.set("新腳本")
             return
@@ -885,6 +963,7 @@ class TrayClicker:
         filepath = os.path.join(self.scripts_dir, f"{name}.json")
         if os.path.exists(filepath):
             self.current_script = SimpleScript.load(filepath)
+            self._scanner.set_ignore_rects(self.current_script.ignore_rects)
             self._load_template_from_script()
             self._update_ui_from_script()
             self.status_var.set(f"已載入: {name}")
@@ -952,18 +1031,12 @@ class TrayClicker:
 
     def _load_template_from_script(self):
         """從腳本載入模板圖片（多模板支援）"""
-        new_templates = []
-        new_templates_gray = []
-        for path in self.current_script.template_paths:
-            if path and os.path.exists(path):
-                img = cv2.imread(path)
-                if img is not None:
-                    new_templates.append(img)
-                    new_templates_gray.append(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        # 預編譯模板：有快取時直接 mmap，不重新解碼（見 template_cache.py）
+        compiled = compile_templates(self.current_script.template_paths)
 
         with self._lock:
-            self.templates = new_templates
-            self.templates_gray = new_templates_gray
+            self.templates = [t.color for t in compiled]
+            self.templates_gray = [t.gray for t in compiled]
 
     def _sync_settings_to_script(self):
         """同步 TrayClicker 設定到腳本（儲存前呼叫）"""
@@ -1018,6 +1091,7 @@ class TrayClicker:
         self.current_script = SimpleScript()
         with self._lock:
             self.template = None
+        self._scanner.set_ignore_rects([])
         self._update_ui_from_script()
         self.status_var.set(f"已刪除: {name}")
 
@@ -1047,7 +1121,8 @@ class TrayClicker:
         """增加點擊計數並更新 UI"""
         self.total_clicks += count
         self.lifetime_clicks += count
-        self.root.after(0, self._update_counter_ui)
+        self._timer.count("clicks", count)
+        self._ui.post("clicks", self._update_counter_ui)
 
         # 每 10 次點擊儲存一次（避免頻繁寫入）
         if self.total_clicks % 10 == 0:
@@ -1236,6 +1311,68 @@ class TrayClicker:
         ttk.Checkbutton(color_frame, text="彩色匹配", variable=color_var).pack(side="left")
         ttk.Label(color_frame, text="(關閉=灰階匹配，較快但可能誤判顏色)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
 
+        # 金字塔搜尋
+        pyramid_frame = ttk.Frame(config_frame)
+        pyramid_frame.pack(fill="x", pady=8)
+        ttk.Label(pyramid_frame, text="金字塔層級:", width=12).pack(side="left")
+        pyramid_var = tk.StringVar(value=str(self.pyramid_max_level))
+        pyramid_combo = ttk.Combobox(pyramid_frame, textvariable=pyramid_var, width=8,
+                                     values=["0", "1", "2", "3"])
+        pyramid_combo.pack(side="left", padx=5)
+        ttk.Label(pyramid_frame, text="(0=關閉，越高全螢幕掃描越快)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
+        # 每模板匹配上限
+        top_k_frame = ttk.Frame(config_frame)
+        top_k_frame.pack(fill="x", pady=8)
+        ttk.Label(top_k_frame, text="每模板上限:", width=12).pack(side="left")
+        top_k_var = tk.StringVar(value=str(self.match_top_k))
+        top_k_combo = ttk.Combobox(top_k_frame, textvariable=top_k_var, width=8,
+                                   values=["0", "1", "3", "5", "10"])
+        top_k_combo.pack(side="left", padx=5)
+        ttk.Label(top_k_frame, text="處 (0=不限制，只取分數最高的幾處)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
+        # 最差反應時間
+        reaction_frame = ttk.Frame(config_frame)
+        reaction_frame.pack(fill="x", pady=8)
+        ttk.Label(reaction_frame, text="最長反應:", width=12).pack(side="left")
+        reaction_var = tk.StringVar(value=str(self.max_reaction_time))
+        reaction_combo = ttk.Combobox(reaction_frame, textvariable=reaction_var, width=8,
+                                      values=["0", "1", "2", "3", "5"])
+        reaction_combo.pack(side="left", padx=5)
+        ttk.Label(reaction_frame, text="秒 (0=不限制，畫面靜止時退避不超過此時間)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
+        # CPU 預算
+        budget_frame = ttk.Frame(config_frame)
+        budget_frame.pack(fill="x", pady=8)
+        ttk.Label(budget_frame, text="CPU 預算:", width=12).pack(side="left")
+        budget_var = tk.StringVar(value=str(self.cpu_budget))
+        budget_combo = ttk.Combobox(budget_frame, textvariable=budget_var, width=8,
+                                    values=["0", "5", "10", "20", "30"])
+        budget_combo.pack(side="left", padx=5)
+        ttk.Label(budget_frame, text="% (0=不限制，超過時自動降載)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
+        # 錄製掃描畫面
+        record_frame = ttk.Frame(config_frame)
+        record_frame.pack(fill="x", pady=8)
+        record_var = tk.BooleanVar(value=self.record_session)
+        ttk.Checkbutton(record_frame, text="錄製掃描畫面", variable=record_var).pack(side="left")
+        ttk.Label(record_frame, text="(自動模式時存到 recordings/，可離線重播分析)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
+        # 效能追蹤
+        trace_frame = ttk.Frame(config_frame)
+        trace_frame.pack(fill="x", pady=8)
+        trace_var = tk.BooleanVar(value=self.trace_enabled)
+        ttk.Checkbutton(trace_frame, text="效能追蹤", variable=trace_var).pack(side="left")
+        ttk.Label(trace_frame, text="(自動模式停止時存到 traces/，用 chrome://tracing 開啟)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
+        # 指標端點
+        metrics_frame = ttk.Frame(config_frame)
+        metrics_frame.pack(fill="x", pady=8)
+        ttk.Label(metrics_frame, text="指標埠:", width=12).pack(side="left")
+        metrics_port_var = tk.StringVar(value=str(self.metrics_port))
+        ttk.Entry(metrics_frame, textvariable=metrics_port_var, width=8).pack(side="left", padx=5)
+        ttk.Label(metrics_frame, text="(0=關閉，只限本機 http://127.0.0.1:埠/metrics)", foreground="gray", font=("", 8)).pack(side="left", padx=10)
+
         ttk.Separator(config_frame, orient="horizontal").pack(fill="x", pady=20)
 
         # 儲存按鈕
@@ -1249,6 +1386,16 @@ class TrayClicker:
                 self.click_offset_enabled = offset_var.get()
                 self.click_offset_range = int(offset_range_var.get())
                 self.use_color_match = color_var.get()
+                self.pyramid_max_level = max(0, min(int(pyramid_var.get()), 4))
+                self.match_top_k = max(0, int(top_k_var.get()))
+                self.max_reaction_time = max(0.0, float(reaction_var.get()))
+                self.cpu_budget = max(0, min(int(budget_var.get()), 100))
+                self.record_session = record_var.get()
+                self.trace_enabled = trace_var.get()
+                metrics_port = max(0, min(int(metrics_port_var.get()), 65535))
+                if metrics_port != self.metrics_port:
+                    self.metrics_port = metrics_port
+                    self._start_metrics()
                 self._save_stats()
                 timer_msg = f"，定時 {self.auto_stop_minutes}分" if self.auto_stop_enabled else ""
                 offset_msg = f"，偏移 ±{self.click_offset_range}px" if self.click_offset_enabled else ""
@@ -1385,11 +1532,12 @@ class TrayClicker:
             self.status_var.set(f"模板 {name} 已存在，不重複載入")
             return
 
-        new_template = cv2.imread(filepath)
-        if new_template is not None:
+        compiled = compile_template(filepath)
+        if compiled is not None:
+            new_template = compiled.color
             with self._lock:
-                self.templates.append(new_template)
-                self.templates_gray.append(cv2.cvtColor(new_template, cv2.COLOR_BGR2GRAY))
+                self.templates.append(compiled.color)
+                self.templates_gray.append(compiled.gray)
 
             # 更新腳本路徑列表
             self.current_script.template_paths.append(filepath)
@@ -1404,7 +1552,7 @@ class TrayClicker:
             self.status_var.set(f"已新增模板: {name} (共 {count} 個)")
 
             # 警告過多模板
-            if count > 5:
+            if count > TEMPLATE_WARN_COUNT:
                 self._show_toast(f"警告: {count} 個模板可能影響效能", duration=2000)
 
     def _delete_selected_template(self):
@@ -1428,8 +1576,7 @@ class TrayClicker:
         with self._lock:
             self.templates = []
             self.templates_gray = []
-            self._last_match_pos = None
-            self._roi_miss_count = 0
+            self._autoscan.forget_roi()
 
         self.current_script.template_paths = []
         self.template_info.config(text="(未設定)", foreground="gray")
@@ -1651,8 +1798,7 @@ class TrayClicker:
             self.mode = "off"
             self.auto_start_time = None
         # 在主執行緒更新 UI
-        if self.root:
-            self.root.after(0, lambda: self._on_auto_stop_complete())
+        self._ui.post("auto_stop", self._on_auto_stop_complete)
 
     def _on_auto_stop_complete(self):
         """定時停止後更新 UI"""
@@ -1672,13 +1818,10 @@ class TrayClicker:
         self.root.update()
         time.sleep(0.3)
 
-        with mss.mss() as sct:
-            monitor = sct.monitors[0]
-            shot = sct.grab(monitor)
-            self.screenshot = np.array(shot)
-            self.screenshot = cv2.cvtColor(self.screenshot, cv2.COLOR_BGRA2BGR)
-            self.offset_x = monitor["left"]
-            self.offset_y = monitor["top"]
+        frame = self._capture.get_frame()
+        self.screenshot = frame.bgr
+        self.offset_x = frame.left
+        self.offset_y = frame.top
 
         self.root.deiconify()
         self.root.update()
@@ -1730,6 +1873,13 @@ class TrayClicker:
 
         resized = cv2.resize(img, (nw, nh))
 
+        # 畫忽略區域（灰色）
+        ox, oy = getattr(self, "offset_x", 0), getattr(self, "offset_y", 0)
+        for x1, y1, x2, y2 in self.current_script.ignore_rects:
+            sx1, sy1 = int((x1 - ox) * self.scale), int((y1 - oy) * self.scale)
+            sx2, sy2 = int((x2 - ox) * self.scale), int((y2 - oy) * self.scale)
+            cv2.rectangle(resized, (sx1, sy1), (sx2, sy2), (128, 128, 128), 2)
+
         # 畫選取框
         if self.selection:
             x1, y1, x2, y2 = self.selection
@@ -1845,11 +1995,12 @@ class TrayClicker:
         template_path = os.path.join(template_dir, template_filename)
         cv2.imwrite(template_path, new_template)
 
-        # 新增到模板列表（多模板支援 + 灰階版本）
+        # 新增到模板列表（預編譯：彩色 + 灰階 + 金字塔，同時寫入快取）
+        compiled = compile_template(template_path) or CompiledTemplate.from_image(new_template, template_path)
         with self._lock:
-            self.templates.append(new_template)
-            self.templates_gray.append(cv2.cvtColor(new_template, cv2.COLOR_BGR2GRAY))
-            self.last_screen_hash = None
+            self.templates.append(compiled.color)
+            self.templates_gray.append(compiled.gray)
+        self._scanner.reset()
 
         # 更新當前腳本的模板路徑列表
         self.current_script.template_paths.append(template_path)
@@ -1863,12 +2014,37 @@ class TrayClicker:
             self.template_info.config(text=f"{count} 個模板", foreground="green")
 
         # 警告過多模板
-        if count > 5:
+        if count > TEMPLATE_WARN_COUNT:
             self._show_toast(f"警告: {count} 個模板可能影響效能", duration=2000)
 
         self.update_icon()
         self.status_var.set(f"模板已新增！共 {count} 個模板")
 
+    def add_ignore_region(self):
+        """把目前選取範圍加入忽略區域（區域內的變動不觸發重新掃描）"""
+        if self.selection is None:
+            self.status_var.set("請先拖曳框選要忽略的區域！")
+            return
+
+        x1, y1, x2, y2 = self.selection
+        # 截圖座標 → 螢幕座標
+        rect = (x1 + self.offset_x, y1 + self.offset_y, x2 + self.offset_x, y2 + self.offset_y)
+        self.current_script.ignore_rects.append(rect)
+        self._scanner.set_ignore_rects(self.current_script.ignore_rects)
+
+        self.selection = None
+        self.show_preview(self.screenshot)
+        count = len(self.current_script.ignore_rects)
+        self.status_var.set(f"已新增忽略區域 {x2-x1}x{y2-y1}，共 {count} 個（記得儲存腳本）")
+
+    def clear_ignore_regions(self):
+        """清除所有忽略區域"""
+        self.current_script.ignore_rects = []
+        self._scanner.set_ignore_rects([])
+        if self.screenshot is not None:
+            self.show_preview(self.screenshot)
+        self.status_var.set("已清除忽略區域")
+
     def _show_quick_action_menu(self):
         """顯示截圖後快速動作選單"""
         menu = tk.Toplevel(self.root)
@@ -1932,7 +2108,7 @@ class TrayClicker:
         # 開啟編輯器並添加積木
         self.open_block_editor()
         if hasattr(self, 'block_editor') and self.block_editor:
-            from block_editor import Block
+            from blocks import Block
             block = Block(action_type, {"image": filepath})
             self.block_editor.script.blocks.append(block)
             self.block_editor.refresh_script_view()
@@ -1983,11 +2159,9 @@ class TrayClicker:
         self.root.update()
         time.sleep(0.3)
 
-        with mss.mss() as sct:
-            monitor = sct.monitors[0]
-            screen = np.array(sct.grab(monitor))
-            screen = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-            ox, oy = monitor["left"], monitor["top"]  # 多螢幕偏移
+        frame = self._capture.get_frame()
+        screen = frame.bgr
+        ox, oy = frame.left, frame.top  # 多螢幕偏移
 
         self.root.deiconify()
 
@@ -2015,44 +2189,6 @@ class TrayClicker:
         t = threading.Thread(target=self._auto_loop, daemon=True)
         t.start()
 
-    def _find_all_matches(self, screen_match, template, threshold, ox=0, oy=0):
-        """找出螢幕上所有匹配位置（使用 NMS 避免重複）"""
-        th, tw = template.shape[:2]
-        result = cv2.matchTemplate(screen_match, template, cv2.TM_CCOEFF_NORMED)
-
-        # 找出所有超過閾值的位置
-        locations = np.where(result >= threshold)
-        matches = []
-
-        for pt in zip(*locations[::-1]):  # (x, y) 格式
-            cx = pt[0] + tw // 2 + ox
-            cy = pt[1] + th // 2 + oy
-            score = result[pt[1], pt[0]]
-            matches.append((cx, cy, score))
-
-        if not matches:
-            return []
-
-        # 非極大值抑制 (NMS)：移除重疊的匹配
-        # 按分數排序（高到低）
-        matches.sort(key=lambda x: x[2], reverse=True)
-
-        # 過濾重疊的匹配（距離太近的視為同一個）
-        min_distance = max(tw, th) * 0.8  # 80% 的模板尺寸作為最小間距
-        filtered = []
-
-        for cx, cy, score in matches:
-            is_duplicate = False
-            for fx, fy, _ in filtered:
-                dist = ((cx - fx) ** 2 + (cy - fy) ** 2) ** 0.5
-                if dist < min_distance:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                filtered.append((cx, cy, score))
-
-        return [(int(cx), int(cy)) for cx, cy, _ in filtered]
-
     def _execute_action_sequence(self, cx, cy, skip_count=False):
         """執行動作序列：多次點擊 + 按鍵（可選輸入鎖定）"""
         # 播放提示音（非同步，不阻塞）
@@ -2073,26 +2209,26 @@ class TrayClicker:
         focus_mode = self.current_script.focus_mode
 
         # 儲存原本游標位置和前景視窗
-        original_pos = pyautogui.position()
-        original_hwnd = user32.GetForegroundWindow()
+        original_pos = self._input.position()
+        original_hwnd = self._input.foreground_window()
 
         try:
             # 鎖定輸入（如果啟用且有管理員權限）
             # 注意：Focus 模式下不鎖定輸入，避免阻擋 pyautogui.press()
             if self.block_input_enabled and not focus_mode:
-                user32.BlockInput(True)
+                self._input.block_input(True)
 
             if focus_mode:
                 # Focus 模式：點擊確保焦點到正確子面板，再按鍵
-                user32.SetCursorPos(cx, cy)
+                self._input.move(cx, cy)
                 time.sleep(0.02)
-                user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-                user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+                self._input.mouse_down()
+                self._input.mouse_up()
                 time.sleep(0.1)
                 if after_key:
                     after_key_count = self.current_script.after_key_count
                     for i in range(after_key_count):
-                        pyautogui.press(after_key.lower())
+                        self._input.press(after_key)
                         if i < after_key_count - 1:
                             time.sleep(0.05)
                     time.sleep(0.15)
@@ -2100,13 +2236,13 @@ class TrayClicker:
                     logger.warning("Focus 模式啟用但未設定按鍵，僅點擊")
             else:
                 # 移動到目標位置（只移動一次）
-                user32.SetCursorPos(cx, cy)
+                self._input.move(cx, cy)
                 time.sleep(0.02)
 
                 # 執行多次點擊（不移動游標）
                 for i in range(click_count):
-                    user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-                    user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+                    self._input.mouse_down()
+                    self._input.mouse_up()
                     if i < click_count - 1:
                         time.sleep(click_interval)
 
@@ -2115,7 +2251,7 @@ class TrayClicker:
                     time.sleep(0.1)
                     after_key_count = self.current_script.after_key_count
                     for i in range(after_key_count):
-                        pyautogui.press(after_key.lower())
+                        self._input.press(after_key)
                         if i < after_key_count - 1:
                             time.sleep(0.05)
 
@@ -2123,11 +2259,11 @@ class TrayClicker:
             # 保證解鎖（即使出錯也會執行）
             # 只有在非 focus 模式時才需要解鎖（因為 focus 模式沒有鎖定）
             if self.block_input_enabled and not focus_mode:
-                user32.BlockInput(False)
+                self._input.block_input(False)
 
             # 游標回原位
             try:
-                user32.SetCursorPos(int(original_pos[0]), int(original_pos[1]))
+                self._input.move(original_pos[0], original_pos[1])
             except Exception:
                 pass
 
@@ -2137,7 +2273,7 @@ class TrayClicker:
             try:
                 if original_hwnd:
                     logger.debug(f"恢復焦點: focus_mode={focus_mode}, mode={self.mode}, hwnd={original_hwnd}")
-                    force_focus(original_hwnd)
+                    self._input.restore_focus(original_hwnd)
             except Exception as e:
                 logger.warning(f"焦點恢復失敗: {e}")
 
@@ -2161,36 +2297,18 @@ class TrayClicker:
             return False
 
         try:
-            margin = self._roi_margin
-            with mss.mss() as sct:
-                monitor = sct.monitors[0]
-                ox, oy = monitor["left"], monitor["top"]
-                # 將螢幕座標轉為截圖座標
-                sx = cx - ox
-                sy = cy - oy
-                # ROI 邊界（確保不超出螢幕）
-                x1 = max(0, sx - margin)
-                y1 = max(0, sy - margin)
-                x2 = min(monitor["width"], sx + margin)
-                y2 = min(monitor["height"], sy + margin)
-
-                roi_region = {"left": x1 + ox, "top": y1 + oy,
-                              "width": x2 - x1, "height": y2 - y1}
-                roi_img = np.array(sct.grab(roi_region))
-
-            if use_color:
-                roi_match = cv2.cvtColor(roi_img, cv2.COLOR_BGRA2BGR)
-                match_templates = templates
-            else:
-                roi_match = cv2.cvtColor(roi_img, cv2.COLOR_BGRA2GRAY)
-                match_templates = templates_gray
+            # ROI 邊界（確保不超出螢幕），等待後要看最新畫面
+            region = roi_region(self._capture.monitor, cx, cy, self._autoscan.roi_margin)
+            frame = self._capture.get_frame(0, region)
+
+            roi_match = frame.match_image(use_color)
+            match_templates = templates if use_color else templates_gray
 
             for template in match_templates:
                 th, tw = template.shape[:2]
                 if roi_match.shape[0] < th or roi_match.shape[1] < tw:
                     continue
-                result = cv2.matchTemplate(roi_match, template, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, _ = cv2.minMaxLoc(result)
+                max_val, _ = best_match(roi_match, template)
                 if max_val >= threshold:
                     return True
 
@@ -2204,7 +2322,8 @@ class TrayClicker:
         """包裝器：執行動作後，若啟用重試直到消失，則重複檢查並重試"""
         # 快照腳本參考，避免 UI 切換腳本時產生競態
         script = self.current_script
-        self._execute_action_sequence(cx, cy)
+        with self._timer.stage("action"):
+            self._execute_action_sequence(cx, cy)
 
         if not script.retry_until_gone:
             return
@@ -2214,12 +2333,14 @@ class TrayClicker:
 
         for attempt in range(retry_max):
             time.sleep(verify_delay)
-            still_there = self._check_roi_match(cx, cy)
+            with trace_span(self._timer.tracer, "retry_check", "retry", attempt=attempt + 1):
+                still_there = self._check_roi_match(cx, cy)
             if not still_there:
                 logger.info("重試機制: 模板已消失")
                 return
             logger.info(f"重試機制: 模板仍在，重試 {attempt + 1}/{retry_max}")
-            self._execute_action_sequence(cx, cy, skip_count=True)
+            with self._timer.stage("action"):
+                self._execute_action_sequence(cx, cy, skip_count=True)
 
         logger.info(f"重試機制: 已達上限 {retry_max} 次，暫時跳過此位置 30 秒")
         with self._lock:
@@ -2245,32 +2366,26 @@ class TrayClicker:
             return
 
         try:
-            # 截取螢幕
-            with mss.mss() as sct:
-                monitor = sct.monitors[0]
-                screen = np.array(sct.grab(monitor))
-
-            # 根據設定選擇匹配模式
-            if use_color:
-                screen_match = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-                match_templates = templates
-            else:
-                screen_match = cv2.cvtColor(screen, cv2.COLOR_BGRA2GRAY)
-                match_templates = templates_gray
-
-            # 檢查是否還能找到任一模板
-            still_there = False
-            for template in match_templates:
-                result = cv2.matchTemplate(screen_match, template, cv2.TM_CCOEFF_NORMED)
-                _, max_val, _, _ = cv2.minMaxLoc(result)
-                if max_val >= threshold:
-                    still_there = True
-                    break
+            with trace_span(self._timer.tracer, "verify", "verify"):
+                # 截取螢幕（等待後要看最新畫面）
+                frame = self._capture.get_frame()
+
+                # 根據設定選擇匹配模式
+                screen_match = frame.match_image(use_color)
+                match_templates = templates if use_color else templates_gray
+
+                # 檢查是否還能找到任一模板
+                still_there = False
+                for template in match_templates:
+                    max_val, _ = best_match(screen_match, template)
+                    if max_val >= threshold:
+                        still_there = True
+                        break
 
             # 如果圖片還在，按下確認鍵
             if still_there and verify_key:
                 logger.info(f"確認機制: 圖片仍在，按下 {verify_key}")
-                pyautogui.press(verify_key.lower())
+                self._input.press(verify_key)
                 # 播放不同的提示音（較低音）
                 if self.sound_enabled:
                     threading.Thread(target=lambda: winsound.Beep(800, 80), daemon=True).start()
@@ -2280,9 +2395,44 @@ class TrayClicker:
         except Exception as e:
             logger.error(f"確認機制錯誤: {e}")
 
+    def _open_recorder(self):
+        """開始錄製（檔名含時間），失敗則不錄製"""
+        try:
+            import datetime
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = os.path.join(self.recordings_dir, f"session_{timestamp}{RECORDING_EXT}")
+            recorder = SessionRecorder(path, self._capture.monitor)
+            logger.info(f"開始錄製: {path}")
+            return recorder
+        except Exception as e:
+            logger.error(f"無法開始錄製: {e}")
+            return None
+
+    def _filter_suppressed(self, matches):
+        """排除重試失敗後暫時跳過的位置（過期則清除）"""
+        with self._lock:
+            sup_pos = self._suppress_pos
+            sup_until = self._suppress_until
+
+        if sup_pos and time.time() < sup_until:
+            return [
+                (cx, cy) for cx, cy in matches
+                if ((cx - sup_pos[0]) ** 2 + (cy - sup_pos[1]) ** 2) ** 0.5 > 80
+            ]
+        if sup_pos:
+            # 過期了，清除 suppress
+            with self._lock:
+                self._suppress_pos = None
+                self._suppress_until = 0
+        return matches
+
     def _auto_loop(self):
-        """自動偵測（不搶焦點）- ROI 優先掃描 + 閒置退避"""
-        self._idle_streak = 0  # 每次啟動自動模式重置
+        """自動偵測（不搶焦點）- ROI 優先掃描 + 自適應掃描間隔（每輪見 AutoScanner.run_round）"""
+        self._autoscan.start()  # 每次啟動自動模式重置掃描排程
+        recorder = self._open_recorder() if self.record_session else None
+        tracer = self._timer.tracer = Tracer() if self.trace_enabled else None
+        governor = self._governor
+        governor.start()
         while self.running:
             # 執行緒安全：讀取共享狀態（不複製模板，只讀參考）
             with self._lock:
@@ -2292,9 +2442,15 @@ class TrayClicker:
                 use_color = self.use_color_match  # 彩色匹配開關
                 auto_interval = self.auto_interval
                 continuous_click = self.continuous_click
-                last_match_pos = self._last_match_pos
                 threshold = self.similarity_threshold
-                roi_miss_count = self._roi_miss_count
+                pyramid_max_level = self.pyramid_max_level
+                self._autoscan.scheduler.max_reaction = self.max_reaction_time
+                governor.target = self.cpu_budget
+
+            # CPU 預算：依使用率調整金字塔層級、ROI 偏好、OpenCV 執行緒數與掃描間隔
+            governor.sample()
+            pyramid_max_level = governor.pyramid_level(pyramid_max_level)
+            self._autoscan.roi_max_miss = governor.roi_max_miss(ROI_MAX_MISS)
 
             if current_mode != "auto":
                 break
@@ -2312,177 +2468,43 @@ class TrayClicker:
                 continue
 
             try:
-                # ROI 優先掃描：有上次匹配位置且未超過失敗上限時，只截 ROI 區域
-                use_roi = (last_match_pos is not None
-                           and roi_miss_count < self._roi_max_miss)
-
-                found = False
-                all_matches = []
-
-                if use_roi:
-                    # --- ROI 掃描（面積約全螢幕 8%，大幅降低 CPU） ---
-                    roi_cx, roi_cy = last_match_pos
-                    margin = self._roi_margin
-                    with mss.mss() as sct:
-                        monitor = sct.monitors[0]
-                        ox, oy = monitor["left"], monitor["top"]
-                        # 將螢幕座標轉為截圖座標
-                        sx = roi_cx - ox
-                        sy = roi_cy - oy
-                        x1 = max(0, sx - margin)
-                        y1 = max(0, sy - margin)
-                        x2 = min(monitor["width"], sx + margin)
-                        y2 = min(monitor["height"], sy + margin)
-                        roi_region = {"left": x1 + ox, "top": y1 + oy,
-                                      "width": x2 - x1, "height": y2 - y1}
-                        screen = np.array(sct.grab(roi_region))
-
-                    screen_bgr = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-                    roi_ox = roi_region["left"]
-                    roi_oy = roi_region["top"]
-
-                    # ROI 很小，直接做 matchTemplate（跳過 hash 比對）
-                    if use_color:
-                        screen_match = screen_bgr
-                        match_templates = templates
-                    else:
-                        screen_match = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2GRAY)
-                        match_templates = templates_gray
-
-                    for template in match_templates:
-                        th, tw = template.shape[:2]
-                        if screen_match.shape[0] < th or screen_match.shape[1] < tw:
-                            continue
-                        matches = self._find_all_matches(
-                            screen_match, template, threshold, roi_ox, roi_oy)
-                        all_matches.extend(matches)
-
-                    # 去除重複位置
-                    if len(all_matches) > 1:
-                        unique_matches = []
-                        min_dist = 50
-                        for cx, cy in all_matches:
-                            is_dup = False
-                            for ux, uy in unique_matches:
-                                if ((cx - ux) ** 2 + (cy - uy) ** 2) ** 0.5 < min_dist:
-                                    is_dup = True
-                                    break
-                            if not is_dup:
-                                unique_matches.append((cx, cy))
-                        all_matches = unique_matches
-
-                    found = len(all_matches) > 0
-                    del screen_bgr, screen, screen_match
-
-                else:
-                    # --- 全螢幕掃描（原有邏輯，含 hash 優化） ---
-                    with mss.mss() as sct:
-                        monitor = sct.monitors[0]
-                        screen = np.array(sct.grab(monitor))
-                        screen_bgr = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-                        ox, oy = monitor["left"], monitor["top"]
-
-                    # Hash 比對 (使用內建 hash 更快)
-                    small = cv2.resize(screen_bgr, (160, 90))
-                    screen_hash = hash(small.tobytes())
+                # ROI 優先掃描：有上次匹配位置且未超過失敗上限時，只截 ROI 區域，
+                # 否則全螢幕掃描（分塊變動偵測，只重新匹配變動區域）；找到就點擊
+                match_templates = templates if use_color else templates_gray
 
+                def can_click():
                     with self._lock:
-                        if screen_hash == self.last_screen_hash:
-                            time.sleep(auto_interval)
-                            continue
-                        self.last_screen_hash = screen_hash
-
-                    # 根據設定選擇匹配模式
-                    if use_color:
-                        screen_match = screen_bgr
-                        match_templates = templates
-                    else:
-                        screen_match = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2GRAY)
-                        match_templates = templates_gray
-
-                    # 收集所有匹配位置（多模板 + 多位置）
-                    for template in match_templates:
-                        matches = self._find_all_matches(screen_match, template, threshold, ox, oy)
-                        all_matches.extend(matches)
-
-                    # 去除重複位置（不同模板可能匹配到同一處）
-                    if len(all_matches) > 1:
-                        unique_matches = []
-                        min_dist = 50
-                        for cx, cy in all_matches:
-                            is_dup = False
-                            for ux, uy in unique_matches:
-                                if ((cx - ux) ** 2 + (cy - uy) ** 2) ** 0.5 < min_dist:
-                                    is_dup = True
-                                    break
-                            if not is_dup:
-                                unique_matches.append((cx, cy))
-                        all_matches = unique_matches
-
-                    found = len(all_matches) > 0
-                    del screen_bgr, screen, screen_match
-
-                # --- 過濾被暫時跳過的位置 ---
-                with self._lock:
-                    sup_pos = self._suppress_pos
-                    sup_until = self._suppress_until
-
-                if sup_pos and time.time() < sup_until:
-                    all_matches = [
-                        (cx, cy) for cx, cy in all_matches
-                        if ((cx - sup_pos[0]) ** 2 + (cy - sup_pos[1]) ** 2) ** 0.5 > 80
-                    ]
-                    found = len(all_matches) > 0
-                elif sup_pos:
-                    # 過期了，清除 suppress
-                    with self._lock:
-                        self._suppress_pos = None
-                        self._suppress_until = 0
-
-                # --- 處理匹配結果（ROI 和全螢幕共用） ---
-                with self._lock:
-                    if found:
-                        self._roi_miss_count = 0
-                    else:
-                        self._roi_miss_count += 1
-
-                if found:
-                    self._idle_streak = 0
-                    logger.info(f"找到 {len(all_matches)} 處匹配")
-
-                    for idx, (cx, cy) in enumerate(all_matches):
-                        with self._lock:
-                            self._last_match_pos = (cx, cy)
-
-                        if idx == 0:
-                            with self._lock:
-                                cooldown_passed = continuous_click or (time.time() - self.last_click_time >= self.click_cooldown)
-                            if not cooldown_passed:
-                                break
+                        return continuous_click or (time.time() - self.last_click_time >= self.click_cooldown)
 
+                def click(cx, cy):
+                    with trace_span(tracer, "click", "action", x=int(cx), y=int(cy)):
                         self._execute_with_retry(cx, cy)
+                    with self._lock:
+                        self.last_click_time = time.time()
 
-                        with self._lock:
-                            self.last_click_time = time.time()
-                            self.last_screen_hash = None
+                delay = self._autoscan.run_round(
+                    match_templates, use_color, threshold, pyramid_max_level, auto_interval, click,
+                    self.match_top_k, recorder, can_click, self._filter_suppressed)
 
-                        if idx < len(all_matches) - 1:
-                            time.sleep(0.15)
-                else:
-                    self._idle_streak += 1
-
-                # 動態間隔 + 閒置退避
-                if found:
-                    sleep_time = auto_interval * 0.5
-                else:
-                    backoff = auto_interval * (1 + self._idle_streak * 0.15)
-                    sleep_time = min(backoff, auto_interval * 2.5)
-                time.sleep(sleep_time)
+                # 依變動頻率 / 命中率決定下一輪間隔（不超過最差反應時間；CPU 預算降載時再加長）
+                time.sleep(delay * governor.interval_scale())
 
             except Exception as e:
                 logger.error(f"自動模式錯誤: {e}")
                 time.sleep(auto_interval)
 
+        self._governor.stop()
+        if recorder:
+            recorder.close()
+            logger.info(f"錄製結束: {recorder.frame_count} 張畫面（丟棄 {recorder.dropped} 筆）")
+        if tracer:
+            self._timer.tracer = None
+            try:
+                path = tracer.write(trace_path(self.traces_dir))
+                logger.info(f"效能追蹤已儲存: {path}")
+            except Exception as e:
+                logger.error(f"效能追蹤儲存失敗: {e}")
+
     def on_hotkey(self):
         """熱鍵觸發"""
         with self._lock:
@@ -2501,43 +2523,31 @@ class TrayClicker:
             templates_gray = self.templates_gray
             use_color = self.use_color_match
             threshold = self.similarity_threshold
+            pyramid_max_level = self.pyramid_max_level
 
         if not templates:
             return
 
+        timer = self._timer
         try:
-            with mss.mss() as sct:
-                monitor = sct.monitors[0]
-                screen = np.array(sct.grab(monitor))
-                ox, oy = monitor["left"], monitor["top"]
+            with timer.stage("capture"):
+                frame = self._capture.get_frame(CAPTURE_MAX_AGE_MS)
+            with timer.stage("convert"):
+                frame.match_image(use_color)
 
             # 根據設定選擇匹配模式
-            if use_color:
-                screen_match = cv2.cvtColor(screen, cv2.COLOR_BGRA2BGR)
-                match_templates = templates
-            else:
-                screen_match = cv2.cvtColor(screen, cv2.COLOR_BGRA2GRAY)
-                match_templates = templates_gray
+            match_templates = templates if use_color else templates_gray
 
             # 收集所有匹配位置
-            all_matches = []
-            for template in match_templates:
-                matches = self._find_all_matches(screen_match, template, threshold, ox, oy)
-                all_matches.extend(matches)
+            with timer.stage("match"):
+                all_matches = self._scanner.match_full(
+                    frame, match_templates, use_color, threshold, pyramid_max_level,
+                    self.match_top_k)
 
             # 去除重複位置
-            if len(all_matches) > 1:
-                unique_matches = []
-                min_dist = 50
-                for cx, cy in all_matches:
-                    is_dup = False
-                    for ux, uy in unique_matches:
-                        if ((cx - ux) ** 2 + (cy - uy) ** 2) ** 0.5 < min_dist:
-                            is_dup = True
-                            break
-                    if not is_dup:
-                        unique_matches.append((cx, cy))
-                all_matches = unique_matches
+            with timer.stage("dedup"):
+                all_matches = dedup_points(all_matches)
+            timer.tick(self._scanner.best_score)
 
             if all_matches:
                 logger.info(f"熱鍵: 找到 {len(all_matches)} 處匹配")
@@ -2549,11 +2559,45 @@ class TrayClicker:
         except Exception as e:
             logger.error(f"熱鍵點擊錯誤: {e}")
 
+    def _start_metrics(self):
+        """依設定開啟 / 關閉本機指標端點"""
+        if self._metrics:
+            self._metrics.stop()
+            self._metrics = None
+        if not self.metrics_port:
+            return
+        try:
+            self._metrics = MetricsServer(self._timer, self.metrics_port, gauges=lambda: {
+                "session_clicks": ("本次啟動的點擊數", self.total_clicks),
+                "lifetime_clicks": ("累計總點擊數", self.lifetime_clicks),
+                "cpu_percent": ("自動模式量到的 CPU 使用率（%）", self._governor.usage),
+                "governor_level": ("CPU 預算降載級數", self._governor.level),
+            })
+            self._metrics.start()
+        except OSError as e:
+            self._metrics = None
+            logger.error(f"指標端點無法開啟（埠 {self.metrics_port}）: {e}")
+
+    def _update_perf_ui(self):
+        """每秒更新效能統計（視窗隱藏時不計算）"""
+        try:
+            if self.root.winfo_viewable():
+                budget = self._governor.summary() if self.mode == "auto" else ""
+                self.perf_var.set(" | ".join(s for s in (self._timer.summary(), budget) if s))
+        except Exception as e:
+            logger.debug(f"效能統計更新失敗: {e}")
+        if self.running:
+            self.root.after(1000, self._update_perf_ui)
+
     def quit_app(self, icon=None, item=None):
         """結束"""
         self._save_stats()  # 儲存統計資料
         self.running = False
         self.mode = "off"
+        self._ui.stop()
+        self._capture.stop()
+        if self._metrics:
+            self._metrics.stop()
         keyboard.unhook_all()
         if self.icon:
             self.icon.stop()
@@ -2567,6 +2611,8 @@ class TrayClicker:
 
         # 檢查預設模板
         self.root.after(100, self._check_default_script)
+        self.root.after(1000, self._update_perf_ui)
+        self._start_metrics()
 
         # 主視窗
         self.root.mainloop()
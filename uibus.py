@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+PyClick UI 更新匯流排
+背景執行緒（自動模式、腳本執行）不直接呼叫 root.after，而是以「鍵」送出最新的更新；
+Tk 執行緒以固定頻率取出並執行。同一個鍵在兩次更新之間送出多次只會執行最後一次，
+點擊很快或積木很多時 Tk 事件佇列不會被塞滿，背景執行緒也不用等 UI
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger('PyClick')
+
+UI_FPS = 30     # 每秒更新幾次
+
+
+class UiBus:
+    """合併背景執行緒的 UI 更新（post 可從任何執行緒呼叫，其餘在 Tk 執行緒）"""
+
+    def __init__(self, widget, fps=UI_FPS):
+        self.widget = widget
+        self.interval_ms = max(1, int(1000 / fps))
+        self._pending = {}          # 鍵 -> (函式, 參數)，依最後送出的順序
+        self._lock = threading.Lock()
+        self._running = False
+        self.posted = 0             # 總共送出幾次
+        self.applied = 0            # 實際執行幾次（其餘被合併掉）
+
+    def post(self, key, fn, *args):
+        """送出更新（同一個鍵只保留最新的）"""
+        with self._lock:
+            self._pending.pop(key, None)
+            self._pending[key] = (fn, args)
+            self.posted += 1
+
+    def start(self):
+        """開始定時取出更新（Tk 執行緒呼叫）"""
+        if not self._running:
+            self._running = True
+            self.widget.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        self._running = False
+
+    def flush(self):
+        """立即執行所有待處理的更新（Tk 執行緒呼叫）"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for key, (fn, args) in pending.items():
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.debug(f"UI 更新失敗 ({key}): {e}")
+            self.applied += 1
+
+    def _drain(self):
+        if not self._running:
+            return
+        self.flush()
+        try:
+            self.widget.after(self.interval_ms, self._drain)
+        except Exception:
+            # 視窗已關閉
+            self._running = False
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+PyClick 圖片等待服務
+積木腳本的「等到圖片出現 / 消失」都交給同一個背景執行緒：每輪只截一張畫面，
+所有等待中的條件共用這張畫面判斷（同一個模板只匹配一次），條件成立就立刻叫醒對應的等待者。
+
+畫面沒有變動（分塊變動偵測，見 scanner.TileTracker）且沒有新的等待者時不重新匹配。
+檢查間隔會退避：有新的等待者或畫面剛變動時每 WATCH_INTERVAL 檢查一次（條件很可能馬上成立），
+之後畫面沒變就每輪加倍，最長到等待者自己的輪詢間隔（預設同原本的 0.5 秒），靜止畫面不會多截圖
+"""
+
+import logging
+import threading
+import time
+
+from matcher import match_candidates, PYRAMID_MAX_LEVEL
+from scanner import TileTracker
+
+logger = logging.getLogger('PyClick')
+
+WATCH_INTERVAL = 0.05       # 最短檢查間隔（秒，有新的等待者或畫面剛變動時）
+WATCH_MAX_INTERVAL = 0.5    # 畫面靜止時退避到的最長檢查間隔（秒）
+WATCH_CHECKS = 10           # 逾時前至少檢查幾次（逾時很短的等待，退避上限跟著縮短）
+STOP_POLL = 0.1             # 等待中檢查是否要停止的間隔（秒）
+
+
+def find_best(frame, template, threshold, max_level=PYRAMID_MAX_LEVEL):
+    """整張畫面找模板，回傳分數最高處的中心點（螢幕座標），沒有 >= 門檻的回傳 None
+
+    金字塔粗到細搜尋（與自動模式相同），分數仍是全解析度的 TM_CCOEFF_NORMED
+    """
+    levels = frame.pyramid(template.ndim == 3, max_level)
+    xs, ys, scores = match_candidates(levels, template, threshold, max_level)
+    if not len(scores):
+        return None
+    i = int(scores.argmax())
+    th, tw = template.shape[:2]
+    return (frame.left + int(xs[i]) + tw // 2, frame.top + int(ys[i]) + th // 2)
+
+
+class _Waiter:
+    __slots__ = ("template", "threshold", "present", "poll", "since", "event", "checked", "pos")
+
+    def __init__(self, template, threshold, present, poll):
+        self.template = template
+        self.threshold = threshold
+        self.present = present      # True = 等出現，False = 等消失
+        self.poll = poll            # 畫面靜止時最長多久檢查一次（秒）
+        self.since = time.time()    # 只用這個時間之後的畫面判斷（例如剛點擊完，舊畫面不算）
+        self.event = threading.Event()
+        self.checked = False        # 是否已用目前的畫面判斷過
+        self.pos = None             # 出現時的位置
+
+
+class ImageWatcher:
+    """多個等待條件共用同一個截圖 / 匹配迴圈（沒有等待者時背景執行緒自動結束）
+
+    用完要呼叫 stop()：背景執行緒停在 OpenCV 裡時直譯器結束會異常終止
+    """
+
+    def __init__(self, capture, interval=WATCH_INTERVAL, max_interval=WATCH_MAX_INTERVAL):
+        self.capture = capture
+        self.interval = interval
+        self.max_interval = max_interval
+        self.tracker = TileTracker()
+        self._waiters = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.ticks = 0              # 檢查輪數
+        self.matched = 0            # 實際做匹配的輪數（其餘畫面沒變，沿用上次結果）
+
+    def wait(self, template, threshold, present=True, timeout=30, should_stop=None, poll=None):
+        """等到模板出現（present=True）或消失，成立回傳 True，逾時或被停止回傳 False
+
+        poll: 畫面靜止時最長多久檢查一次（秒，None = max_interval，且不超過逾時的 1 / WATCH_CHECKS）
+        """
+        if poll is None:
+            poll = min(self.max_interval, timeout / WATCH_CHECKS)
+        waiter = _Waiter(template, threshold, present, max(self.interval, poll))
+        with self._cond:
+            if self._stopped:
+                return False
+            self._waiters.append(waiter)
+            if self._thread is None:
+                self.tracker.reset()
+                self._thread = threading.Thread(target=self._run, name="ImageWatcher", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        deadline = time.time() + timeout
+        try:
+            while not waiter.event.is_set():
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._stopped or (should_stop and should_stop()):
+                    break
+                waiter.event.wait(min(remaining, STOP_POLL))
+        finally:
+            with self._cond:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        return waiter.event.is_set()
+
+    def stop(self):
+        """停止背景執行緒並等它結束（等待中的條件返回 False，之後的 wait() 也直接返回 False）"""
+        with self._cond:
+            self._stopped = True
+            thread = self._thread
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def check(self, template, threshold, frame=None):
+        """立即判斷一次（frame 省略時共用不超過一個檢查間隔的畫面），找到回傳中心點，否則 None"""
+        if frame is None:
+            frame = self.capture.get_frame(self.interval * 1000)
+        return find_best(frame, template, threshold)
+
+    def _run(self):
+        delay = self.interval
+        while True:
+            with self._cond:
+                if self._stopped or not self._waiters:
+                    self._thread = None
+                    return
+                waiters = list(self._waiters)
+            start = time.time()
+            active = failed = False
+            try:
+                active = self._tick(waiters)
+            except Exception as e:
+                logger.error(f"圖片等待檢查失敗: {e}")
+                failed = True
+            with self._cond:
+                # 有新的等待者或畫面有變動：回到最短間隔；否則加倍，不超過等待者的輪詢間隔
+                limit = min((w.poll for w in self._waiters), default=self.max_interval)
+                delay = self.interval if active else min(delay * 2, limit)
+                # 有新的等待者加入時 notify 會提早叫醒，不用等滿一個間隔
+                if failed or all(w.checked for w in self._waiters):
+                    self._cond.wait(max(0.0, delay - (time.time() - start)))
+
+    def _tick(self, waiters):
+        """截一張畫面，判斷所有等待條件；回傳是否有新的等待者或畫面有變動（下一輪要不要快一點）"""
+        # 新加入的等待者要用它開始等待之後的畫面
+        fresh = any(not w.checked for w in waiters)
+        newest = max((w.since for w in waiters if not w.checked), default=0.0)
+        max_age = min(self.interval, time.time() - newest)
+        frame = self.capture.get_frame(max(0.0, max_age) * 1000)
+        self.ticks += 1
+        dirty = self.tracker.update(frame)
+        changed = dirty is None or bool(dirty.any())
+        pending = [w for w in waiters if changed or not w.checked]
+        if not pending:
+            return False
+        self.matched += 1
+        found = {}      # 同一個模板 + 門檻（可能有多個等待者）只匹配一次
+        for w in pending:
+            key = (id(w.template), w.threshold)
+            if key not in found:
+                found[key] = find_best(frame, w.template, w.threshold)
+            pos = found[key]
+            w.checked = True
+            if (pos is not None) == w.present:
+                w.pos = pos
+                w.event.set()
+        return changed or fresh